@@ -0,0 +1,202 @@
+"""
+AI新闻使用比例的自适应调节
+根据最近的补全调用情况动态调整生成AI新闻的概率：
+- 延迟：上次调节以来新完成的调用耗时p95超过目标，或其中过半失败时，按比例降低AI新闻的份额
+- 调用频率：有新调用并且最近一分钟的调用数超过目标时同样降低
+  （每个样本只参与一次降低，同一批慢调用不会在之后的每次调节中反复压低份额）
+- 都在目标以内时逐步恢复（加性增、乘性减），份额保留一个下限，API恢复后能及时发现
+- 每日token预算：按“剩余预算 / 当天剩余时间”匀速消耗，预算用完后当天不再调用
+
+实际概率 = 配置的基础概率 × 份额 × 预算节奏；降下来的部分改用已存的AI故事或程序化/预设新闻。
+统计在进程内进行，多个worker进程时各自统计（预算也按进程计算）。
+"""
+
+import threading
+import time
+from collections import deque
+from datetime import date, datetime
+from typing import Callable, Deque, Dict, Optional, Tuple
+
+from config import Config
+
+class AdaptiveAIUsage:
+    """按延迟、调用频率和每日token预算调节AI新闻概率（线程安全）"""
+
+    def __init__(
+        self,
+        base_probability: float,
+        target_p95: float,
+        target_rpm: float,
+        daily_token_budget: int = 0,
+        min_share: float = 0.05,
+        adjust_interval: float = 10.0,
+        window: float = 300.0,
+        clock: Callable[[], float] = time.monotonic,
+        now: Callable[[], datetime] = datetime.now,
+    ):
+        """
+        Args:
+            base_probability: 配置的AI新闻概率（份额为1时的概率）
+            target_p95: 调用耗时p95的目标(秒)
+            target_rpm: 每分钟调用数的目标，0表示不限制
+            daily_token_budget: 每日token预算，0表示不限制
+            min_share: 份额下限（保持少量调用以发现API恢复）
+            adjust_interval: 两次调节之间的最短间隔(秒)
+            window: 统计延迟的时间窗口(秒)
+            clock / now: 时钟（测试时可以替换）
+        """
+        self.base_probability = base_probability
+        self.target_p95 = target_p95
+        self.target_rpm = target_rpm
+        self.daily_token_budget = daily_token_budget
+        self.min_share = min_share
+        self.adjust_interval = adjust_interval
+        self.window = window
+        self._clock = clock
+        self._now = now
+        self._lock = threading.Lock()
+
+        # 最近的调用: (结束时间, 耗时, 是否失败)
+        self._calls: Deque[Tuple[float, float, bool]] = deque()
+        self.share = 1.0
+        self._last_adjust = clock()
+        self._budget_day: date = now().date()
+        self.tokens_today = 0
+
+        self.decreases = 0
+        self.increases = 0
+        self.shed = 0  # 因份额降低而没有调用AI的新闻数
+        self.cached_served = 0  # 其中改用已存AI故事的新闻数
+
+    # ===== 记录 =====
+
+    def record(self, latency: float, tokens: int = 0, failed: bool = False):
+        """记录一次补全调用（失败的调用同样计入延迟和调用频率）"""
+        with self._lock:
+            now = self._clock()
+            self._calls.append((now, latency, failed))
+            self._roll_day()
+            self.tokens_today += tokens
+            self._maybe_adjust(now)
+
+    def _roll_day(self):
+        today = self._now().date()
+        if today != self._budget_day:
+            self._budget_day = today
+            self.tokens_today = 0
+
+    def _expire(self, now: float):
+        calls = self._calls
+        while calls and calls[0][0] < now - self.window:
+            calls.popleft()
+
+    # ===== 指标 =====
+
+    @staticmethod
+    def _p95(calls) -> Optional[float]:
+        latencies = sorted(latency for _, latency, _ in calls)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+
+    def _requests_last_minute(self, now: float) -> int:
+        count = 0
+        for finished, _, _ in reversed(self._calls):
+            if finished < now - 60.0:
+                break
+            count += 1
+        return count
+
+    def _budget_pace(self) -> float:
+        """剩余预算比例 / 当天剩余时间比例（不超过1），预算用完为0"""
+        if self.daily_token_budget <= 0:
+            return 1.0
+        remaining_budget = 1.0 - self.tokens_today / self.daily_token_budget
+        if remaining_budget <= 0:
+            return 0.0
+        now = self._now()
+        seconds = now.hour * 3600 + now.minute * 60 + now.second
+        remaining_day = max(1.0 - seconds / 86400.0, 1e-6)
+        return min(1.0, remaining_budget / remaining_day)
+
+    # ===== 调节 =====
+
+    def _maybe_adjust(self, now: float):
+        """每隔 adjust_interval 秒按最近的指标调节一次份额（调用方需持有锁）"""
+        if now - self._last_adjust < self.adjust_interval:
+            return
+        previous = self._last_adjust
+        self._last_adjust = now
+        self._expire(now)
+
+        # 只按上次调节以来新完成的调用判断：没有新样本时不降低
+        recent = [call for call in self._calls if call[0] > previous]
+        ratio = 1.0
+        if recent:
+            # 超出目标的程度：目标 / 实际，取最严重的一项
+            p95 = self._p95(recent)
+            if p95 > self.target_p95 > 0:
+                ratio = min(ratio, self.target_p95 / p95)
+            rpm = self._requests_last_minute(now)
+            if self.target_rpm > 0 and rpm > self.target_rpm:
+                ratio = min(ratio, self.target_rpm / rpm)
+            if sum(failed for _, _, failed in recent) * 2 >= len(recent):
+                # 一半以上的新调用失败
+                ratio = min(ratio, 0.5)
+
+        if ratio < 1.0:
+            self.share = max(self.min_share, self.share * max(ratio, 0.5))
+            self.decreases += 1
+        elif self.share < 1.0:
+            self.share = min(1.0, self.share + 0.1)
+            self.increases += 1
+
+    def scale(self) -> float:
+        """当前相对基础概率的比例（份额 × 预算节奏），也用于限制后台预生成"""
+        with self._lock:
+            self._roll_day()
+            self._maybe_adjust(self._clock())
+            return self.share * self._budget_pace()
+
+    def probability(self) -> float:
+        """当前生成AI新闻的概率"""
+        return self.base_probability * self.scale()
+
+    def budget_exhausted(self) -> bool:
+        """当天的token预算是否已经用完"""
+        with self._lock:
+            self._roll_day()
+            return 0 < self.daily_token_budget <= self.tokens_today
+
+    def statistics(self) -> Dict[str, int]:
+        """调节状态（百分比和毫秒取整）"""
+        probability = self.probability()
+        with self._lock:
+            now = self._clock()
+            self._expire(now)
+            p95 = self._p95(self._calls)
+            return {
+                "ai_probability": int(round(probability * 100)),
+                "ai_base_probability": int(round(self.base_probability * 100)),
+                "ai_share_percent": int(round(self.share * 100)),
+                "ai_latency_p95_ms": int(p95 * 1000) if p95 is not None else 0,
+                "ai_requests_last_minute": self._requests_last_minute(now),
+                "ai_tokens_today": self.tokens_today,
+                "ai_daily_token_budget": self.daily_token_budget,
+                "ai_budget_used_percent": int(self.tokens_today * 100 / self.daily_token_budget) if self.daily_token_budget > 0 else 0,
+                "ai_share_decreases": self.decreases,
+                "ai_share_increases": self.increases,
+                "ai_shed": self.shed,
+                "ai_cached_served": self.cached_served,
+            }
+
+def create_adaptive_usage() -> AdaptiveAIUsage:
+    """按配置创建"""
+    return AdaptiveAIUsage(
+        Config.NEWS_GENERATION_PROBABILITY,
+        target_p95=Config.AI_TARGET_P95_SECONDS,
+        target_rpm=Config.AI_TARGET_REQUESTS_PER_MINUTE,
+        daily_token_budget=Config.OPENAI_DAILY_TOKEN_BUDGET,
+        min_share=Config.AI_MIN_SHARE,
+        adjust_interval=Config.AI_ADJUST_SECONDS,
+    )
@@ -0,0 +1,458 @@
+"""
+策略顾问
+基于当前游戏状态，搜索未来若干回合内每个城市的 运输方式 × 能源来源 组合，
+用新闻目录的期望效果代替随机新闻（确定性等价；按 draw_news 的全国/城市比例和目录的类型、城市权重计算），
+带置换表（按 年份、金钱、各城市数值与设置 记忆搜索结果）和时间预算的迭代加深搜索。
+
+开启城市间外溢时，每回合按本局的外溢网络 (spillover.SpilloverNetwork) 模拟扩散，顺序与 advance_year 一致。
+
+局面按“还能坚持的年数”评估：金钱按期望新闻的消耗能支撑的年数，与存活城市离出局还有多少年，取较小者；
+任何更换设置都要花钱，只有换来的年数多于花掉的年数时才值得（排名规则同样是年数优先，其次金钱）。
+"""
+
+import itertools
+import time
+from typing import Dict, List, Mapping, Optional, Tuple
+
+# 城市状态元组: (happiness, co2, transportation, energy_source, eliminated)
+CityTuple = Tuple[int, int, str, str, bool]
+
+# 评估权重：以坚持的年数为主，金钱和城市数值只用来区分年数相同的局面
+YEAR_WEIGHT = 100.0
+MONEY_WEIGHT = 0.1
+CITY_WEIGHT = 0.01
+ELIMINATION_PENALTY = 1.0
+# 评估的最长年数（没有消耗、也没有城市在恶化时）
+HORIZON_CAP = 200.0
+# 城市数值每年至少按该幅度朝不利方向波动（期望效果接近0时，单条新闻仍可能让城市出局）
+VOLATILITY = 1.0
+# 候选排序时每单位金钱折算的城市数值
+RANK_MONEY_WEIGHT = 0.2
+
+# 大地图上每个节点尝试的“同名次”联合动作数量
+RANK_WIDTH = 8
+
+class _SearchTimeout(Exception):
+    """时间预算耗尽，带着当前节点已经比较过的最好结果（可能为空）"""
+
+    def __init__(self, score: float = float("-inf"), action: Optional[tuple] = None):
+        super().__init__()
+        self.score = score
+        self.action = action
+
+class StrategyAdvisor:
+    """期望值前瞻搜索的策略顾问"""
+
+    def __init__(
+        self,
+        transport_effects: Dict[str, Dict[str, int]],
+        energy_effects: Dict[str, Dict[str, int]],
+        news_events: List[Dict],
+        city_news: Dict[str, List[Dict]],
+        national_probability: float = 0.7,
+        max_branching: int = 64,
+        max_table_size: int = 200_000,
+        type_weights: Optional[Mapping[str, float]] = None,
+        city_weights: Optional[Mapping[str, float]] = None,
+    ):
+        """
+        Args:
+            news_events / city_news: 全国性新闻与各城市的专属新闻
+            national_probability: 每回合抽取全国性新闻的概率（其余抽取城市新闻）
+            type_weights / city_weights: 新闻目录的类型、城市权重（未列出的为1），与 draw_news 的抽样一致
+        """
+        self.transport_effects = transport_effects
+        self.energy_effects = energy_effects
+        self.news_events = news_events
+        self.city_news = city_news
+        self.national_probability = national_probability
+        self.type_weights = type_weights or {}
+        self.city_weights = city_weights or {}
+        # 每条新闻被抽中的概率（同一组新闻内按类型权重归一化）；全国性新闻的权重全为0时 draw_news 不加权抽取
+        self._national_probabilities = (
+            self._event_probabilities(news_events) or [1.0 / len(news_events)] * len(news_events)
+        )
+        self._city_probabilities = {city_id: self._event_probabilities(events) for city_id, events in city_news.items()}
+        self.max_branching = max_branching
+        self.max_table_size = max_table_size
+
+        # 置换表: (剩余深度, 年份, 金钱, 城市元组) -> (评分, 最优联合动作)
+        self.table: Dict[tuple, Tuple[float, Optional[tuple]]] = {}
+        # 期望新闻效果缓存: (城市ID元组, 存活标记元组) -> (金钱, 每城市幸福度, 每城市CO2)
+        self._news_cache: Dict[tuple, tuple] = {}
+        # 候选排序缓存: 当前 (运输, 能源) -> 按局部评分排好序的 (组合, 幸福度变化, CO2变化)
+        # 排序只取决于当前设置，只有“是否直接导致淘汰”取决于城市数值，在取候选时再过滤
+        self._ranked_cache: Dict[Tuple[str, str], List[tuple]] = {}
+
+        # 所有 运输 × 能源 组合，以及组合的固定效果
+        self.options = [(t, e) for t in transport_effects for e in energy_effects]
+
+        # 当前搜索使用的外溢网络，以及网络中每个城市在城市元组中的位置
+        self._spillover = None
+        self._spillover_order: List[int] = []
+
+        self.nodes = 0
+        self.table_hits = 0
+
+    @classmethod
+    def from_catalog(cls, transport_effects, energy_effects, catalog, national_probability: float = 0.7, **kwargs):
+        """按新闻目录 (news_catalog.NewsCatalog) 的新闻和权重构造"""
+        return cls(
+            transport_effects,
+            energy_effects,
+            catalog.national_events,
+            catalog.city_events,
+            national_probability,
+            type_weights=catalog.type_weights,
+            city_weights=catalog.city_weights,
+            **kwargs,
+        )
+
+    def _event_probabilities(self, events: List[Dict]) -> List[float]:
+        """按类型权重归一化的抽中概率；权重全为0时为空（draw_news 会退回全国性新闻）"""
+        weights = [self.type_weights.get(event["type"], 1.0) for event in events]
+        total = sum(weights)
+        return [weight / total for weight in weights] if total > 0 else []
+
+    # ===== 规则模型（与 game_engine.advance_year 一致） =====
+
+    def _option_effects(self, city: CityTuple, option: Tuple[str, str]) -> Tuple[int, int, int]:
+        """某城市选择某组合时的 (金钱, 幸福度, CO2) 变化；只有设置变化才产生效果"""
+        happiness, co2, transport, energy, _ = city
+        money = dh = dc = 0
+        if option[0] != transport:
+            effects = self.transport_effects[option[0]]
+            money += effects.get("money", 0)
+            dh += effects.get("happiness", 0)
+            dc += effects.get("co2", 0)
+        if option[1] != energy:
+            effects = self.energy_effects[option[1]]
+            money += effects.get("money", 0)
+            dh += effects.get("happiness", 0)
+            dc += effects.get("co2", 0)
+        return money, dh, dc
+
+    def _expected_news(self, city_ids: Tuple[str, ...], alive: Tuple[bool, ...]) -> tuple:
+        """计算一条随机新闻的期望效果"""
+        key = (city_ids, alive)
+        cached = self._news_cache.get(key)
+        if cached is not None:
+            return cached
+
+        count = len(city_ids)
+        index = {city_id: i for i, city_id in enumerate(city_ids)}
+
+        # 全国性新闻的期望：影响所有城市的部分合计为一个数，指定城市的部分单独记录
+        national_money = all_h = all_c = 0.0
+        targeted: Dict[int, List[float]] = {}
+        for event, weight in zip(self.news_events, self._national_probabilities):
+            effects = event["effects"]
+            national_money += weight * effects.get("money", 0)
+            target = index.get(effects.get("city"))
+            if target is None:
+                all_h += weight * effects.get("happiness", 0)
+                all_c += weight * effects.get("co2", 0)
+            else:
+                totals = targeted.setdefault(target, [0.0, 0.0])
+                totals[0] += weight * effects.get("happiness", 0)
+                totals[1] += weight * effects.get("co2", 0)
+
+        # 城市新闻：按城市权重在存活城市中选择；抽中没有城市新闻的城市（或没有可抽的城市）时退回全国性新闻
+        city_weights = [
+            self.city_weights.get(city_ids[i], 1.0) if alive[i] else 0.0
+            for i in range(count)
+        ]
+        total_weight = sum(weight for weight in city_weights if weight > 0)
+        fallback_weight = 0.0 if total_weight > 0 else 1.0
+        local_money = 0.0
+        local: Dict[int, List[float]] = {}
+        for i in range(count):
+            if city_weights[i] <= 0:
+                continue
+            city_weight = city_weights[i] / total_weight
+            events = self.city_news.get(city_ids[i])
+            probabilities = self._city_probabilities.get(city_ids[i])
+            if not events or not probabilities:
+                fallback_weight += city_weight
+                continue
+            totals = local[i] = [0.0, 0.0]
+            for event, probability in zip(events, probabilities):
+                event_weight = city_weight * probability
+                effects = event["effects"]
+                local_money += event_weight * effects.get("money", 0)
+                totals[0] += event_weight * effects.get("happiness", 0)
+                totals[1] += event_weight * effects.get("co2", 0)
+
+        # 合并：全国性新闻的权重为 p + (1 - p) × 退回比例，城市新闻的权重为 1 - p
+        p = self.national_probability
+        national_share = p + (1 - p) * fallback_weight
+        money = round(national_share * national_money + (1 - p) * local_money)
+        news_h = [0] * count
+        news_c = [0] * count
+        zero = (0.0, 0.0)
+        for i in range(count):
+            if not alive[i]:
+                continue
+            target = targeted.get(i, zero)
+            own = local.get(i, zero)
+            news_h[i] = round(national_share * (all_h + target[0]) + (1 - p) * own[0])
+            news_c[i] = round(national_share * (all_c + target[1]) + (1 - p) * own[1])
+        result = (money, tuple(news_h), tuple(news_c))
+        self._news_cache[key] = result
+        return result
+
+    def _apply_action(self, money: int, cities: Tuple[CityTuple, ...], action: tuple):
+        """应用联合动作（设置变化），返回 (新金钱, 新城市列表)"""
+        new_cities = []
+        for city, option in zip(cities, action):
+            if city[4] or option is None:
+                new_cities.append(city)
+                continue
+            # 与 EFFECTS.apply_settings 一致：先应用运输、再应用能源，每次应用后分别截断到 0-100
+            happiness, co2 = city[0], city[1]
+            for table, old, new in ((self.transport_effects, city[2], option[0]), (self.energy_effects, city[3], option[1])):
+                if new != old:
+                    effects = table[new]
+                    money += effects.get("money", 0)
+                    happiness = max(0, min(100, happiness + effects.get("happiness", 0)))
+                    co2 = max(0, min(100, co2 + effects.get("co2", 0)))
+            new_cities.append((happiness, co2, option[0], option[1], happiness <= 0 or co2 >= 100))
+        return money, new_cities
+
+    def _step(self, city_ids, money: int, cities: Tuple[CityTuple, ...], action: tuple, acted=None):
+        """按期望新闻推进一回合，返回 (新金钱, 新城市元组, 游戏是否结束)；acted 为已经算好的 _apply_action 结果"""
+        money, new_cities = acted or self._apply_action(money, cities, action)
+        if self._spillover is not None:
+            new_cities = self._apply_spillover(cities, new_cities)
+        if money <= 0 or all(city[4] for city in new_cities):
+            return money, tuple(new_cities), True
+
+        # 期望新闻效果
+        alive = tuple(not city[4] for city in new_cities)
+        news_money, news_h, news_c = self._expected_news(city_ids, alive)
+        money += news_money
+        for i, city in enumerate(new_cities):
+            if city[4] or (news_h[i] == 0 and news_c[i] == 0):
+                continue
+            happiness = max(0, min(100, city[0] + news_h[i]))
+            co2 = max(0, min(100, city[1] + news_c[i]))
+            new_cities[i] = (happiness, co2, city[2], city[3], happiness <= 0 or co2 >= 100)
+
+        game_over = money <= 0 or all(city[4] for city in new_cities)
+        return money, tuple(new_cities), game_over
+
+    def _apply_spillover(self, cities: Tuple[CityTuple, ...], new_cities: List[CityTuple]) -> List[CityTuple]:
+        """设置变化之后、淘汰检查之前的城市间外溢（本回合开始时已淘汰的城市不参与）"""
+        order = self._spillover_order
+        happiness_deltas, co2_deltas = self._spillover.deltas(
+            [new_cities[i][0] for i in order],
+            [new_cities[i][1] for i in order],
+            [not cities[i][4] for i in order],
+        )
+        new_cities = list(new_cities)
+        for i, dh, dc in zip(order, happiness_deltas, co2_deltas):
+            if cities[i][4]:
+                continue
+            city = new_cities[i]
+            happiness = max(0, min(100, city[0] + dh))
+            co2 = max(0, min(100, city[1] + dc))
+            new_cities[i] = (happiness, co2, city[2], city[3], happiness <= 0 or co2 >= 100)
+        return new_cities
+
+    # ===== 搜索 =====
+
+    def _horizon(self, city_ids, money: int, cities: Tuple[CityTuple, ...]) -> float:
+        """
+        按期望新闻估计还能坚持的年数：
+        金钱能支撑的年数，与“最后一个存活城市出局”的年数，取较小者
+        """
+        alive = tuple(not city[4] for city in cities)
+        if money <= 0 or not any(alive):
+            return 0.0
+        news_money, news_h, news_c = self._expected_news(city_ids, alive)
+        runway = money / -news_money if news_money < 0 else HORIZON_CAP
+
+        # 游戏在所有城市出局时结束，取坚持最久的城市
+        cities_left = 0.0
+        for i, (happiness, co2, _, _, eliminated) in enumerate(cities):
+            if eliminated:
+                continue
+            years = min(happiness / max(VOLATILITY, -news_h[i]), (100 - co2) / max(VOLATILITY, news_c[i]))
+            if years > cities_left:
+                cities_left = years
+                if cities_left >= runway:
+                    break
+        return min(runway, cities_left, HORIZON_CAP)
+
+    def _evaluate(self, city_ids, money: int, cities: Tuple[CityTuple, ...]) -> float:
+        """静态评估：坚持的年数为主，金钱、存活城市的幸福度与CO2余量为次"""
+        score = YEAR_WEIGHT * self._horizon(city_ids, money, cities) + MONEY_WEIGHT * money
+        for happiness, co2, _, _, eliminated in cities:
+            if eliminated:
+                score -= ELIMINATION_PENALTY
+            else:
+                score += CITY_WEIGHT * (happiness + (100 - co2))
+        return score
+
+    def _ranked_options(self, city: CityTuple, limit: int) -> List[tuple]:
+        """某城市按局部评分排在最前的 limit 个组合（保持现状排在最前，跳过直接导致淘汰的组合）"""
+        keep = (city[2], city[3])
+        candidates = self._ranked_cache.get(keep)
+        if candidates is None:
+            scored = []
+            for option in self.options:
+                if option == keep:
+                    continue
+                delta_money, dh, dc = self._option_effects(city, option)
+                scored.append((dh - dc + RANK_MONEY_WEIGHT * delta_money, option, dh, dc))
+            scored.sort(key=lambda item: item[0], reverse=True)
+            candidates = self._ranked_cache[keep] = [item[1:] for item in scored]
+
+        ranked = [keep]
+        happiness, co2 = city[0], city[1]
+        for option, dh, dc in candidates:
+            if len(ranked) >= limit:
+                break
+            if happiness + dh > 0 and co2 + dc < 100:
+                ranked.append(option)
+        return ranked
+
+    def _joint_actions(self, cities: Tuple[CityTuple, ...]):
+        """
+        生成联合动作：城市较少时取每个城市前若干候选的笛卡尔积；
+        城市较多、笛卡尔积超过分支上限时，退化为“所有城市取同一名次候选”的少量联合动作
+        """
+        alive = sum(1 for city in cities if not city[4])
+        per_city = int(self.max_branching ** (1.0 / max(1, alive)))
+        limit = per_city if per_city >= 2 else RANK_WIDTH
+        ranked = [None if city[4] else self._ranked_options(city, limit) for city in cities]
+
+        if per_city >= 2:
+            return itertools.product(*[[None] if options is None else options for options in ranked])
+
+        # 按需生成，超时时不必构造剩下的联合动作
+        return (
+            tuple(None if options is None else options[min(rank, len(options) - 1)] for options in ranked)
+            for rank in range(RANK_WIDTH)
+        )
+
+    def _search(self, city_ids, year: int, money: int, cities, depth: int, deadline: float) -> Tuple[float, Optional[tuple]]:
+        """深度受限的最大化搜索，返回 (评分, 最优联合动作)"""
+        key = (depth, year, money, cities)
+        cached = self.table.get(key)
+        if cached is not None:
+            self.table_hits += 1
+            return cached
+
+        self.nodes += 1
+        if time.perf_counter() > deadline:
+            raise _SearchTimeout()
+
+        best_score = float("-inf")
+        best_action = None
+        # 每比较一个联合动作检查一次时间（大地图上单个节点的动作也可能很多）；
+        # 超时时带着本节点已比较过的最好动作退出，根节点的结果在 advise 中使用
+        for action in self._joint_actions(cities):
+            if best_action is not None and time.perf_counter() > deadline:
+                raise _SearchTimeout(best_score, best_action)
+            acted = self._apply_action(money, cities, action)
+            if acted[0] <= 0 and best_action is not None:
+                # 把钱花光的动作必然立即结束游戏，而保持现状（第一个动作）还可能遇到增加金钱的新闻
+                continue
+            new_money, new_cities, game_over = self._step(city_ids, money, cities, action, acted)
+            if game_over:
+                # 搜索范围内剩下的年数都没有坚持下来，越晚结束越好
+                score = self._evaluate(city_ids, new_money, new_cities) - YEAR_WEIGHT * (depth - 1)
+            elif depth <= 1:
+                score = self._evaluate(city_ids, new_money, new_cities)
+            else:
+                try:
+                    score, _ = self._search(city_ids, year + 1, new_money, new_cities, depth - 1, deadline)
+                except _SearchTimeout:
+                    raise _SearchTimeout(best_score, best_action) from None
+            if score > best_score:
+                best_score, best_action = score, action
+
+        result = (best_score, best_action)
+        if len(self.table) >= self.max_table_size:
+            self.table.clear()
+        self.table[key] = result
+        return result
+
+    def advise(self, year: int, money: int, cities: Dict[str, object], max_depth: int = 4, budget_ms: float = 80.0,
+               spillover=None) -> Dict:
+        """
+        给出下一回合每个城市的推荐选择
+
+        Args:
+            year: 当前年份
+            money: 当前金钱
+            cities: 城市ID -> 城市对象（需有 happiness/co2/transportation/energy_source/eliminated 属性）
+            max_depth: 最大搜索深度（回合数）
+            budget_ms: 时间预算（毫秒），超时返回最后一次完成的搜索结果
+                       （第一层都没有完成时返回已比较过的最好动作）
+            spillover: 本局的城市外溢网络，None表示城市之间互不影响
+
+        Returns:
+            推荐结果与搜索统计
+        """
+        start = time.perf_counter()
+        deadline = start + budget_ms / 1000.0
+        self.nodes = 0
+        self.table_hits = 0
+
+        city_ids = tuple(cities)
+        if spillover is not self._spillover:
+            # 置换表中的结果取决于是否（按哪张地图）模拟外溢
+            self.table.clear()
+            self._spillover = spillover
+        if spillover is not None:
+            index = {city_id: i for i, city_id in enumerate(city_ids)}
+            self._spillover_order = [index[city_id] for city_id in spillover.city_ids]
+        root = tuple(
+            (city.happiness, city.co2, city.transportation, city.energy_source, city.eliminated)
+            for city in cities.values()
+        )
+
+        best_score, best_action, depth_reached = None, None, 0
+        for depth in range(1, max_depth + 1):
+            try:
+                score, action = self._search(city_ids, year, money, root, depth, deadline)
+            except _SearchTimeout as timeout:
+                if best_action is None and timeout.action is not None:
+                    best_score, best_action = timeout.score, timeout.action
+                break
+            best_score, best_action, depth_reached = score, action, depth
+            if time.perf_counter() > deadline:
+                break
+
+        recommendations = {}
+        projected = None
+        if best_action is not None:
+            for city_id, city, option in zip(city_ids, root, best_action):
+                if option is None:
+                    continue
+                delta_money, dh, dc = self._option_effects(city, option)
+                recommendations[city_id] = {
+                    "transportation": option[0],
+                    "energy_source": option[1],
+                    "effects": {"money": delta_money, "happiness": dh, "co2": dc},
+                }
+            new_money, new_cities, game_over = self._step(city_ids, money, root, best_action)
+            projected = {
+                "money": new_money,
+                "cities": {city_id: {"happiness": c[0], "co2": c[1], "eliminated": c[4]} for city_id, c in zip(city_ids, new_cities)},
+                "game_over": game_over,
+            }
+
+        return {
+            "recommendations": recommendations,
+            "expected_score": best_score,
+            "projected_next_year": projected,
+            "depth": depth_reached,
+            "nodes": self.nodes,
+            "table_hits": self.table_hits,
+            "table_size": len(self.table),
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 2),
+            "spillover": spillover is not None,
+        }
@@ -0,0 +1,190 @@
+"""
+回合数据导出
+每回合结算时只把一条紧凑的回合记录追加到内存批次中（请求路径上没有I/O），
+批次达到条数上限或超过时间间隔后交给后台线程展开成“每回合每城市一行”的表格，
+写成 Parquet（安装了 pyarrow 时，zstd 压缩）或 gzip 压缩的 CSV 文件。
+待写批次的数量有上限，写入跟不上时丢弃最新的批次并计数，内存占用保持有界。
+"""
+
+import csv
+import gzip
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+    pyarrow_available = True
+except ImportError:
+    pyarrow_available = False
+
+COLUMNS = (
+    "timestamp", "session_id", "seed", "year", "city",
+    "transportation_before", "transportation", "energy_before", "energy_source",
+    "happiness_before", "co2_before", "happiness", "co2", "eliminated",
+    "money_before", "money",
+    "news_type", "news_source", "news_city", "news_money", "news_happiness", "news_co2",
+)
+
+def city_snapshot(state) -> tuple:
+    """城市数值与设置的不可变快照: ((城市ID, 幸福度, CO2, 运输方式, 能源来源, 是否淘汰), ...)"""
+    return tuple(
+        (city_id, city.happiness, city.co2, city.transportation, city.energy_source, city.eliminated)
+        for city_id, city in state.cities.items()
+    )
+
+def expand_rounds(records: List[tuple]) -> List[tuple]:
+    """把回合记录展开成每回合每城市一行"""
+    rows = []
+    for created, session_id, seed, year, money_before, before, money, after, news in records:
+        timestamp = datetime.fromtimestamp(created).isoformat()
+        effects = news.get("effects", {}) if news else {}
+        news_fields = (
+            news.get("type") if news else None,
+            news.get("source") if news else None,
+            effects.get("city"),
+            effects.get("money", 0),
+            effects.get("happiness", 0),
+            effects.get("co2", 0),
+        )
+        for old, new in zip(before, after):
+            rows.append((
+                timestamp, session_id, seed, year, new[0],
+                old[3], new[3], old[4], new[4],
+                old[1], old[2], new[1], new[2], new[5],
+                money_before, money,
+            ) + news_fields)
+    return rows
+
+class RoundExporter:
+    """异步回合数据导出器"""
+
+    def __init__(self, directory: Optional[str], batch_rounds: int = 10000, flush_seconds: float = 10.0,
+                 max_pending_batches: int = 8, file_format: str = "auto"):
+        self.directory = directory
+        self.batch_rounds = batch_rounds
+        self.flush_seconds = flush_seconds
+        if file_format == "auto":
+            file_format = "parquet" if pyarrow_available else "csv"
+        elif file_format == "parquet" and not pyarrow_available:
+            print("Warning: pyarrow not available, exporting rounds as gzip CSV")
+            file_format = "csv"
+        self.file_format = file_format
+
+        self._lock = threading.Lock()
+        self._batch: List[tuple] = []
+        self._batch_started = time.monotonic()
+        self._pending: "queue.Queue[Optional[List[tuple]]]" = queue.Queue(maxsize=max_pending_batches)
+        self._thread: Optional[threading.Thread] = None
+        self._file_sequence = 0
+
+        self.running = False
+        self.recorded_rounds = 0
+        self.dropped_rounds = 0
+        self.written_rows = 0
+        self.written_files = 0
+
+    def start(self):
+        """启动后台写入线程"""
+        if self.running or not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self.running = True
+        self._thread = threading.Thread(target=self._run, name="round-exporter", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """写出剩余数据并停止后台线程"""
+        if not self.running:
+            return
+        self.running = False
+        self._hand_off(force=True)
+        self._pending.put(None)
+        self._thread.join()
+
+    def record(self, session_id: str, seed: int, year: int, money_before: int, before: tuple, state, news: Optional[Dict]):
+        """记录一回合的结果（before 为结算前的 city_snapshot，state 为结算后的状态）"""
+        if not self.running:
+            return
+        record = (time.time(), session_id, seed, year, money_before, before, state.money, city_snapshot(state), news)
+        with self._lock:
+            if not self._batch:
+                self._batch_started = time.monotonic()
+            self._batch.append(record)
+            self.recorded_rounds += 1
+            full = len(self._batch) >= self.batch_rounds
+        if full:
+            self._hand_off()
+
+    def _hand_off(self, force: bool = False):
+        """把当前批次交给后台线程；待写队列已满时丢弃该批次"""
+        with self._lock:
+            if not self._batch:
+                return
+            if not force and len(self._batch) < self.batch_rounds and time.monotonic() - self._batch_started < self.flush_seconds:
+                return
+            batch, self._batch = self._batch, []
+            self._batch_started = time.monotonic()
+
+        try:
+            if force:
+                self._pending.put(batch)
+            else:
+                self._pending.put_nowait(batch)
+        except queue.Full:
+            with self._lock:
+                self.dropped_rounds += len(batch)
+
+    def _run(self):
+        while True:
+            try:
+                batch = self._pending.get(timeout=self.flush_seconds)
+            except queue.Empty:
+                # 按时间阈值写出未满的批次
+                self._hand_off()
+                continue
+            if batch is None:
+                return
+            try:
+                self._write(batch)
+            except Exception as e:
+                print(f"Warning: failed to export {len(batch)} rounds: {e}")
+
+    def _write(self, records: List[tuple]):
+        """写出一个批次（先写临时文件再重命名，读取方不会看到写了一半的文件）"""
+        rows = expand_rounds(records)
+        self._file_sequence += 1
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        extension = "parquet" if self.file_format == "parquet" else "csv.gz"
+        path = os.path.join(self.directory, f"rounds-{stamp}-{os.getpid()}-{self._file_sequence:06d}.{extension}")
+        temp_path = path + ".tmp"
+
+        if self.file_format == "parquet":
+            columns = {name: [row[i] for row in rows] for i, name in enumerate(COLUMNS)}
+            pyarrow.parquet.write_table(pyarrow.table(columns), temp_path, compression="zstd")
+        else:
+            with gzip.open(temp_path, "wt", newline="", encoding="utf-8", compresslevel=6) as f:
+                writer = csv.writer(f)
+                writer.writerow(COLUMNS)
+                writer.writerows(rows)
+        os.replace(temp_path, path)
+
+        self.written_rows += len(rows)
+        self.written_files += 1
+
+    def statistics(self) -> Dict:
+        """导出统计"""
+        return {
+            "enabled": self.running,
+            "format": self.file_format,
+            "directory": self.directory,
+            "recorded_rounds": self.recorded_rounds,
+            "dropped_rounds": self.dropped_rounds,
+            "pending_batches": self._pending.qsize(),
+            "written_rows": self.written_rows,
+            "written_files": self.written_files,
+        }
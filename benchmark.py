@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+"""
+性能基准测试脚本
+测量游戏服务热点路径的耗时。
+
+用法:
+    python benchmark.py serialization [--cities 1000] [--iterations 2000]
+    python benchmark.py news-sampling [--iterations 100000]
+    python benchmark.py news-dedup [--items 50000] [--iterations 2000]
+    python benchmark.py leaderboard [--entries 1000000] [--iterations 10000]
+    python benchmark.py analytics [--rounds 200000]
+    python benchmark.py engine [--games 2000]
+    python benchmark.py snapshots [--cities 1000] [--versions 32]
+    python benchmark.py spillover [--cities 5000] [--iterations 50]
+    python benchmark.py procedural-news [--items 100000]
+    python benchmark.py savegame [--cities 1000] [--years 2000]
+    python benchmark.py models [--cities 10000] [--iterations 20]
+"""
+
+import argparse
+import json
+import time
+
+def _timeit(func, iterations: int) -> float:
+    """运行指定次数，返回每次调用的平均耗时(微秒)"""
+    func()  # 预热
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+def _build_state(city_count: int):
+    """构造包含指定数量城市的游戏状态"""
+    from game_engine import initial_cities_data
+    from models import City, GameState
+    from news_catalog import get_catalog
+
+    templates = list(initial_cities_data.values())
+    cities = {}
+    for i in range(city_count):
+        data = dict(templates[i % len(templates)])
+        data["name"] = f"{data['name']} {i}"
+        data["position"] = {"x": i % 500, "y": i // 500}
+        cities[f"city_{i}"] = City(**data)
+
+    state = GameState(cities=cities)
+    state.last_news = dict(get_catalog().national_events[0], timestamp="2025-01-01T00:00:00", source="Traditional")
+    return state
+
+def bench_serialization(city_count: int, iterations: int):
+    """对比 FastAPI 默认编码路径与 orjson 快速路径"""
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+    from serialization import FastJSONResponse, orjson_available
+
+    state = _build_state(city_count)
+    payloads = {
+        "/state": state,
+        "/next-round": {"news": state.last_news, "year": state.year, "state": state},
+    }
+
+    print(f"=== serialization ({city_count} cities, {iterations} iterations, orjson={orjson_available}) ===")
+    for endpoint, payload in payloads.items():
+        default_us = _timeit(lambda: JSONResponse(jsonable_encoder(payload)), iterations)
+        fast_us = _timeit(lambda: FastJSONResponse(payload), iterations)
+
+        # 确认两条路径输出的内容一致
+        assert json.loads(JSONResponse(jsonable_encoder(payload)).body) == json.loads(FastJSONResponse(payload).body)
+
+        print(f"{endpoint:12s} default: {default_us:10.1f} us   fast: {fast_us:10.1f} us   speedup: {default_us / fast_us:5.1f}x")
+
+def bench_news_sampling(iterations: int):
+    """新闻抽样耗时随目录规模的变化（别名表应保持常数时间）"""
+    import random
+    from news_catalog import NewsCatalog
+
+    rng = random.Random(0)
+    print(f"=== news sampling ({iterations} iterations) ===")
+    for size in (10, 1000, 100000):
+        events = [
+            {"type": f"type_{i % 50}", "title": f"News {i}", "description": "", "effects": {"money": -i % 100}}
+            for i in range(size)
+        ]
+        catalog = NewsCatalog(events, {"stockholm": events}, events, type_weights={"type_0": 5.0})
+        national_us = _timeit(lambda: catalog.sample_national(rng), iterations)
+        city_us = _timeit(lambda: catalog.sample_city_event("stockholm", rng), iterations)
+        preset_us = _timeit(lambda: catalog.sample_preset(rng, "type_3"), iterations)
+        print(f"{size:7d} items  national: {national_us:6.2f} us   city: {city_us:6.2f} us   preset by type: {preset_us:6.2f} us")
+
+def bench_news_dedup(item_count: int, iterations: int):
+    """近似去重索引在大量已存新闻下的查询耗时与判重效果"""
+    import random
+    from news_dedup import MinHashIndex
+
+    rng = random.Random(0)
+    # 2000个随机的两字“词”，每条新闻由40个词组成
+    words = ["".join(chr(rng.randrange(0x4E00, 0x9FA5)) for _ in range(2)) for _ in range(2000)]
+
+    def random_story():
+        return "".join(rng.choice(words) for _ in range(40)) + f"{rng.randrange(10 ** 6)}"
+
+    index = MinHashIndex()
+    stories = [random_story() for _ in range(item_count)]
+    for story in stories:
+        index.add(index.signature(story))
+
+    queries = [random_story() for _ in range(iterations)]
+    near = [story[:-6] + "改动" + story[-4:] for story in rng.sample(stories, min(iterations, item_count))]
+
+    print(f"=== news dedup ({item_count} stored items, {len(queries)} queries) ===")
+    signature_us = _timeit(lambda: index.signature(queries[0]), iterations)
+    start = time.perf_counter()
+    false_hits = sum(1 for text in queries if index.query(index.signature(text)) is not None)
+    novel_us = (time.perf_counter() - start) / len(queries) * 1e6
+    start = time.perf_counter()
+    hits = sum(1 for text in near if index.query(index.signature(text)) is not None)
+    near_us = (time.perf_counter() - start) / len(near) * 1e6
+    print(f"signature: {signature_us:7.1f} us")
+    print(f"new story:      {novel_us:7.1f} us per lookup   flagged as duplicate: {false_hits}/{len(queries)}")
+    print(f"near duplicate: {near_us:7.1f} us per lookup   detected: {hits}/{len(near)}")
+
+def bench_leaderboard(entry_count: int, iterations: int):
+    """排行榜在大量记录下的插入、名次和前K名查询耗时"""
+    import random
+    from leaderboard import Leaderboard, sortedcontainers_available
+
+    rng = random.Random(0)
+    board = Leaderboard(max_entries=entry_count)
+
+    def record(i):
+        board.record(f"session_{i}", i, rng.randrange(1, 200), rng.randrange(-500, 5000), rng.uniform(0, 100), rng.uniform(0, 100))
+
+    start = time.perf_counter()
+    for i in range(entry_count):
+        record(i)
+    fill_s = time.perf_counter() - start
+
+    print(f"=== leaderboard ({entry_count} entries, {iterations} iterations, sortedcontainers={sortedcontainers_available}) ===")
+    counter = iter(range(entry_count, entry_count + 10 * iterations))
+    record_us = _timeit(lambda: record(next(counter)), iterations)
+    rank_us = _timeit(lambda: board.session_rank(f"session_{rng.randrange(entry_count)}"), iterations)
+    top_us = _timeit(lambda: board.top(10), iterations)
+    print(f"fill: {fill_s:.1f} s   record: {record_us:6.2f} us   session rank: {rank_us:6.2f} us   top 10: {top_us:6.2f} us")
+
+def bench_analytics(rounds: int):
+    """回合导出：请求路径上的记录耗时与后台写出吞吐"""
+    import tempfile
+    from analytics import RoundExporter, city_snapshot
+
+    state = _build_state(3)
+    news = state.last_news
+    with tempfile.TemporaryDirectory() as directory:
+        exporter = RoundExporter(directory, batch_rounds=20000, max_pending_batches=max(1, rounds // 20000 + 1), file_format="csv")
+        exporter.start()
+        before = city_snapshot(state)
+        start = time.perf_counter()
+        record_us = _timeit(lambda: exporter.record("session", 0, 1, 1000, before, state, news), rounds)
+        exporter.stop()
+        total_s = time.perf_counter() - start
+        stats = exporter.statistics()
+
+    print(f"=== analytics ({rounds} rounds, format={stats['format']}) ===")
+    print(f"record: {record_us:6.2f} us per round   end to end: {stats['written_rows'] / len(state.cities) / total_s:,.0f} rounds/s   "
+          f"files: {stats['written_files']}   dropped: {stats['dropped_rounds']}")
+
+def bench_engine(games: int):
+    """只用规则引擎（不导入FastAPI）连续模拟多局游戏的速度"""
+    import random
+    import sys
+    from game_engine import CityChoice, create_game_state, play_round, queue_policy
+    from news_catalog import get_catalog
+
+    catalog = get_catalog()
+    policy = {"stockholm": CityChoice("train", "wind"), "malmo": CityChoice(None, "solar")}
+
+    rounds = 0
+    start = time.perf_counter()
+    for seed in range(games):
+        rng = random.Random(seed)
+        state = create_game_state(seed)
+        sampler = catalog.city_sampler(state.cities)
+        while not state.game_over and state.year < 1000:
+            queue_policy(state, policy)
+            play_round(state, catalog, rng, sampler)
+            rounds += 1
+    elapsed = time.perf_counter() - start
+
+    print(f"=== engine ({games} games, fastapi imported: {'fastapi' in sys.modules}) ===")
+    print(f"{rounds} rounds in {elapsed:.2f} s   {rounds / elapsed:,.0f} rounds/s   {games / elapsed:,.0f} games/s")
+
+def bench_snapshots(city_count: int, versions: int):
+    """快照：每回合只改变一个城市时的快照耗时、共享比例，与深拷贝对比"""
+    import copy
+    from snapshots import SnapshotHistory, restore_snapshot, take_snapshot
+
+    state = _build_state(city_count)
+    city_ids = list(state.cities)
+    history = SnapshotHistory(versions)
+
+    def change_and_snapshot():
+        city = state.cities[city_ids[state.year % city_count]]
+        city.happiness = (city.happiness + 1) % 100
+        state.year += 1
+        history.push(take_snapshot(state, history.latest))
+
+    for _ in range(versions):
+        change_and_snapshot()
+
+    # 统计保留的版本中不同城市记录的数量（共享的记录只算一次）
+    snapshots = list(history._undo)
+    distinct = len({id(record) for snapshot in snapshots for record in snapshot.records()})
+    total = city_count * len(snapshots)
+
+    print(f"=== snapshots ({city_count} cities, {versions} versions) ===")
+    snapshot_us = _timeit(change_and_snapshot, 1000)
+    restore_us = _timeit(lambda: restore_snapshot(history.latest), 200)
+    deepcopy_us = _timeit(lambda: copy.deepcopy(state), 200)
+    print(f"snapshot: {snapshot_us:8.1f} us   restore: {restore_us:8.1f} us   deepcopy: {deepcopy_us:8.1f} us")
+    print(f"city records kept: {distinct} of {total} ({distinct / total:.1%} without sharing)")
+
+def bench_spillover(city_count: int, iterations: int):
+    """城市外溢：相邻关系构建耗时与每回合稀疏矩阵乘向量的耗时"""
+    import random
+    from spillover import SpilloverNetwork
+
+    rng = random.Random(0)
+    state = _build_state(city_count)
+    # 城市随机散布在面积与城市数成正比的地图上（平均每个城市的相邻城市数大致不变）
+    side = int((city_count * 20000) ** 0.5)
+    for city in state.cities.values():
+        city.position = {"x": rng.randrange(side), "y": rng.randrange(side)}
+        city.happiness = rng.randrange(1, 100)
+        city.co2 = rng.randrange(0, 99)
+
+    start = time.perf_counter()
+    network = SpilloverNetwork(state.cities, radius=200, rate=0.1)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    print(f"=== spillover ({city_count} cities, {network.edge_count} edges) ===")
+    apply_us = _timeit(lambda: network.apply(state), iterations)
+    print(f"build: {build_ms:8.1f} ms   per round: {apply_us / 1000:8.2f} ms   per edge: {apply_us / max(1, network.edge_count):6.3f} us")
+
+def bench_procedural_news(item_count: int):
+    """程序化新闻：单条生成耗时与批量填充新闻池的吞吐量"""
+    import random
+    from config import Config
+    from procedural_news import ProceduralNewsGenerator
+
+    rng = random.Random(0)
+    generator = ProceduralNewsGenerator.from_file(Config.NEWS_GRAMMAR_PATH)
+    print(f"=== procedural news ({len(generator.news_types)} types) ===")
+    compose_us = _timeit(lambda: generator.compose(generator.news_types[0], rng), 10000)
+
+    start = time.perf_counter()
+    items = generator.fill(item_count, rng=rng)
+    elapsed = time.perf_counter() - start
+    distinct = len({item["title"] + item["description"] for item in items})
+    print(f"compose: {compose_us:6.2f} us   fill: {item_count / elapsed:10.0f} items/s   distinct: {distinct} of {item_count}")
+
+def bench_savegame(city_count: int, years: int):
+    """存档：二进制存档与JSON（状态 + 历史）的大小和编码/解码耗时"""
+    import random
+    from history import GameHistory
+    from models import GameState
+    from savegame import dump_game, load_game, msgpack_available
+
+    rng = random.Random(0)
+    state = _build_state(city_count)
+    history = GameHistory(state.cities, years)
+    for year in range(1, years + 1):
+        state.year = year
+        state.money = rng.randrange(-500, 5000)
+        for city in state.cities.values():
+            city.happiness = rng.randrange(0, 101)
+            city.co2 = rng.randrange(0, 101)
+        history.record(state)
+
+    def dump_json() -> bytes:
+        return json.dumps({"state": state.model_dump(), "history": history.query()}).encode("utf-8")
+
+    def load_json(data: bytes):
+        document = json.loads(data)
+        return GameState.model_validate(document["state"]), document["history"]
+
+    json_data = dump_json()
+    binary_data = dump_game(state, history, rng)
+    assert load_game(binary_data).state == state
+
+    print(f"=== savegame ({city_count} cities, {years} years, msgpack: {msgpack_available}) ===")
+    iterations = 20
+    json_dump_us = _timeit(dump_json, iterations)
+    json_load_us = _timeit(lambda: load_json(json_data), iterations)
+    binary_dump_us = _timeit(lambda: dump_game(state, history, rng), iterations)
+    binary_load_us = _timeit(lambda: load_game(binary_data).build_history(years), iterations)
+    print(f"json:   {len(json_data) / 1024:9.1f} KiB   dump: {json_dump_us / 1000:7.2f} ms   load: {json_load_us / 1000:7.2f} ms")
+    print(f"binary: {len(binary_data) / 1024:9.1f} KiB   dump: {binary_dump_us / 1000:7.2f} ms   load: {binary_load_us / 1000:7.2f} ms")
+    print(f"size: {len(json_data) / len(binary_data):5.1f}x smaller   dump: {json_dump_us / binary_dump_us:5.1f}x   load: {json_load_us / binary_load_us:5.1f}x")
+
+def bench_models(city_count: int, iterations: int):
+    """内部可信数据跳过校验的节省：开局建状态、回合切换、撤销/预览重建状态"""
+    from game_engine import initial_cities_data
+    from models import City, GameState, RoundChanges
+    from snapshots import _CITY_FIELDS, take_snapshot
+
+    templates = list(initial_cities_data.values())
+    cities_data = {
+        f"city_{i}": dict(templates[i % len(templates)], position={"x": i % 500, "y": i // 500})
+        for i in range(city_count)
+    }
+    cities = {city_id: City(**data) for city_id, data in cities_data.items()}
+
+    # 开局：城市已经是校验过的实例，比较外层状态的构造
+    def restart_validated():
+        return GameState(cities=dict(cities), year=1, seed=0)
+
+    def restart_trusted():
+        return GameState.trusted(cities=dict(cities), year=1, seed=0, current_round_changes=RoundChanges.trusted())
+
+    # 撤销/预览：按快照中的城市记录重建全部城市
+    snapshot = take_snapshot(restart_trusted())
+    records = list(zip(snapshot.city_ids, snapshot.records()))
+
+    def restore_validated():
+        return {
+            city_id: City(name=record[0], happiness=record[1], co2=record[2], transportation=record[3],
+                          energy_source=record[4], eliminated=record[5], position=dict(record[6]))
+            for city_id, record in records
+        }
+
+    def restore_trusted():
+        restored = {}
+        for city_id, record in records:
+            data = dict(zip(_CITY_FIELDS, record))
+            data["position"] = dict(record[6])
+            restored[city_id] = City.trusted_from_dict(data)
+        return restored
+
+    assert restart_validated() == restart_trusted()
+    assert restore_validated() == restore_trusted()
+
+    print(f"=== models ({city_count} cities) ===")
+    rows = [
+        ("restart state", _timeit(restart_validated, iterations), _timeit(restart_trusted, iterations)),
+        ("restore cities", _timeit(restore_validated, iterations), _timeit(restore_trusted, iterations)),
+        ("round changes", _timeit(RoundChanges, 100000), _timeit(RoundChanges.trusted, 100000)),
+    ]
+    for name, validated_us, trusted_us in rows:
+        print(f"{name:14s} validated: {validated_us:10.2f} us   trusted: {trusted_us:10.2f} us   speedup: {validated_us / trusted_us:4.1f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description="游戏服务性能基准测试")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serialization = subparsers.add_parser("serialization", help="响应序列化耗时")
+    serialization.add_argument("--cities", type=int, default=3)
+    serialization.add_argument("--iterations", type=int, default=2000)
+
+    news_sampling = subparsers.add_parser("news-sampling", help="新闻目录抽样耗时")
+    news_sampling.add_argument("--iterations", type=int, default=100000)
+
+    news_dedup = subparsers.add_parser("news-dedup", help="AI新闻近似去重查询耗时")
+    news_dedup.add_argument("--items", type=int, default=50000)
+    news_dedup.add_argument("--iterations", type=int, default=2000)
+
+    leaderboard = subparsers.add_parser("leaderboard", help="排行榜插入与查询耗时")
+    leaderboard.add_argument("--entries", type=int, default=1000000)
+    leaderboard.add_argument("--iterations", type=int, default=10000)
+
+    analytics = subparsers.add_parser("analytics", help="回合数据导出耗时")
+    analytics.add_argument("--rounds", type=int, default=200000)
+
+    engine = subparsers.add_parser("engine", help="规则引擎模拟速度")
+    engine.add_argument("--games", type=int, default=2000)
+
+    snapshots = subparsers.add_parser("snapshots", help="回合快照（撤销/预览）耗时与内存共享")
+    snapshots.add_argument("--cities", type=int, default=1000)
+    snapshots.add_argument("--versions", type=int, default=32)
+
+    spillover = subparsers.add_parser("spillover", help="城市外溢稀疏矩阵计算耗时")
+    spillover.add_argument("--cities", type=int, default=5000)
+    spillover.add_argument("--iterations", type=int, default=50)
+
+    procedural_news = subparsers.add_parser("procedural-news", help="程序化新闻生成速度")
+    procedural_news.add_argument("--items", type=int, default=100000)
+
+    savegame = subparsers.add_parser("savegame", help="二进制存档与JSON的大小和耗时")
+    savegame.add_argument("--cities", type=int, default=1000)
+    savegame.add_argument("--years", type=int, default=2000)
+
+    models = subparsers.add_parser("models", help="跳过校验的内部模型构造耗时")
+    models.add_argument("--cities", type=int, default=10000)
+    models.add_argument("--iterations", type=int, default=20)
+
+    args = parser.parse_args()
+    if args.command == "serialization":
+        bench_serialization(args.cities, args.iterations)
+    elif args.command == "news-sampling":
+        bench_news_sampling(args.iterations)
+    elif args.command == "news-dedup":
+        bench_news_dedup(args.items, args.iterations)
+    elif args.command == "leaderboard":
+        bench_leaderboard(args.entries, args.iterations)
+    elif args.command == "analytics":
+        bench_analytics(args.rounds)
+    elif args.command == "engine":
+        bench_engine(args.games)
+    elif args.command == "snapshots":
+        bench_snapshots(args.cities, args.versions)
+    elif args.command == "spillover":
+        bench_spillover(args.cities, args.iterations)
+    elif args.command == "procedural-news":
+        bench_procedural_news(args.items)
+    elif args.command == "savegame":
+        bench_savegame(args.cities, args.years)
+    elif args.command == "models":
+        bench_models(args.cities, args.iterations)
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
+import json
 import os
-from typing import Optional
+from typing import Dict, Optional
 
 class Config:
     """游戏配置类"""
@@ -8,16 +9,105 @@ class Config:
     OPENAI_API_KEY: Optional[str] = os.getenv("OPENAI_API_KEY")
     
     # 游戏平衡设置
-    NEWS_GENERATION_PROBABILITY = 0.7  # 生成AI新闻的概率，其余使用预设新闻
+    NEWS_GENERATION_PROBABILITY = 0.7  # 生成AI新闻的基础概率（实际概率按API状况和预算调节），其余使用预设新闻
     
     # API调用设置
     OPENAI_MODEL = "gpt-3.5-turbo"
     OPENAI_MAX_TOKENS = 200
     OPENAI_TEMPERATURE = 0.8
     
+    # API限流设置（进程内共享；设置状态文件路径后同一台机器上的多个worker进程共享配额）
+    OPENAI_REQUESTS_PER_MINUTE = float(os.getenv("OPENAI_REQUESTS_PER_MINUTE", "60"))
+    OPENAI_TOKENS_PER_MINUTE = float(os.getenv("OPENAI_TOKENS_PER_MINUTE", "40000"))
+    OPENAI_RATE_LIMIT_FILE: Optional[str] = os.getenv("OPENAI_RATE_LIMIT_FILE")
+    OPENAI_QUEUE_TIMEOUT = 5.0  # 玩家请求排队等待配额的最长时间(秒)，超时使用预设新闻
+    OPENAI_BACKGROUND_QUEUE_TIMEOUT = 60.0  # 后台请求排队等待配额的最长时间(秒)
+    
+    # AI使用比例自适应（API变慢、调用过多或预算不足时降低AI新闻概率，恢复后逐步提高）
+    AI_TARGET_P95_SECONDS = float(os.getenv("AI_TARGET_P95_SECONDS", "4"))  # 补全调用耗时p95的目标(秒)
+    AI_TARGET_REQUESTS_PER_MINUTE = float(os.getenv("AI_TARGET_REQUESTS_PER_MINUTE", str(OPENAI_REQUESTS_PER_MINUTE * 0.8)))  # 每分钟调用数的目标，0表示不限制
+    OPENAI_DAILY_TOKEN_BUDGET = int(os.getenv("OPENAI_DAILY_TOKEN_BUDGET", "0"))  # 每日token预算（按进程），0表示不限制
+    AI_MIN_SHARE = 0.05  # AI新闻份额下限（保持少量调用以发现API恢复）
+    AI_ADJUST_SECONDS = 10.0  # 两次调节之间的最短间隔(秒)
+    
+    # 下一回合使用AI新闻（也可以在 /next-round?use_ai=true 中按请求指定）
+    NEXT_ROUND_AI_NEWS = os.getenv("NEXT_ROUND_AI_NEWS", "false").lower() == "true"
+    # 回合结算后在后台预生成下一回合的AI新闻（玩家思考期间完成，结算时不用再等待API）
+    SPECULATIVE_NEWS = os.getenv("SPECULATIVE_NEWS", "true").lower() == "true"
+    SPECULATIVE_NEWS_WORKERS = 4  # 预生成线程数
+    
+    # 新闻目录数据文件（修改后自动热加载）
+    NEWS_CATALOG_PATH = os.getenv("NEWS_CATALOG_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "news_catalog.json"))
+    NEWS_CATALOG_POLL_SECONDS = float(os.getenv("NEWS_CATALOG_POLL_SECONDS", "2"))
+    
+    # 程序化新闻（按模板和词表在本地生成双语新闻，介于AI新闻和预设新闻之间）
+    PROCEDURAL_NEWS = os.getenv("PROCEDURAL_NEWS", "true").lower() == "true"
+    PROCEDURAL_NEWS_PROBABILITY = float(os.getenv("PROCEDURAL_NEWS_PROBABILITY", "0.5"))  # 不使用AI时程序化新闻的比例，其余使用预设新闻
+    NEWS_GRAMMAR_PATH = os.getenv("NEWS_GRAMMAR_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "news_grammar.json"))
+    
+    # 新闻频率权重（JSON，如 {"natural_disaster": 0.5}），未列出的类型/城市权重为1
+    NEWS_TYPE_WEIGHTS: Dict[str, float] = json.loads(os.getenv("NEWS_TYPE_WEIGHTS", "{}"))
+    NEWS_CITY_WEIGHTS: Dict[str, float] = json.loads(os.getenv("NEWS_CITY_WEIGHTS", "{}"))
+    
+    # AI新闻去重设置
+    NEWS_DEDUP_THRESHOLD = float(os.getenv("NEWS_DEDUP_THRESHOLD", "0.6"))  # 估计相似度达到该值视为同一条新闻
+    NEWS_DEDUP_CAPACITY = int(os.getenv("NEWS_DEDUP_CAPACITY", "50000"))  # 相似度索引最多保留的新闻条数
+    NEWS_DEDUP_REUSE_RATE = 0.5  # 某类型近期重复率超过该值时优先复用已存新闻，不再调用API
+    
     # 游戏难度设置
     EFFECT_MULTIPLIER = 1.0  # 效果倍数，可以调整游戏难度
     
+    # 会话设置
+    MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", "10000"))  # 同时保留的游戏会话上限
+    MAX_FAST_FORWARD_YEARS = 100000  # 单次快进请求最多模拟的年数
+    
+    # 回合数据导出设置（设置导出目录后启用）
+    ANALYTICS_EXPORT_DIR: Optional[str] = os.getenv("ANALYTICS_EXPORT_DIR")
+    ANALYTICS_FORMAT = os.getenv("ANALYTICS_FORMAT", "auto")  # auto / parquet / csv，auto 在安装了 pyarrow 时使用 parquet
+    ANALYTICS_BATCH_ROUNDS = int(os.getenv("ANALYTICS_BATCH_ROUNDS", "10000"))  # 每个文件的回合数
+    ANALYTICS_FLUSH_SECONDS = float(os.getenv("ANALYTICS_FLUSH_SECONDS", "10"))  # 未满的批次最长等待多久写出
+    ANALYTICS_MAX_PENDING_BATCHES = 8  # 等待写入的批次上限，超出时丢弃
+    
+    # 历史数据设置
+    HISTORY_CAPACITY = int(os.getenv("HISTORY_CAPACITY", "2048"))  # 每局保留的最近年数，超出后覆盖最旧的记录（0表示不记录历史）
+    
+    # 存档设置
+    MAX_SAVE_BYTES = int(os.getenv("MAX_SAVE_BYTES", str(16 * 1024 * 1024)))  # /import 接受的最大存档大小
+    
+    # 请求剖析设置（默认关闭；抽样比例为0且未设置调试令牌时没有任何开销）
+    PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))  # 随机剖析的请求比例
+    PROFILE_DEBUG_TOKEN: Optional[str] = os.getenv("PROFILE_DEBUG_TOKEN")  # 请求头 X-Debug-Profile 等于该令牌时剖析该请求
+    PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "1"))  # 调用栈采样间隔(毫秒)
+    PROFILE_MAX_PROFILES = 100  # 内存中保留的最近剖析结果数
+    PROFILE_DIR: Optional[str] = os.getenv("PROFILE_DIR")  # 设置后把每个剖析结果写成 .folded 文件
+    
+    # 状态接口设置
+    STATE_LONG_POLL_MAX_SECONDS = 30.0  # 长轮询最多等待的时间(秒)
+    STATE_GZIP_MIN_BYTES = int(os.getenv("STATE_GZIP_MIN_BYTES", "1024"))  # 状态内容达到该大小时提供gzip压缩版本
+    
+    # 城市间外溢（相邻城市的幸福度/CO2每回合按差值部分扩散；比例为0时关闭）
+    SPILLOVER_RATE = float(os.getenv("SPILLOVER_RATE", "0"))  # 每回合扩散的比例 (0-1)
+    SPILLOVER_RADIUS = float(os.getenv("SPILLOVER_RADIUS", "200"))  # 相邻距离（地图坐标）
+    
+    # 撤销与分支预览设置
+    SNAPSHOT_HISTORY = int(os.getenv("SNAPSHOT_HISTORY", "32"))  # 每局可撤销的最近回合数（0表示关闭撤销）
+    MAX_PREVIEW_BRANCHES = 8  # 一次分支预览最多比较的策略数
+    
+    # 排行榜设置
+    LEADERBOARD_MAX_ENTRIES = int(os.getenv("LEADERBOARD_MAX_ENTRIES", "1000000"))  # 最多保留的成绩条数，超出时丢弃排名最后的记录
+    LEADERBOARD_MAX_LIMIT = 100  # 单次查询最多返回的名次数
+    
+    # 策略顾问设置
+    ADVISOR_MAX_DEPTH = 6  # 最大搜索回合数
+    ADVISOR_BUDGET_MS = 80  # 单次建议的时间预算(毫秒)
+    ADVISOR_POOL_SIZE = 4  # 保留的空闲顾问数（每个顾问有自己的置换表，并发请求各用一个）
+    
+    # 静态资源设置
+    STATIC_MAX_AGE = int(os.getenv("STATIC_MAX_AGE", str(365 * 24 * 3600)))  # 背景视频的浏览器缓存时间(秒)
+    
+    # 启动设置
+    AI_WARMUP_ON_STARTUP = os.getenv("AI_WARMUP_ON_STARTUP", "false").lower() == "true"  # 启动后在后台预热AI新闻服务
+    
     @classmethod
     def validate_config(cls) -> bool:
         """验证配置是否有效"""
@@ -0,0 +1,147 @@
+"""
+效果规则
+效果如何作用到游戏状态用声明式规则描述（作用的属性、范围、缩放、上下限、出局条件、设置变更的生效条件），
+启动时编译成普通的Python函数：每条规则展开成直接的属性读写，运行时不再遍历规则或查表判断键名。
+新增一种效果或设置只需要增加一条规则。
+"""
+
+from typing import Dict, Iterable, Mapping, Optional
+
+# 效果规则：新闻/设置效果字典中的每个键如何作用到游戏状态
+#   key: 效果字典中的键
+#   scope: "global" 作用于游戏状态，"city" 作用于城市
+#   attribute: 被修改的属性（默认与 key 相同）
+#   multiplier: 应用前的缩放倍数（默认1）
+#   clamp: (最小值, 最大值)，不填表示不限制
+#   eliminate: 城市出局条件 ("<=", 阈值) 或 (">=", 阈值)
+EFFECT_RULES = (
+    {"key": "money", "scope": "global"},
+    {"key": "happiness", "scope": "city", "clamp": (0, 100), "eliminate": ("<=", 0)},
+    {"key": "co2", "scope": "city", "clamp": (0, 100), "eliminate": (">=", 100)},
+)
+
+# 设置变更规则：回合结算时把本回合选择的设置写入城市，并应用效果表中对应的效果
+#   setting: 城市属性，也是回合更改 (RoundChanges) 中的字段名
+#   table: 效果表名（编译时传入）
+#   when: "changed" 只有新设置与当前设置不同时才生效，"always" 每次都生效
+SETTING_RULES = (
+    {"setting": "transportation", "table": "transportation", "when": "changed"},
+    {"setting": "energy_source", "table": "energy", "when": "changed"},
+)
+
+_COMPARISONS = {"<=", ">=", "<", ">", "=="}
+
+def _identifier(name: str) -> str:
+    """规则中的名字会写进生成的代码，只允许合法的标识符"""
+    if not isinstance(name, str) or not name.isidentifier():
+        raise ValueError(f"无效的规则字段名: {name!r}")
+    return name
+
+def _number(value) -> str:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"无效的规则数值: {value!r}")
+    return repr(value)
+
+def _update_lines(rule: Mapping, target: str, indent: str):
+    """一条效果规则展开成的代码行"""
+    key = rule["key"]
+    attribute = _identifier(rule.get("attribute", key))
+    multiplier = rule.get("multiplier", 1)
+    amount = "value" if multiplier == 1 else f"int(value * {_number(multiplier)})"
+    expression = f"{target}.{attribute} + {amount}"
+    if rule.get("clamp") is not None:
+        low, high = rule["clamp"]
+        expression = f"max({_number(low)}, min({_number(high)}, {expression}))"
+    return [
+        f"{indent}value = effects.get({key!r})",
+        f"{indent}if value:",
+        f"{indent}    {target}.{attribute} = {expression}",
+    ]
+
+class EffectProgram:
+    """编译后的效果规则"""
+
+    def __init__(self, rules: Iterable[Mapping] = EFFECT_RULES, setting_rules: Iterable[Mapping] = SETTING_RULES,
+                 tables: Optional[Dict[str, Dict[str, Dict[str, int]]]] = None):
+        """
+        Args:
+            rules: 效果规则
+            setting_rules: 设置变更规则
+            tables: 设置规则引用的效果表，名字 -> {设置值: 效果}
+        """
+        self.rules = tuple(dict(rule) for rule in rules)
+        self.setting_rules = tuple(dict(rule) for rule in setting_rules)
+        self.tables = dict(tables or {})
+        for rule in self.rules:
+            if rule.get("scope") not in ("global", "city"):
+                raise ValueError(f"无效的效果范围: {rule.get('scope')!r}")
+        self.effect_keys = tuple(rule["key"] for rule in self.rules)
+
+        # 设置规则引用的效果表以 table_<序号> 的名字传给生成的函数
+        namespace = {f"table_{index}": self.tables.get(rule["table"]) for index, rule in enumerate(self.setting_rules)}
+        exec(compile(self._source(), "<effect_rules>", "exec"), namespace)
+        self.apply_city = namespace["apply_city"]
+        self.apply_global = namespace["apply_global"]
+        self.apply_settings = namespace["apply_settings"]
+        self.apply_city.__doc__ = "把城市范围的效果应用到一个城市（或任何带相应属性的对象），返回是否达到出局条件"
+        self.apply_global.__doc__ = "把全局范围的效果应用到游戏状态"
+        self.apply_settings.__doc__ = "应用回合更改中的设置变更（不检查淘汰），全局效果合计后一次性应用，返回合计"
+
+    def _source(self) -> str:
+        """生成三个函数的源代码"""
+        city_rules = [rule for rule in self.rules if rule["scope"] == "city"]
+        global_rules = [rule for rule in self.rules if rule["scope"] == "global"]
+
+        lines = ["def apply_city(city, effects):"]
+        for rule in city_rules:
+            lines += _update_lines(rule, "city", "    ")
+        conditions = []
+        for rule in city_rules:
+            if rule.get("eliminate") is not None:
+                operator, threshold = rule["eliminate"]
+                if operator not in _COMPARISONS:
+                    raise ValueError(f"无效的出局条件: {operator!r}")
+                conditions.append(f"city.{_identifier(rule.get('attribute', rule['key']))} {operator} {_number(threshold)}")
+        lines.append(f"    return {' or '.join(conditions) or 'False'}")
+
+        lines.append("def apply_global(state, effects):")
+        for rule in global_rules:
+            lines += _update_lines(rule, "state", "    ")
+        lines.append("    return None")
+
+        # 全局效果先累加，所有设置处理完后一次性应用
+        lines.append("def apply_settings(state, changes):")
+        lines.append("    totals = {}")
+        lines.append("    cities = state.cities")
+        for index, rule in enumerate(self.setting_rules):
+            setting = _identifier(rule["setting"])
+            if rule["table"] not in self.tables:
+                raise ValueError(f"未知的效果表: {rule['table']!r}")
+            condition = {"changed": f" and city.{setting} != choice", "always": ""}.get(rule.get("when", "changed"))
+            if condition is None:
+                raise ValueError(f"无效的生效条件: {rule.get('when')!r}")
+            lines += [
+                f"    for city_id, choice in changes.{setting}.items():",
+                "        city = cities.get(city_id)",
+                f"        if city is not None and not city.eliminated{condition}:",
+                f"            effects = table_{index}[choice]",
+            ]
+            for global_rule in global_rules:
+                key = global_rule["key"]
+                lines.append(f"            totals[{key!r}] = totals.get({key!r}, 0) + effects.get({key!r}, 0)")
+            lines += [
+                "            apply_city(city, effects)",
+                f"            city.{setting} = choice",
+            ]
+        lines.append("    apply_global(state, totals)")
+        lines.append("    return totals")
+
+        return "\n".join(lines) + "\n"
+
+    def scale(self, effects: Dict[str, int], multiplier: float) -> Dict[str, int]:
+        """按倍数缩放效果字典中规则定义的数值（就地修改并返回）"""
+        if multiplier != 1.0:
+            for key in self.effect_keys:
+                if key in effects:
+                    effects[key] = int(effects[key] * multiplier)
+        return effects
@@ -0,0 +1,294 @@
+"""
+游戏规则引擎
+不依赖 FastAPI、不读写全局变量、不做I/O：所有函数只读写传入的游戏状态，
+随机数来自调用方传入的随机数生成器，新闻目录也由调用方传入。
+HTTP接口（main.py / main_with_ai_news.py）、快进、策略顾问、基准测试和回放工具都调用这里的规则，
+可以在进程池中直接运行而不需要导入Web框架。
+"""
+
+from typing import Dict, NamedTuple, Optional
+
+from effect_rules import EFFECT_RULES, SETTING_RULES, EffectProgram
+from models import City, GameState, RoundChanges, SingleCityState
+from profiling import hot_path
+
+# 运输方式影响
+TRANSPORTATION_EFFECTS = {
+    "bicycle": {"money": -5, "happiness": 3, "co2": -8},
+    "scooter": {"money": -10, "happiness": 2, "co2": -5},
+    "car": {"money": -50, "happiness": -5, "co2": 15},
+    "electronic_car": {"money": -70, "happiness": 2, "co2": 5},
+    "bus": {"money": -20, "happiness": -2, "co2": 8},
+    "electronic_bus": {"money": -30, "happiness": 1, "co2": 3},
+    "train": {"money": -25, "happiness": 4, "co2": 4},
+    "airplane": {"money": -150, "happiness": 6, "co2": 40},
+    "potogan": {"money": -200, "happiness": 10, "co2": -10}  # 未来环保交通工具
+}
+
+# 能源来源影响
+ENERGY_EFFECTS = {
+    "mining": {"money": -30, "happiness": -10, "co2": 20},
+    "water": {"money": -50, "happiness": 5, "co2": -8},
+    "nuclear": {"money": -100, "happiness": -5, "co2": -15},
+    "solar": {"money": -80, "happiness": 8, "co2": -12},
+    "wind": {"money": -70, "happiness": 7, "co2": -10},
+    "automic": {"money": -150, "happiness": 3, "co2": -20},  # 自动化能源
+    "anti_material": {"money": -300, "happiness": 15, "co2": -30}  # 反物质能源
+}
+
+# 初始城市状态 - 存储原始值以便正确重置
+initial_cities_data = {
+    "stockholm": {
+        "name": "Stockholm",
+        "happiness": 60,
+        "co2": 40,
+        "transportation": "bicycle",
+        "energy_source": "solar",
+        "position": {"x": 300, "y": 180}
+    },
+    "gothenburg": {
+        "name": "Gothenburg",
+        "happiness": 50,
+        "co2": 45,
+        "transportation": "bicycle",
+        "energy_source": "solar",
+        "position": {"x": 150, "y": 300}
+    },
+    "malmo": {
+        "name": "Malmö",
+        "happiness": 55,
+        "co2": 50,
+        "transportation": "bicycle",
+        "energy_source": "solar",
+        "position": {"x": 180, "y": 420}
+    }
+}
+
+class CityChoice(NamedTuple):
+    """一个城市在某回合的选择（None表示保持不变），模拟和回放工具用它构造策略"""
+    transportation: Optional[str] = None
+    energy_source: Optional[str] = None
+
+# 每回合新闻中全国性新闻的概率，其余为城市新闻
+NATIONAL_NEWS_PROBABILITY = 0.7
+
+def create_game_state(seed: int = 0, cities_data: Optional[Dict[str, Dict]] = None) -> GameState:
+    """使用原始城市数据（或指定的地图：城市ID -> 城市字段）创建全新的游戏状态"""
+    # 创建全新的城市对象，确保完全重置所有属性
+    # （扁平的城市模型由 pydantic-core 校验构造，并不比在Python中逐字段构造慢；外部地图也需要校验）
+    new_cities = {city_id: City(**data) for city_id, data in (cities_data or initial_cities_data).items()}
+    # 城市已经是校验过的实例，外层状态跳过逐个城市的重复检查
+    return GameState.trusted(cities=new_cities, year=1, seed=seed, current_round_changes=RoundChanges.trusted())
+
+# 效果规则编译后的函数（规则定义见 effect_rules.py）
+EFFECTS = EffectProgram(EFFECT_RULES, SETTING_RULES, {"transportation": TRANSPORTATION_EFFECTS, "energy": ENERGY_EFFECTS})
+
+# 把幸福度/CO2效果应用到一个城市（或任何带 happiness/co2 属性的对象），返回是否达到出局条件
+apply_city_effects = EFFECTS.apply_city
+
+def calculate_projected_effects(state, city_id, transport_type=None, energy_type=None):
+    """计算预期的效果而不实际应用"""
+    effects = {"money": 0, "happiness": 0, "co2": 0}
+
+    # 如果指定了交通类型,计算其影响
+    if transport_type and transport_type in TRANSPORTATION_EFFECTS:
+        for key, value in TRANSPORTATION_EFFECTS[transport_type].items():
+            effects[key] += value
+
+    # 如果指定了能源类型,计算其影响
+    if energy_type and energy_type in ENERGY_EFFECTS:
+        for key, value in ENERGY_EFFECTS[energy_type].items():
+            effects[key] += value
+
+    # 存储计算的影响
+    if city_id not in state.current_round_changes.projected_effects:
+        state.current_round_changes.projected_effects[city_id] = effects
+    else:
+        # 如果已存在预测,则更新
+        for key, value in effects.items():
+            state.current_round_changes.projected_effects[city_id][key] = value
+
+    return effects
+
+def choose_transportation(state, city_id: str, transport_type: str) -> Dict[str, int]:
+    """为城市选择本回合的运输方式（回合结算时生效），返回预期效果"""
+    state.current_round_changes.transportation[city_id] = transport_type
+    return calculate_projected_effects(
+        state,
+        city_id,
+        transport_type=transport_type,
+        energy_type=state.current_round_changes.energy_source.get(city_id, state.cities[city_id].energy_source)
+    )
+
+def choose_energy(state, city_id: str, energy_type: str) -> Dict[str, int]:
+    """为城市选择本回合的能源来源（回合结算时生效），返回预期效果"""
+    state.current_round_changes.energy_source[city_id] = energy_type
+    return calculate_projected_effects(
+        state,
+        city_id,
+        transport_type=state.current_round_changes.transportation.get(city_id, state.cities[city_id].transportation),
+        energy_type=energy_type
+    )
+
+def queue_policy(state, policy) -> None:
+    """
+    把策略写入本回合的更改（快进、模拟使用）
+
+    Args:
+        policy: 城市ID -> CityChoice（或任何带 transportation / energy_source 属性的对象）
+    """
+    changes = state.current_round_changes
+    for city_id, city_policy in policy.items():
+        if state.cities[city_id].eliminated:
+            continue
+        if city_policy.transportation is not None:
+            changes.transportation[city_id] = city_policy.transportation
+        if city_policy.energy_source is not None:
+            changes.energy_source[city_id] = city_policy.energy_source
+
+@hot_path("apply_effects")
+def apply_effects(state, effects, city_id=None):
+    """应用效果到游戏状态或特定城市"""
+    # 应用全局效果（金钱）
+    EFFECTS.apply_global(state, effects)
+
+    # 确定受影响的城市
+    target_cities = []
+    if city_id and city_id in state.cities:
+        # 特定城市受影响
+        target_cities = [city_id]
+    elif effects.get("city") and effects["city"] in state.cities:
+        # 新闻事件中指定的城市
+        target_cities = [effects["city"]]
+    else:
+        # 影响所有城市
+        target_cities = list(state.cities.keys())
+
+    # 对每个受影响的城市应用效果，并检查城市是否应被淘汰
+    for city_id in target_cities:
+        city = state.cities[city_id]
+        if not city.eliminated and apply_city_effects(city, effects):
+            city.eliminated = True
+
+    # 检查游戏结束条件
+    check_game_over(state)
+
+def city_averages(state):
+    """所有城市（包括已淘汰城市）的平均幸福度和平均CO2"""
+    count = len(state.cities) or 1
+    happiness = sum(city.happiness for city in state.cities.values())
+    co2 = sum(city.co2 for city in state.cities.values())
+    return happiness / count, co2 / count
+
+@hot_path("check_game_over")
+def check_game_over(state):
+    """检查游戏是否结束"""
+    # 金钱小于等于0，游戏结束
+    if state.money <= 0:
+        state.game_over = True
+        return
+
+    # 所有城市都被淘汰，游戏结束
+    all_eliminated = all(city.eliminated for city in state.cities.values())
+    if all_eliminated:
+        state.game_over = True
+
+def advance_year(state, spillover=None):
+    """
+    结算本回合的更改：应用运输/能源变更、城市间外溢、检查淘汰与游戏结束、进入下一年
+
+    Args:
+        spillover: 本局的城市外溢网络 (spillover.SpilloverNetwork)，None表示城市之间互不影响
+    """
+    # 应用运输/能源变更（只有当设置确实发生变化时才应用效果），金钱变化合计后一次性应用
+    EFFECTS.apply_settings(state, state.current_round_changes)
+
+    # 相邻城市之间的幸福度/CO2外溢
+    if spillover is not None:
+        spillover.apply(state)
+
+    # 检查城市是否应被淘汰
+    for city in state.cities.values():
+        if not city.eliminated and (city.happiness <= 0 or city.co2 >= 100):
+            city.eliminated = True
+
+    # 检查游戏结束条件
+    check_game_over(state)
+
+    # 增加年份
+    state.year += 1
+
+    # 清除当前回合的更改
+    state.current_round_changes = RoundChanges.trusted()
+
+# ===== 单城市版本（main_with_ai_news.py）=====
+# 没有回合结算：设置变化立即生效，每条新闻立即应用；城市出局即游戏结束
+
+def create_single_city_state() -> SingleCityState:
+    """单城市版本的初始状态"""
+    return SingleCityState()
+
+def apply_single_city_effects(state, effects: Dict):
+    """把效果应用到单城市状态（全局效果与城市效果使用同一套规则），金钱耗尽或城市出局时游戏结束"""
+    EFFECTS.apply_global(state, effects)
+    city_out = apply_city_effects(state, effects)
+    if state.money <= 0 or city_out:
+        state.game_over = True
+
+def set_single_city_transportation(state, transport_type: str):
+    """单城市版本：更换运输方式并立即应用其效果"""
+    state.transportation = transport_type
+    apply_single_city_effects(state, TRANSPORTATION_EFFECTS[transport_type])
+
+def set_single_city_energy(state, energy_type: str):
+    """单城市版本：更换能源来源并立即应用其效果"""
+    state.energy_source = energy_type
+    apply_single_city_effects(state, ENERGY_EFFECTS[energy_type])
+
+def apply_single_city_news(state, news: Dict):
+    """单城市版本：应用新闻效果，并把它保存为最新新闻"""
+    apply_single_city_effects(state, news["effects"])
+    state.last_news = news
+
+def draw_news(state, catalog, rng, city_sampler=None) -> Dict:
+    """
+    从新闻目录抽取一条传统新闻（不含时间戳和来源，由调用方补充）
+
+    Args:
+        catalog: 新闻目录 (news_catalog.NewsCatalog)
+        rng: 随机数生成器
+        city_sampler: 本局地图的城市抽样器，默认按当前城市临时构建
+    """
+    # 70%概率生成全国性新闻，30%概率生成城市特定新闻
+    city_event = None
+    if rng.random() >= NATIONAL_NEWS_PROBABILITY:
+        # 选择一个未被淘汰的城市（所有城市都被淘汰或该城市没有专属新闻时，生成全国性新闻）
+        sampler = city_sampler or catalog.city_sampler(state.cities)
+        city_id = sampler.sample(state.cities, rng)
+        if city_id:
+            city_event = catalog.sample_city_event(city_id, rng)
+
+    if city_event is None:
+        national = catalog.sample_national(rng)
+        if national is None:
+            # 直接构造的目录可能把全国性新闻的权重都设成了0（compile_catalog 会拒绝这种数据），退回不加权抽取
+            national = rng.choice(catalog.national_events)
+        return national.copy()
+
+    news = city_event.copy()
+    news["effects"] = dict(news["effects"], city=city_id)
+    return news
+
+def apply_news(state, news: Dict):
+    """应用新闻效果，并把它保存为最新新闻"""
+    state.last_news = news
+    apply_effects(state, news["effects"])
+
+def play_round(state, catalog, rng, city_sampler=None, timestamp: Optional[str] = None, spillover=None) -> Dict:
+    """结算一整回合（变更 + 传统新闻），返回本回合的新闻；供模拟、回放和基准测试使用"""
+    advance_year(state, spillover)
+    news = draw_news(state, catalog, rng, city_sampler)
+    news["timestamp"] = timestamp
+    news["source"] = "Traditional"
+    apply_news(state, news)
+    return news
@@ -0,0 +1,131 @@
+"""
+游戏历史数据
+每局游戏按年记录金钱和每个城市的幸福度/CO2，存放在定长的 array 环形缓冲区中：
+每个会话占用的内存只取决于容量，与游戏进行了多少年无关；超出容量后覆盖最旧的记录。
+查询时可以在服务端按区间平均降采样，长局游戏也只返回图表需要的点数。
+"""
+
+from array import array
+from typing import Dict, Iterable, List, Optional
+
+class RingBuffer:
+    """基于 array 的定长环形缓冲区（容量为0时不保存任何值）"""
+
+    def __init__(self, capacity: int, typecode: str):
+        self.capacity = max(0, capacity)
+        self._data = array(typecode, [0]) * capacity
+        self._start = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, value):
+        """追加一个值，缓冲区已满时覆盖最旧的值"""
+        if not self.capacity:
+            return
+        if self._size < self.capacity:
+            self._data[(self._start + self._size) % self.capacity] = value
+            self._size += 1
+        else:
+            self._data[self._start] = value
+            self._start = (self._start + 1) % self.capacity
+
+    def fill(self, values):
+        """用一组值（从旧到新）替换缓冲区内容，超出容量时只保留最新的部分"""
+        values = array(self._data.typecode, values)[-self.capacity:] if self.capacity else array(self._data.typecode)
+        self._data[:len(values)] = values
+        self._start = 0
+        self._size = len(values)
+
+    def last(self):
+        """最新的值"""
+        return self._data[(self._start + self._size - 1) % self.capacity]
+
+    def pop(self):
+        """删除并返回最新的值（撤销时使用）"""
+        value = self.last()
+        self._size -= 1
+        return value
+
+    def values(self) -> List:
+        """按时间顺序（从旧到新）返回所有值"""
+        end = self._start + self._size
+        if end <= self.capacity:
+            return self._data[self._start:end].tolist()
+        return self._data[self._start:].tolist() + self._data[:end - self.capacity].tolist()
+
+def downsample(values: List, points: int) -> List:
+    """把序列按相邻区间平均压缩到不超过 points 个点（区间尽量等长）"""
+    count = len(values)
+    if count <= points:
+        return values
+    result = []
+    for i in range(points):
+        start = i * count // points
+        end = (i + 1) * count // points
+        result.append(round(sum(values[start:end]) / (end - start), 2))
+    return result
+
+def bucket_starts(values: List, points: int) -> List:
+    """降采样时每个区间的第一个值（用于年份轴）"""
+    count = len(values)
+    if count <= points:
+        return values
+    return [values[i * count // points] for i in range(points)]
+
+class GameHistory:
+    """一局游戏的逐年数据：年份、金钱，以及每个城市的幸福度和CO2"""
+
+    def __init__(self, city_ids: Iterable[str], capacity: int):
+        self.capacity = capacity
+        self.years = RingBuffer(capacity, "l")
+        self.money = RingBuffer(capacity, "q")
+        # 幸福度和CO2取值都在 0-100 之间，每个值只占一个字节
+        self.happiness = {city_id: RingBuffer(capacity, "B") for city_id in city_ids}
+        self.co2 = {city_id: RingBuffer(capacity, "B") for city_id in city_ids}
+
+    def record(self, state):
+        """记录当前年份的状态"""
+        self.years.append(state.year)
+        self.money.append(state.money)
+        for city_id, city in state.cities.items():
+            self.happiness[city_id].append(city.happiness)
+            self.co2[city_id].append(city.co2)
+
+    def rewind(self, year: int):
+        """删除晚于指定年份的记录（撤销回合后调用）"""
+        while len(self.years) and self.years.last() > year:
+            self.years.pop()
+            self.money.pop()
+            for buffer in self.happiness.values():
+                buffer.pop()
+            for buffer in self.co2.values():
+                buffer.pop()
+
+    def query(self, points: Optional[int] = None) -> Dict:
+        """
+        按列返回历史数据
+
+        Args:
+            points: 最多返回的点数，记录更多时按区间平均降采样；None表示返回全部
+
+        Returns:
+            年份、金钱、每个城市幸福度/CO2的序列，以及降采样信息
+        """
+        years = self.years.values()
+        points = points or len(years) or 1
+        return {
+            "year": bucket_starts(years, points),
+            "money": downsample(self.money.values(), points),
+            "cities": {
+                city_id: {
+                    "happiness": downsample(self.happiness[city_id].values(), points),
+                    "co2": downsample(self.co2[city_id].values(), points),
+                }
+                for city_id in self.happiness
+            },
+            "recorded_points": len(years),
+            "capacity": self.capacity,
+            "downsampled": len(years) > points,
+        }
@@ -0,0 +1,126 @@
+"""
+跨会话排行榜
+记录每局结束的游戏（坚持的年数、最终金钱、平均幸福度/CO2），用增量维护的有序索引排名：
+插入、查询名次都是 O(log n)，前K名是 O(log n + K)，百万条记录下结束一局游戏也不会带来可感知的延迟。
+有 sortedcontainers 时使用 SortedList，否则回退到 bisect 维护的普通列表（插入为 O(n) 的内存移动）。
+"""
+
+import bisect
+import itertools
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+try:
+    from sortedcontainers import SortedList
+    sortedcontainers_available = True
+except ImportError:
+    sortedcontainers_available = False
+
+    class SortedList:
+        """sortedcontainers.SortedList 的最小替代实现"""
+
+        def __init__(self):
+            self._items = []
+
+        def __len__(self):
+            return len(self._items)
+
+        def __getitem__(self, index):
+            return self._items[index]
+
+        def add(self, item):
+            bisect.insort(self._items, item)
+
+        def bisect_left(self, item):
+            return bisect.bisect_left(self._items, item)
+
+        def islice(self, start=None, stop=None):
+            return iter(self._items[start:stop])
+
+        def pop(self, index=-1):
+            return self._items.pop(index)
+
+# 排序键: (-年数, -金钱, -平均幸福度, 平均CO2, 序号, 会话ID, 种子, 结束时间)
+# 前四项决定名次；序号唯一，比较不会进行到后面的附带数据
+Entry = Tuple[int, int, float, float, int, str, int, str]
+SCORE_FIELDS = 4
+
+class Leaderboard:
+    """按 年数 > 金钱 > 平均幸福度 > 平均CO2(越低越好) 排名的排行榜（线程安全）"""
+
+    def __init__(self, max_entries: int = 1_000_000):
+        self.max_entries = max_entries
+        self._entries = SortedList()
+        self._lock = threading.Lock()
+        self._sequence = itertools.count()
+        # 会话ID -> 该会话最好成绩 / 最近一局的排序键
+        self._best: Dict[str, Entry] = {}
+        self._last: Dict[str, Entry] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def record(self, session_id: str, seed: int, years: int, money: int, avg_happiness: float, avg_co2: float):
+        """记录一局已结束的游戏"""
+        entry = (
+            -years,
+            -money,
+            -round(avg_happiness, 2),
+            round(avg_co2, 2),
+            next(self._sequence),
+            session_id,
+            seed,
+            datetime.now().isoformat(),
+        )
+        with self._lock:
+            self._entries.add(entry)
+            self._last[session_id] = entry
+            best = self._best.get(session_id)
+            if best is None or entry < best:
+                self._best[session_id] = entry
+
+            # 超出容量时丢弃排名最后的记录
+            while len(self._entries) > self.max_entries:
+                removed = self._entries.pop()
+                removed_session = removed[5]
+                if self._best.get(removed_session) is removed:
+                    del self._best[removed_session]
+                if self._last.get(removed_session) is removed:
+                    del self._last[removed_session]
+
+    def _rank(self, entry: Entry) -> int:
+        """名次（从1开始，成绩相同的并列）"""
+        return self._entries.bisect_left(entry[:SCORE_FIELDS]) + 1
+
+    @staticmethod
+    def _to_dict(entry: Entry, rank: int) -> Dict:
+        return {
+            "rank": rank,
+            "session_id": entry[5],
+            "seed": entry[6],
+            "years": -entry[0],
+            "money": -entry[1],
+            "avg_happiness": -entry[2],
+            "avg_co2": entry[3],
+            "finished_at": entry[7],
+        }
+
+    def top(self, limit: int = 10) -> List[Dict]:
+        """前 limit 名"""
+        with self._lock:
+            entries = list(self._entries.islice(0, limit))
+            return [self._to_dict(entry, self._rank(entry)) for entry in entries]
+
+    def session_rank(self, session_id: str) -> Optional[Dict]:
+        """会话最好成绩与最近一局的名次，会话没有已结束的游戏时返回None"""
+        with self._lock:
+            best = self._best.get(session_id)
+            last = self._last.get(session_id)
+            if best is None and last is None:
+                return None
+            return {
+                "best": self._to_dict(best, self._rank(best)) if best is not None else None,
+                "last": self._to_dict(last, self._rank(last)) if last is not None else None,
+                "total": len(self._entries),
+            }
@@ -1,22 +1,72 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel, Field
 from typing import Dict, List, Optional
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from starlette.concurrency import run_in_threadpool
+import asyncio
 import random
+import threading
+import uuid
 from datetime import datetime
 import uvicorn
 import copy
+import os
 
-# 导入新的AI新闻系统
-try:
-    from news_service import NewsService
-    from config import Config
-    news_service_available = True
-except ImportError:
-    news_service_available = False
-    print("Warning: AI news service not available. Install news_service and config modules for AI functionality.")
+from serialization import FastJSONResponse, EncodedPayload, etag_matches
+from static_files import StaticAssets
+from advisor import StrategyAdvisor
+from leaderboard import Leaderboard
+from history import GameHistory
+from analytics import RoundExporter, city_snapshot
+from snapshots import SnapshotHistory, take_snapshot, restore_snapshot
+from spillover import SpilloverNetwork
+from savegame import MEDIA_TYPE as SAVE_MEDIA_TYPE, SaveFormatError, dump_game, load_game
+from profiling import ProfilingMiddleware, hot_path, profiling_enabled, profile_store, debug_token_matches
+from news_catalog import get_catalog as current_news_catalog, get_catalog_store
+from game_engine import (
+    TRANSPORTATION_EFFECTS,
+    ENERGY_EFFECTS,
+    NATIONAL_NEWS_PROBABILITY,
+    initial_cities_data,
+    create_game_state,
+    advance_year,
+    draw_news,
+    apply_news,
+    play_round,
+    choose_transportation,
+    choose_energy,
+    queue_policy,
+    city_averages,
+)
+
+from config import Config
 
-app = FastAPI()
+# AI新闻系统采用懒加载：news_service -> news_generator -> openai 的导入链
+# 会拖慢冷启动，因此只在第一次需要AI新闻时（或启动后的后台预热中）才导入
+news_service_available = True
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：可选地在后台预热AI新闻服务（不阻塞启动），启动后台文件监视与回合数据导出"""
+    if Config.AI_WARMUP_ON_STARTUP:
+        threading.Thread(target=get_news_service, name="ai-news-warmup", daemon=True).start()
+    
+    # 新闻目录数据文件变化时自动热加载
+    if Config.NEWS_CATALOG_POLL_SECONDS > 0:
+        get_catalog_store().start_watching(Config.NEWS_CATALOG_POLL_SECONDS)
+    
+    # 配置了导出目录时，在后台批量导出每回合的结果
+    round_exporter.start()
+    
+    yield
+    
+    get_catalog_store().stop_watching()
+    round_exporter.stop()
+
+app = FastAPI(lifespan=lifespan)
 
 # 允许跨域请求
 app.add_middleware(
@@ -26,273 +76,346 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# 城市模型
-class City(BaseModel):
-    name: str
-    happiness: int = 50
-    co2: int = 50
-    transportation: str = "bicycle"
-    energy_source: str = "solar"
-    eliminated: bool = False
-    position: Dict[str, int] = {}  # 城市在地图上的位置
-
-# 回合中的变更
-class RoundChanges(BaseModel):
-    transportation: Dict[str, str] = {}
-    energy_source: Dict[str, str] = {}
-    projected_effects: Dict[str, Dict[str, int]] = {}
-
-# 游戏状态模型
-class GameState(BaseModel):
-    money: int = 1000
-    cities: Dict[str, City] = {}
-    last_news: dict = None
-    game_over: bool = False
-    year: int = 1  # 添加年份
-    current_round_changes: RoundChanges = RoundChanges()
-
-# 初始城市状态 - 存储原始值以便正确重置
-initial_cities_data = {
-    "stockholm": {
-        "name": "Stockholm", 
-        "happiness": 60, 
-        "co2": 40, 
-        "transportation": "bicycle", 
-        "energy_source": "solar",
-        "position": {"x": 300, "y": 180}
-    },
-    "gothenburg": {
-        "name": "Gothenburg", 
-        "happiness": 50, 
-        "co2": 45, 
-        "transportation": "bicycle", 
-        "energy_source": "solar",
-        "position": {"x": 150, "y": 300}
-    },
-    "malmo": {
-        "name": "Malmö", 
-        "happiness": 55, 
-        "co2": 50, 
-        "transportation": "bicycle", 
-        "energy_source": "solar",
-        "position": {"x": 180, "y": 420}
-    }
-}
+# 按需剖析请求（关闭时不添加中间件）
+if profiling_enabled():
+    app.add_middleware(ProfilingMiddleware, sample_rate=Config.PROFILE_SAMPLE_RATE)
 
-# 初始化三个瑞典城市
-initial_cities = {
-    city_id: City(**data) for city_id, data in initial_cities_data.items()
-}
+# 游戏界面与背景视频由应用自身提供
+static_assets = StaticAssets(
+    root=os.path.dirname(os.path.abspath(__file__)),
+    html_file="game_interface.html",
+    video_dir="videos",
+    max_age=Config.STATIC_MAX_AGE,
+)
 
-# 初始游戏状态
-game_state = GameState(cities=initial_cities)
+# 快进时单个城市的策略
+class CityPolicy(BaseModel):
+    transportation: Optional[str] = None
+    energy_source: Optional[str] = None
 
-# 初始化AI新闻服务
-news_service = None
-if news_service_available:
-    try:
-        news_service = NewsService()
-    except Exception as e:
-        print(f"Warning: Failed to initialize AI news service: {e}")
-        news_service_available = False
-
-# 新闻事件类型
-NEWS_EVENTS = [
-    {
-        "type": "natural_disaster",
-        "title": "Natural Disaster",
-        "description": "Rare floods hit northern Sweden, damaging infrastructure",
-        "effects": {"money": -200, "happiness": -10, "city": None}
-    },
-    {
-        "type": "city_construction",
-        "title": "City Construction",
-        "description": "Stockholm builds new eco-friendly residential area",
-        "effects": {"co2": 5, "money": -150, "happiness": 8, "city": "stockholm"}
-    },
-    {
-        "type": "economy_plus",
-        "title": "Economic Growth",
-        "description": "Swedish tech industry flourishes, creating many job opportunities",
-        "effects": {"money": 300, "happiness": 7, "co2": 3, "city": None}
-    },
-    {
-        "type": "economy_minus",
-        "title": "Economic Downturn",
-        "description": "Global market fluctuations impact Swedish exports",
-        "effects": {"money": -250, "happiness": -8, "co2": -2, "city": None}
-    },
-    {
-        "type": "sustainability_event",
-        "title": "Sustainability Initiative",
-        "description": "Gothenburg hosts international environmental conference promoting green technology",
-        "effects": {"co2": -15, "city": "gothenburg"}
-    },
-    {
-        "type": "entertainment_news",
-        "title": "Entertainment Event",
-        "description": "Malmö music festival attracts global visitors, energizing the city",
-        "effects": {"happiness": 12, "city": "malmo"}
-    }
-]
-
-# 针对各城市的事件
-CITY_SPECIFIC_NEWS = {
-    "stockholm": [
-        {
-            "type": "local_event",
-            "title": "Stockholm Innovation Center",
-            "description": "Stockholm builds a new technology innovation center, attracting global talent",
-            "effects": {"happiness": 8, "co2": 5, "money": -100}
-        },
-        {
-            "type": "local_disaster",
-            "title": "Stockholm Severe Cold",
-            "description": "Stockholm experiences extremely cold weather, significantly increasing energy consumption",
-            "effects": {"happiness": -5, "co2": 10, "money": -80}
-        }
-    ],
-    "gothenburg": [
-        {
-            "type": "local_event",
-            "title": "Gothenburg Port Expansion",
-            "description": "Gothenburg port expansion completed, significantly increasing trade volume",
-            "effects": {"happiness": 5, "co2": 8, "money": 150}
-        },
-        {
-            "type": "local_disaster",
-            "title": "Gothenburg Flooding",
-            "description": "Gothenburg hit by flooding, coastal areas damaged",
-            "effects": {"happiness": -8, "co2": 3, "money": -120}
-        }
-    ],
-    "malmo": [
-        {
-            "type": "local_event",
-            "title": "Malmö Renewable Energy",
-            "description": "Malmö implements large-scale renewable energy plan, improving city image",
-            "effects": {"happiness": 10, "co2": -12, "money": -180}
-        },
-        {
-            "type": "local_disaster",
-            "title": "Malmö Traffic Congestion",
-            "description": "Severe traffic congestion in Malmö, citizens face difficulties commuting",
-            "effects": {"happiness": -7, "co2": 9, "money": -50}
-        }
-    ]
-}
-
-# 运输方式影响
-TRANSPORTATION_EFFECTS = {
-    "bicycle": {"money": -5, "happiness": 3, "co2": -8},
-    "scooter": {"money": -10, "happiness": 2, "co2": -5},
-    "car": {"money": -50, "happiness": -5, "co2": 15},
-    "electronic_car": {"money": -70, "happiness": 2, "co2": 5},
-    "bus": {"money": -20, "happiness": -2, "co2": 8},
-    "electronic_bus": {"money": -30, "happiness": 1, "co2": 3},
-    "train": {"money": -25, "happiness": 4, "co2": 4},
-    "airplane": {"money": -150, "happiness": 6, "co2": 40},
-    "potogan": {"money": -200, "happiness": 10, "co2": -10}  # 未来环保交通工具
-}
-
-# 能源来源影响
-ENERGY_EFFECTS = {
-    "mining": {"money": -30, "happiness": -10, "co2": 20},
-    "water": {"money": -50, "happiness": 5, "co2": -8},
-    "nuclear": {"money": -100, "happiness": -5, "co2": -15},
-    "solar": {"money": -80, "happiness": 8, "co2": -12},
-    "wind": {"money": -70, "happiness": 7, "co2": -10},
-    "automic": {"money": -150, "happiness": 3, "co2": -20},  # 自动化能源
-    "anti_material": {"money": -300, "happiness": 15, "co2": -30}  # 反物质能源
-}
-
-def calculate_projected_effects(city_id, transport_type=None, energy_type=None):
-    """计算预期的效果而不实际应用"""
-    effects = {"money": 0, "happiness": 0, "co2": 0}
-    
-    # 如果指定了交通类型,计算其影响
-    if transport_type and transport_type in TRANSPORTATION_EFFECTS:
-        for key, value in TRANSPORTATION_EFFECTS[transport_type].items():
-            effects[key] += value
-    
-    # 如果指定了能源类型,计算其影响
-    if energy_type and energy_type in ENERGY_EFFECTS:
-        for key, value in ENERGY_EFFECTS[energy_type].items():
-            effects[key] += value
-    
-    # 存储计算的影响
-    if city_id not in game_state.current_round_changes.projected_effects:
-        game_state.current_round_changes.projected_effects[city_id] = effects
-    else:
-        # 如果已存在预测,则更新
-        for key, value in effects.items():
-            game_state.current_round_changes.projected_effects[city_id][key] = value
-    
-    return effects
-
-def apply_effects(effects, city_id=None):
-    """应用效果到游戏状态或特定城市"""
-    global game_state
-    
-    # 应用金钱效果 (全局)
-    if effects.get("money"):
-        game_state.money += effects["money"]
-    
-    # 确定受影响的城市
-    target_cities = []
-    if city_id and city_id in game_state.cities:
-        # 特定城市受影响
-        target_cities = [city_id]
-    elif effects.get("city") and effects["city"] in game_state.cities:
-        # 新闻事件中指定的城市
-        target_cities = [effects["city"]]
-    else:
-        # 影响所有城市
-        target_cities = list(game_state.cities.keys())
-    
-    # 对每个受影响的城市应用效果
-    for city_id in target_cities:
-        city = game_state.cities[city_id]
-        if not city.eliminated:
-            if effects.get("happiness"):
-                city.happiness = max(0, min(100, city.happiness + effects["happiness"]))
-            if effects.get("co2"):
-                city.co2 = max(0, min(100, city.co2 + effects["co2"]))
-            
-            # 检查城市是否应被淘汰
-            if city.happiness <= 0 or city.co2 >= 100:
-                city.eliminated = True
+# 快进请求：固定策略每年应用一次；脚本策略按年份循环使用
+class FastForwardRequest(BaseModel):
+    years: int = Field(1, ge=1)
+    policy: Dict[str, CityPolicy] = {}
+    script: List[Dict[str, CityPolicy]] = []
+
+# 分支预览请求：每个分支从当前状态出发、使用相同的随机数流，结果可以直接比较
+class PreviewRequest(BaseModel):
+    branches: List[FastForwardRequest] = Field(..., min_length=1)
+
+DEFAULT_SESSION_ID = "default"  # 未指定会话的请求（包括旧版前端）共用的会话
+
+def new_seed() -> int:
+    """生成新的随机种子"""
+    return random.SystemRandom().randrange(2 ** 32)
+
+class GameSession:
+    """一局游戏会话：游戏状态 + 独立的随机数流
+    
+    每个会话使用自己的 random.Random 实例，会话之间的随机抽取互不干扰，
+    也不争用全局 random 模块的锁；相同种子 + 相同操作序列可以逐位重放一局游戏。
+    """
     
-    # 检查游戏结束条件
-    check_game_over()
+    def __init__(self, session_id: str, seed: Optional[int] = None):
+        self.session_id = session_id
+        self.lock = threading.RLock()  # 同一会话的请求串行执行
+        self.seen_news = set()  # 已展示过的AI新闻故事ID（重新开局后仍保留，避免同一玩家看到重复新闻）
+        # 状态版本号：每次修改状态后递增（重新开局也不归零），作为 /state 的ETag
+        self.instance_id = uuid.uuid4().hex[:12]
+        self.revision = 0
+        self._state_payload = None
+        self._waiters = []  # 等待状态变化的长轮询请求: (事件循环, future)
+        self._waiters_lock = threading.Lock()
+        self.reset(seed)
+    
+    def reset(self, seed: Optional[int] = None):
+        """重置为新游戏，未指定种子时随机生成"""
+        self.seed = new_seed() if seed is None else seed
+        self.rng = random.Random(self.seed)
+        # 本局的成绩统计（每回合开始时累加各城市平均值，结束时写入排行榜）
+        self.rounds_played = 0
+        self.happiness_total = 0.0
+        self.co2_total = 0.0
+        self.recorded = False
+        self._start(create_game_state(self.seed))
+    
+    def load(self, saved):
+        """
+        从存档 (savegame.SavedGame) 继续一局游戏：状态、历史、随机数流和成绩统计都恢复到存档时
+        
+        存档来自客户端，金钱、年份和成绩统计都可以被任意修改，因此读档后的这一局不再记入排行榜
+        """
+        # 先在局部变量中构建随机数流、成绩统计和历史，全部成功后才替换会话内容，读档失败时会话保持原样
+        rng = random.Random(saved.state.seed)
+        if saved.rng_state is not None:
+            rng.setstate(saved.rng_state)
+        stats = saved.stats
+        rounds_played = int(stats.get("rounds_played", 0))
+        happiness_total = float(stats.get("happiness_total", 0.0))
+        co2_total = float(stats.get("co2_total", 0.0))
+        seen_news = set(stats.get("seen_news", ()))
+        self._start(saved.state, saved.build_history(Config.HISTORY_CAPACITY) if saved.history is not None else None)
+        self.seed = saved.state.seed
+        self.rng = rng
+        self.rounds_played = rounds_played
+        self.happiness_total = happiness_total
+        self.co2_total = co2_total
+        self.recorded = True
+        self.seen_news.update(seen_news)
+    
+    def export(self) -> bytes:
+        """把当前游戏编码为二进制存档（撤销/重做记录和预生成的新闻不保存）"""
+        return dump_game(self.state, self.history, self.rng, {
+            "rounds_played": self.rounds_played,
+            "happiness_total": self.happiness_total,
+            "co2_total": self.co2_total,
+            "recorded": self.recorded,
+            "seen_news": sorted(self.seen_news),
+        })
+    
+    def _start(self, state, history=None):
+        """开始（或从存档继续）一局：设置状态，重建与地图相关的结构（构建失败时会话保持原样）"""
+        # 城市间外溢网络（城市位置在一局中不变，开局时构建一次）
+        spillover = (
+            SpilloverNetwork(state.cities, Config.SPILLOVER_RADIUS, Config.SPILLOVER_RATE)
+            if Config.SPILLOVER_RATE > 0 else None
+        )
+        # 逐年历史数据（定长环形缓冲区，内存不随游戏年数增长）
+        if history is None:
+            history = GameHistory(state.cities, Config.HISTORY_CAPACITY)
+            history.record(state)
+        self.state = state
+        self._city_sampler = None
+        self.spillover = spillover
+        self.history = history
+        # 最近若干回合的快照（相邻快照共享没有变化的城市），用于撤销/重做
+        self.snapshots = SnapshotHistory(Config.SNAPSHOT_HISTORY)
+        # 后台预生成的下一回合AI新闻: (生成时的年份, 预生成任务)；重新开局时丢弃
+        self.speculation = None
+        self._sampler_catalog = None
+        self.touch()
+    
+    @property
+    def etag(self) -> str:
+        return f'"{self.instance_id}-{self.revision}"'
+    
+    def is_current(self, if_none_match: Optional[str]) -> bool:
+        """客户端持有的（原始或压缩）状态是否为最新版本"""
+        etag = self.etag
+        return etag_matches(if_none_match, etag) or etag_matches(if_none_match, etag[:-1] + '-gz"')
+    
+    def touch(self):
+        """状态已修改：递增版本号，丢弃缓存的状态响应并唤醒长轮询请求（调用方需持有 lock）"""
+        self.revision += 1
+        self._state_payload = None
+        with self._waiters_lock:
+            waiters, self._waiters = self._waiters, []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_wake_waiter, future)
+    
+    def speculate(self):
+        """回合结算后，在后台按当前局势预生成下一回合的AI新闻（调用方需持有 lock）"""
+        self.speculation = None
+        if not Config.SPECULATIVE_NEWS or self.state.game_over or not get_news_service():
+            return
+        prepared = news_service.prepare_story(news_context(self.state))
+        if prepared is not None:
+            self.speculation = (self.state.year, prepared)
+    
+    def take_speculation(self):
+        """取出为当前年份预生成的新闻（撤销/重做后年份不一致时丢弃）"""
+        speculation, self.speculation = self.speculation, None
+        if speculation is not None and speculation[0] == self.state.year:
+            return speculation[1]
+        return None
+    
+    def state_payload(self) -> EncodedPayload:
+        """当前版本的状态响应（编码和压缩结果按版本缓存，多个客户端轮询同一会话时只编码一次）"""
+        with self.lock:
+            if self._state_payload is None:
+                self._state_payload = EncodedPayload(self.state, etag=self.etag, compress_min_size=Config.STATE_GZIP_MIN_BYTES)
+            return self._state_payload
+    
+    async def wait_for_change(self, revision: int, timeout: float):
+        """等待版本号离开 revision，最多等待 timeout 秒"""
+        future = asyncio.get_running_loop().create_future()
+        waiter = (asyncio.get_running_loop(), future)
+        with self._waiters_lock:
+            self._waiters.append(waiter)
+        try:
+            if self.revision == revision:
+                await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._waiters_lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+    
+    def snapshot(self):
+        """当前状态与本局统计的快照
+        
+        随机数流和已看过的新闻不属于快照：撤销后重新结算会抽到新的新闻，
+        操作序列（包括撤销）仍然可以按种子完整重放。
+        """
+        return take_snapshot(
+            self.state,
+            self.snapshots.latest,
+            {"rounds_played": self.rounds_played, "happiness_total": self.happiness_total, "co2_total": self.co2_total},
+        )
+    
+    def restore(self, snapshot):
+        """恢复到快照时的状态，并同步历史数据"""
+        self.state = restore_snapshot(snapshot)
+        self.rounds_played = snapshot.extra["rounds_played"]
+        self.happiness_total = snapshot.extra["happiness_total"]
+        self.co2_total = snapshot.extra["co2_total"]
+        self.history.rewind(self.state.year)
+        if not len(self.history.years) or self.history.years.last() < self.state.year:
+            self.history.record(self.state)
+        self.touch()
+    
+    def city_sampler(self, catalog):
+        """本局地图的城市抽样器（新闻目录热加载后重新构建）"""
+        if self._sampler_catalog is not catalog:
+            self._city_sampler = catalog.city_sampler(self.state.cities)
+            self._sampler_catalog = catalog
+        return self._city_sampler
+
+# 写入AI提示词的城市数上限（地图很大时只列出状况最差的几个城市）
+NEWS_CONTEXT_MAX_CITIES = 5
+
+def news_context(state) -> str:
+    """当前游戏局势的简短描述（年份、资金和城市状况），用于AI新闻提示词"""
+    alive = [city for city in state.cities.values() if not city.eliminated]
+    # 幸福度低、CO2高的城市排在前面
+    alive.sort(key=lambda city: city.happiness - city.co2)
+    cities = "；".join(
+        f"{city.name}（幸福度{city.happiness}，CO2 {city.co2}，交通{city.transportation}，能源{city.energy_source}）"
+        for city in alive[:NEWS_CONTEXT_MAX_CITIES]
+    )
+    return f"第{state.year}年，资金{state.money}，{cities or '所有城市均已淘汰'}"
 
-def check_game_over():
-    """检查游戏是否结束"""
-    global game_state
+def _wake_waiter(future):
+    """在等待方的事件循环中唤醒长轮询请求"""
+    if not future.done():
+        future.set_result(None)
+
+# 回合数据导出（未配置导出目录时不记录）
+round_exporter = RoundExporter(
+    Config.ANALYTICS_EXPORT_DIR,
+    batch_rounds=Config.ANALYTICS_BATCH_ROUNDS,
+    flush_seconds=Config.ANALYTICS_FLUSH_SECONDS,
+    max_pending_batches=Config.ANALYTICS_MAX_PENDING_BATCHES,
+    file_format=Config.ANALYTICS_FORMAT,
+)
+
+# 跨会话排行榜（记录所有已结束的游戏）
+leaderboard = Leaderboard(Config.LEADERBOARD_MAX_ENTRIES)
+
+# 所有游戏会话（按最近访问排序，超过上限时淘汰最久未访问的会话）
+game_sessions: "OrderedDict[str, GameSession]" = OrderedDict()
+_sessions_lock = threading.Lock()
+
+def _store_session(session: GameSession):
+    """保存会话并淘汰超出上限的旧会话（调用方需持有 _sessions_lock）"""
+    game_sessions[session.session_id] = session
+    game_sessions.move_to_end(session.session_id)
+    while len(game_sessions) > Config.MAX_SESSIONS:
+        game_sessions.popitem(last=False)
+
+def create_game_session(seed: Optional[int] = None) -> GameSession:
+    """创建一个新的游戏会话"""
+    session = GameSession(uuid.uuid4().hex, seed)
+    with _sessions_lock:
+        _store_session(session)
+    return session
+
+def get_session(session_id: str = DEFAULT_SESSION_ID) -> GameSession:
+    """获取游戏会话；默认会话不存在时自动创建"""
+    with _sessions_lock:
+        session = game_sessions.get(session_id)
+        if session is None:
+            if session_id != DEFAULT_SESSION_ID:
+                raise HTTPException(status_code=404, detail="Session not found")
+            session = GameSession(session_id)
+            _store_session(session)
+        else:
+            game_sessions.move_to_end(session_id)
+    return session
+
+# AI新闻服务（首次使用时才初始化）
+news_service = None
+_news_service_lock = threading.Lock()
+
+def get_news_service():
+    """获取AI新闻服务，首次调用时才导入并构造（线程安全）"""
+    global news_service, news_service_available
     
-    # 金钱小于等于0，游戏结束
-    if game_state.money <= 0:
-        game_state.game_over = True
-        return
+    if news_service is not None or not news_service_available:
+        return news_service
+    
+    with _news_service_lock:
+        if news_service is None and news_service_available:
+            try:
+                from news_service import NewsService
+                news_service = NewsService()
+            except ImportError:
+                news_service_available = False
+                print("Warning: AI news service not available. Install news_service and config modules for AI functionality.")
+            except Exception as e:
+                print(f"Warning: Failed to initialize AI news service: {e}")
+                news_service_available = False
     
-    # 所有城市都被淘汰，游戏结束
-    all_eliminated = all(city.eliminated for city in game_state.cities.values())
-    if all_eliminated:
-        game_state.game_over = True
+    return news_service
+
+# 启动时加载新闻目录（数据文件无效时直接失败，而不是带着空目录启动）
+current_news_catalog()
+
+# 静态数据目录（每个新闻目录版本编码一次，之后直接返回缓存的字节串）
+_catalog_payload = None
+_catalog_lock = threading.Lock()
 
-def generate_news(use_ai=False, news_type=None, severity=None, force_ai=False):
-    """生成新闻事件，支持AI和传统新闻"""
+def build_catalog(news_catalog):
+    """汇总前端需要的所有静态数据表"""
+    catalog = {
+        "transportation_effects": TRANSPORTATION_EFFECTS,
+        "energy_effects": ENERGY_EFFECTS,
+        "initial_cities": initial_cities_data,
+        "news_catalog_version": news_catalog.version,
+    }
+    catalog.update(news_catalog.to_dict())
+    return catalog
+
+def get_catalog_payload():
+    """获取预编码的静态数据目录"""
+    global _catalog_payload
+    news_catalog = current_news_catalog()
+    payload = _catalog_payload
+    if payload is None or payload[0] is not news_catalog:
+        with _catalog_lock:
+            payload = _catalog_payload
+            if payload is None or payload[0] is not news_catalog:
+                payload = (news_catalog, EncodedPayload(build_catalog(news_catalog)))
+                _catalog_payload = payload
+    return payload[1]
+
+@hot_path("generate_news")
+def generate_news(session, use_ai=False, news_type=None, severity=None, force_ai=False, prepared=None):
+    """生成新闻事件，支持AI和传统新闻（随机数取自会话自己的随机数流；prepared 为后台预生成的AI故事）"""
+    state = session.state
+    rng = session.rng
     news = None
     
     # 如果请求使用AI且AI服务可用
-    if (use_ai or force_ai) and news_service_available and news_service:
+    if (use_ai or force_ai) and get_news_service():
         try:
             if news_type:
-                news_event = news_service.generate_news(news_type=news_type)
+                news_event = news_service.generate_news(news_type=news_type, rng=rng, seen=session.seen_news)
             elif severity:
-                news_event = news_service.generate_news_by_severity(severity)
+                news_event = news_service.generate_news_by_severity(severity, rng=rng, seen=session.seen_news)
             else:
-                news_event = news_service.generate_news(force_ai=force_ai)
+                news_event = news_service.generate_news(force_ai=force_ai, rng=rng, seen=session.seen_news, prepared=prepared)
             
             # 将AI新闻事件转换为字典格式
             news = {
@@ -301,8 +424,11 @@ def generate_news(use_ai=False, news_type=None, severity=None, force_ai=False):
                 "description": news_event.description,
                 "effects": news_event.effects,
                 "timestamp": news_event.timestamp,
-                "source": "AI"
+                "source": news_event.source or "AI"
             }
+            if news_event.title_en is not None:
+                news["title_en"] = news_event.title_en
+                news["description_en"] = news_event.description_en
         except Exception as e:
             print(f"AI news generation failed: {e}")
             # 如果AI生成失败，回退到传统新闻
@@ -310,237 +436,571 @@ def generate_news(use_ai=False, news_type=None, severity=None, force_ai=False):
     
     # 如果没有使用AI或AI生成失败，使用传统新闻生成
     if not news:
-        # 70%概率生成全国性新闻，30%概率生成城市特定新闻
-        if random.random() < 0.7:
-            news = random.choice(NEWS_EVENTS).copy()
-        else:
-            # 选择一个未被淘汰的城市
-            available_cities = [city_id for city_id, city in game_state.cities.items() if not city.eliminated]
-            if not available_cities:
-                # 如果所有城市都被淘汰，生成全国性新闻
-                news = random.choice(NEWS_EVENTS).copy()
-            else:
-                city_id = random.choice(available_cities)
-                city_news = CITY_SPECIFIC_NEWS.get(city_id, [])
-                if not city_news:
-                    news = random.choice(NEWS_EVENTS).copy()
-                else:
-                    news = random.choice(city_news).copy()
-                    news["effects"]["city"] = city_id
-        
+        # 本次请求全程使用同一个目录版本，热加载不会影响进行中的请求
+        news_catalog = current_news_catalog()
+        news = draw_news(state, news_catalog, rng, session.city_sampler(news_catalog))
         news["timestamp"] = datetime.now().isoformat()
         news["source"] = "Traditional"
     
-    game_state.last_news = news
-    
     # 应用新闻效果
-    apply_effects(news["effects"])
+    apply_news(state, news)
+    record_finished_game(session)
+    session.touch()
     
     return news
 
-@app.get("/state")
-def get_state():
-    """获取当前游戏状态"""
-    return game_state
+def record_finished_game(session):
+    """游戏结束时把本局成绩写入排行榜（每局只记录一次）"""
+    state = session.state
+    if not state.game_over or session.recorded:
+        return
+    session.recorded = True
+    
+    if session.rounds_played:
+        avg_happiness = session.happiness_total / session.rounds_played
+        avg_co2 = session.co2_total / session.rounds_played
+    else:
+        avg_happiness, avg_co2 = city_averages(state)
+    leaderboard.record(session.session_id, session.seed, session.rounds_played, state.money, avg_happiness, avg_co2)
 
-@app.post("/action/transportation/{city_id}/{transport_type}")
-def set_transportation(city_id: str, transport_type: str):
-    """为指定城市设置运输方式(仅预览效果)"""
-    if transport_type not in TRANSPORTATION_EFFECTS:
-        raise HTTPException(status_code=400, detail="Invalid transportation type")
+def resolve_round(session, use_ai=False):
+    """结算一回合：应用当前更改，更新年份并生成新闻，返回本回合的新闻"""
+    state = session.state
     
-    if city_id not in game_state.cities:
-        raise HTTPException(status_code=404, detail="City not found")
+    # 保存结算前的快照（撤销时回到这里，本回合已做的选择也会保留）
+    session.snapshots.push(session.snapshot())
     
-    if game_state.cities[city_id].eliminated:
-        raise HTTPException(status_code=400, detail="This city has been eliminated")
+    # 玩家思考期间为本年预生成的AI新闻
+    prepared = session.take_speculation() if use_ai else None
     
-    # 保存到当前回合更改
-    game_state.current_round_changes.transportation[city_id] = transport_type
+    # 累计本年的城市平均值（用于排行榜的平均幸福度/CO2）
+    happiness, co2 = city_averages(state)
+    session.rounds_played += 1
+    session.happiness_total += happiness
+    session.co2_total += co2
     
-    # 计算预期效果
-    effects = calculate_projected_effects(
-        city_id, 
-        transport_type=transport_type, 
-        energy_type=game_state.current_round_changes.energy_source.get(city_id, game_state.cities[city_id].energy_source)
+    # 导出用：结算前的年份、金钱和城市快照
+    year, money_before = state.year, state.money
+    before = city_snapshot(state) if round_exporter.running else None
+    
+    # 应用运输/能源变更，进入下一年
+    advance_year(state, session.spillover)
+    
+    # 生成新闻（默认使用传统新闻，可以通过其他端点获取AI新闻）
+    news = generate_news(session, use_ai=use_ai, prepared=prepared)
+    
+    # 记录新一年开始时的状态
+    session.history.record(state)
+    if before is not None:
+        round_exporter.record(session.session_id, session.seed, year, money_before, before, state, news)
+    return news
+
+# ===== 会话端点 =====
+
+@app.post("/sessions")
+def create_session(seed: Optional[int] = None):
+    """创建新的游戏会话，返回会话ID与随机种子（相同种子+相同操作可完整重放一局游戏）"""
+    session = create_game_session(seed)
+    with session.lock:
+        return FastJSONResponse({"session_id": session.session_id, "seed": session.seed, "state": session.state})
+
+@app.delete("/sessions/{session_id}")
+def delete_session(session_id: str):
+    """删除游戏会话"""
+    with _sessions_lock:
+        if game_sessions.pop(session_id, None) is None:
+            raise HTTPException(status_code=404, detail="Session not found")
+    return {"message": f"Session {session_id} deleted"}
+
+@app.get("/state")
+async def get_state(
+    session_id: str = DEFAULT_SESSION_ID,
+    wait: float = 0,
+    if_none_match: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None),
+):
+    """
+    获取当前游戏状态
+    
+    ETag为状态版本号：If-None-Match 命中时返回304。
+    wait > 0 时为长轮询：客户端持有的仍是最新版本时，等待状态变化（最多 wait 秒）再返回，超时返回304。
+    状态较大且客户端接受gzip时返回压缩内容。
+    """
+    session = get_session(session_id)
+    revision = session.revision
+    if wait > 0 and session.is_current(if_none_match):
+        await session.wait_for_change(revision, min(wait, Config.STATE_LONG_POLL_MAX_SECONDS))
+    
+    # 编码需要持有会话锁，放到线程池中执行，不阻塞事件循环
+    payload = await run_in_threadpool(session.state_payload)
+    return payload.response(if_none_match, accept_encoding=accept_encoding)
+
+@app.get("/export")
+def export_game(session_id: str = DEFAULT_SESSION_ID):
+    """导出当前游戏的二进制存档（msgpack）"""
+    session = get_session(session_id)
+    with session.lock:
+        content = session.export()
+        year = session.state.year
+    return Response(
+        content=content,
+        media_type=SAVE_MEDIA_TYPE,
+        headers={"Content-Disposition": f'attachment; filename="{session_id}-year{year}.sgs"'},
     )
+
+def _validate_saved_state(state):
+    """检查存档中的数值、城市设置和本回合更改是否有效（存档来自客户端）"""
+    if state.year < 1:
+        raise HTTPException(status_code=400, detail=f"Invalid year: {state.year}")
+    if not -2 ** 63 <= state.money < 2 ** 63:
+        raise HTTPException(status_code=400, detail=f"Invalid money: {state.money}")
+    for city_id, city in state.cities.items():
+        if not 0 <= city.happiness <= 100 or not 0 <= city.co2 <= 100:
+            raise HTTPException(status_code=400, detail=f"Invalid happiness or co2 for {city_id}")
+        if city.transportation not in TRANSPORTATION_EFFECTS:
+            raise HTTPException(status_code=400, detail=f"Invalid transportation type: {city.transportation}")
+        if city.energy_source not in ENERGY_EFFECTS:
+            raise HTTPException(status_code=400, detail=f"Invalid energy type: {city.energy_source}")
+    changes = state.current_round_changes
+    for choices, valid in ((changes.transportation, TRANSPORTATION_EFFECTS), (changes.energy_source, ENERGY_EFFECTS)):
+        for city_id, choice in choices.items():
+            if city_id not in state.cities:
+                raise HTTPException(status_code=400, detail=f"City not found: {city_id}")
+            if choice not in valid:
+                raise HTTPException(status_code=400, detail=f"Invalid choice for {city_id}: {choice}")
+
+def _import_game(session_id: str, data: bytes):
+    try:
+        saved = load_game(data)
+    except SaveFormatError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid save file: {e}")
+    _validate_saved_state(saved.state)
     
-    return {
-        "message": f"Transportation for {city_id} set to {transport_type}", 
-        "state": game_state,
-        "projected_effects": effects
-    }
+    session = get_session(session_id)
+    with session.lock:
+        try:
+            session.load(saved)
+        except (ValueError, TypeError, OverflowError) as e:
+            # 成绩统计等附带数据无效；load 失败时会话保持原样
+            raise HTTPException(status_code=400, detail=f"Invalid save file: {e}")
+        return FastJSONResponse({"message": "Game loaded", "seed": session.seed, "ranked": False, "state": session.state})
+
+@app.post("/import")
+async def import_game(request: Request, session_id: str = DEFAULT_SESSION_ID):
+    """从存档继续游戏（请求体为 /export 导出的二进制存档，也接受旧版的 GameState JSON）；读档后的游戏不记入排行榜"""
+    data = await request.body()
+    if len(data) > Config.MAX_SAVE_BYTES:
+        raise HTTPException(status_code=413, detail="Save file too large")
+    # 解码和校验在线程池中执行，不阻塞事件循环
+    return await run_in_threadpool(_import_game, session_id, data)
+
+@app.get("/catalog")
+def get_catalog(if_none_match: Optional[str] = Header(None)):
+    """获取所有静态数据表（运输、能源、初始城市、新闻目录），支持ETag缓存"""
+    return get_catalog_payload().response(if_none_match)
+
+@app.post("/catalog/reload")
+def reload_catalog():
+    """立即重新加载新闻目录数据文件（文件无效时保留当前目录）"""
+    store = get_catalog_store()
+    reloaded = store.reload()
+    return {"reloaded": reloaded, "version": store.current.version, "error": store.last_error}
+
+@app.post("/action/transportation/{city_id}/{transport_type}")
+def set_transportation(city_id: str, transport_type: str, session_id: str = DEFAULT_SESSION_ID):
+    """为指定城市设置运输方式(仅预览效果)"""
+    if transport_type not in TRANSPORTATION_EFFECTS:
+        raise HTTPException(status_code=400, detail="Invalid transportation type")
+    
+    session = get_session(session_id)
+    with session.lock:
+        state = session.state
+        
+        if city_id not in state.cities:
+            raise HTTPException(status_code=404, detail="City not found")
+        
+        if state.cities[city_id].eliminated:
+            raise HTTPException(status_code=400, detail="This city has been eliminated")
+        
+        # 保存到当前回合更改，并计算预期效果
+        effects = choose_transportation(state, city_id, transport_type)
+        session.touch()
+        
+        return FastJSONResponse({
+            "message": f"Transportation for {city_id} set to {transport_type}", 
+            "state": state,
+            "projected_effects": effects
+        })
 
 @app.post("/action/energy/{city_id}/{energy_type}")
-def set_energy(city_id: str, energy_type: str):
+def set_energy(city_id: str, energy_type: str, session_id: str = DEFAULT_SESSION_ID):
     """为指定城市设置能源来源(仅预览效果)"""
     if energy_type not in ENERGY_EFFECTS:
         raise HTTPException(status_code=400, detail="Invalid energy type")
     
-    if city_id not in game_state.cities:
-        raise HTTPException(status_code=404, detail="City not found")
+    session = get_session(session_id)
+    with session.lock:
+        state = session.state
+        
+        if city_id not in state.cities:
+            raise HTTPException(status_code=404, detail="City not found")
+        
+        if state.cities[city_id].eliminated:
+            raise HTTPException(status_code=400, detail="This city has been eliminated")
+        
+        # 保存到当前回合更改，并计算预期效果
+        effects = choose_energy(state, city_id, energy_type)
+        session.touch()
+        
+        return FastJSONResponse({
+            "message": f"Energy source for {city_id} set to {energy_type}", 
+            "state": state,
+            "projected_effects": effects
+        })
+
+@app.post("/next-round")
+def next_round(session_id: str = DEFAULT_SESSION_ID, use_ai: bool = Config.NEXT_ROUND_AI_NEWS):
+    """进入下一回合，应用当前更改，更新年份并生成新闻（use_ai 时使用AI新闻，并在后台预生成下一回合的新闻）"""
+    session = get_session(session_id)
+    with session.lock:
+        state = session.state
+        
+        if state.game_over:
+            return {"message": "Game over! Please restart the game."}
+        
+        news = resolve_round(session, use_ai=use_ai)
+        if use_ai:
+            session.speculate()
+        
+        return FastJSONResponse({"news": news, "year": state.year, "state": state})
+
+def _validate_policy(policy: Dict[str, CityPolicy], cities):
+    """检查快进策略中的城市和选项是否有效"""
+    for city_id, city_policy in policy.items():
+        if city_id not in cities:
+            raise HTTPException(status_code=404, detail=f"City not found: {city_id}")
+        if city_policy.transportation is not None and city_policy.transportation not in TRANSPORTATION_EFFECTS:
+            raise HTTPException(status_code=400, detail=f"Invalid transportation type: {city_policy.transportation}")
+        if city_policy.energy_source is not None and city_policy.energy_source not in ENERGY_EFFECTS:
+            raise HTTPException(status_code=400, detail=f"Invalid energy type: {city_policy.energy_source}")
+
+def simulate_years(state, years, step, policy=None, script=None):
+    """按固定或脚本策略连续结算多个回合，返回按列存储的逐年摘要（step 结算一回合并返回新闻）"""
+    policy = policy or {}
+    script = script or []
+    city_ids = list(state.cities)
     
-    if game_state.cities[city_id].eliminated:
-        raise HTTPException(status_code=400, detail="This city has been eliminated")
+    summary = {
+        "year": [],
+        "money": [],
+        "cities": {city_id: {"happiness": [], "co2": []} for city_id in city_ids},
+        "news": [],
+        "eliminations": [],
+    }
     
-    # 保存到当前回合更改
-    game_state.current_round_changes.energy_source[city_id] = energy_type
+    for index in range(years):
+        if state.game_over:
+            break
+        
+        # 写入本年的选择：脚本策略优先于固定策略
+        queue_policy(state, script[index % len(script)] if script else policy)
+        
+        alive_before = [city_id for city_id in city_ids if not state.cities[city_id].eliminated]
+        news = step()
+        
+        summary["year"].append(state.year)
+        summary["money"].append(state.money)
+        summary["news"].append(news["type"])
+        for city_id in city_ids:
+            city = state.cities[city_id]
+            summary["cities"][city_id]["happiness"].append(city.happiness)
+            summary["cities"][city_id]["co2"].append(city.co2)
+        for city_id in alive_before:
+            if state.cities[city_id].eliminated:
+                summary["eliminations"].append({"year": state.year, "city": city_id})
     
-    # 计算预期效果
-    effects = calculate_projected_effects(
-        city_id, 
-        transport_type=game_state.current_round_changes.transportation.get(city_id, game_state.cities[city_id].transportation),
-        energy_type=energy_type
-    )
+    summary["years_simulated"] = len(summary["year"])
+    summary["game_over"] = state.game_over
+    return summary
+
+def fast_forward(session, years, policy=None, script=None):
+    """快进：在会话上连续结算多个回合（使用传统新闻）"""
+    return simulate_years(session.state, years, lambda: resolve_round(session), policy, script)
+
+def preview(session, years, policy=None, script=None):
+    """
+    在当前状态的副本上模拟多个回合，不修改会话
     
-    return {
-        "message": f"Energy source for {city_id} set to {energy_type}", 
-        "state": game_state,
-        "projected_effects": effects
-    }
+    副本由快照重建（只复制城市的不可变记录），随机数流从会话当前位置复制，
+    同一时刻的多个预览看到相同的随机新闻，不同策略的结果可以直接比较。
+    """
+    state = restore_snapshot(session.snapshot())
+    rng = random.Random()
+    rng.setstate(session.rng.getstate())
+    news_catalog = current_news_catalog()
+    city_sampler = session.city_sampler(news_catalog)
+    return simulate_years(state, years, lambda: play_round(state, news_catalog, rng, city_sampler, spillover=session.spillover), policy, script)
 
-@app.post("/next-round")
-def next_round():
-    """进入下一回合，应用当前更改，更新年份并生成新闻"""
-    if game_state.game_over:
-        return {"message": "Game over! Please restart the game."}
+@app.post("/fast-forward")
+def fast_forward_game(request: FastForwardRequest, session_id: str = DEFAULT_SESSION_ID):
+    """快进N年：在一次请求中按给定策略连续结算回合，返回紧凑的逐年摘要"""
+    if request.years > Config.MAX_FAST_FORWARD_YEARS:
+        raise HTTPException(status_code=400, detail=f"years must be at most {Config.MAX_FAST_FORWARD_YEARS}")
     
-    # 应用当前回合中的所有更改
-    total_money_change = 0
-    
-    # 应用交通方式变更
-    for city_id, transport_type in game_state.current_round_changes.transportation.items():
-        if city_id in game_state.cities and not game_state.cities[city_id].eliminated:
-            # 只有当设置确实发生变化时才应用效果
-            if game_state.cities[city_id].transportation != transport_type:
-                effects = TRANSPORTATION_EFFECTS[transport_type]
-                
-                # 应用金钱效果（累积）
-                if "money" in effects:
-                    total_money_change += effects["money"]
-                
-                # 应用其他效果
-                for key, value in effects.items():
-                    if key == "happiness":
-                        game_state.cities[city_id].happiness = max(0, min(100, game_state.cities[city_id].happiness + value))
-                    elif key == "co2":
-                        game_state.cities[city_id].co2 = max(0, min(100, game_state.cities[city_id].co2 + value))
-                
-                # 更新城市的交通设置
-                game_state.cities[city_id].transportation = transport_type
-    
-    # 应用能源来源变更
-    for city_id, energy_type in game_state.current_round_changes.energy_source.items():
-        if city_id in game_state.cities and not game_state.cities[city_id].eliminated:
-            # 只有当设置确实发生变化时才应用效果
-            if game_state.cities[city_id].energy_source != energy_type:
-                effects = ENERGY_EFFECTS[energy_type]
-                
-                # 应用金钱效果（累积）
-                if "money" in effects:
-                    total_money_change += effects["money"]
-                
-                # 应用其他效果
-                for key, value in effects.items():
-                    if key == "happiness":
-                        game_state.cities[city_id].happiness = max(0, min(100, game_state.cities[city_id].happiness + value))
-                    elif key == "co2":
-                        game_state.cities[city_id].co2 = max(0, min(100, game_state.cities[city_id].co2 + value))
-                
-                # 更新城市的能源设置
-                game_state.cities[city_id].energy_source = energy_type
-    
-    # 应用总体金钱变化
-    game_state.money += total_money_change
-    
-    # 检查城市是否应被淘汰
-    for city_id, city in game_state.cities.items():
-        if not city.eliminated and (city.happiness <= 0 or city.co2 >= 100):
-            city.eliminated = True
-    
-    # 检查游戏结束条件
-    check_game_over()
-    
-    # 增加年份
-    game_state.year += 1
-    
-    # 清除当前回合的更改
-    game_state.current_round_changes = RoundChanges()
+    session = get_session(session_id)
+    with session.lock:
+        state = session.state
+        
+        if state.game_over:
+            return {"message": "Game over! Please restart the game."}
+        
+        _validate_policy(request.policy, state.cities)
+        for year_policy in request.script:
+            _validate_policy(year_policy, state.cities)
+        
+        summary = fast_forward(session, request.years, request.policy, request.script)
+        return FastJSONResponse({"summary": summary, "state": state})
+
+@app.post("/undo")
+def undo_round(session_id: str = DEFAULT_SESSION_ID):
+    """撤销上一回合，回到该回合结算前的状态（保留当时已做的选择）"""
+    session = get_session(session_id)
+    with session.lock:
+        if session.state.game_over:
+            return {"message": "Game over! Please restart the game."}
+        
+        snapshot = session.snapshots.undo(session.snapshot())
+        if snapshot is None:
+            raise HTTPException(status_code=400, detail="Nothing to undo")
+        session.restore(snapshot)
+        return FastJSONResponse({
+            "state": session.state,
+            "can_undo": session.snapshots.can_undo,
+            "can_redo": session.snapshots.can_redo,
+        })
+
+@app.post("/redo")
+def redo_round(session_id: str = DEFAULT_SESSION_ID):
+    """重做被撤销的回合"""
+    session = get_session(session_id)
+    with session.lock:
+        snapshot = session.snapshots.redo(session.snapshot())
+        if snapshot is None:
+            raise HTTPException(status_code=400, detail="Nothing to redo")
+        session.restore(snapshot)
+        return FastJSONResponse({
+            "state": session.state,
+            "can_undo": session.snapshots.can_undo,
+            "can_redo": session.snapshots.can_redo,
+        })
+
+@app.post("/preview")
+def preview_branches(request: PreviewRequest, session_id: str = DEFAULT_SESSION_ID):
+    """分支预览：从当前状态出发分别模拟每个策略分支，返回各分支的逐年摘要，不修改游戏"""
+    if len(request.branches) > Config.MAX_PREVIEW_BRANCHES:
+        raise HTTPException(status_code=400, detail=f"at most {Config.MAX_PREVIEW_BRANCHES} branches")
+    if sum(branch.years for branch in request.branches) > Config.MAX_FAST_FORWARD_YEARS:
+        raise HTTPException(status_code=400, detail=f"total years must be at most {Config.MAX_FAST_FORWARD_YEARS}")
     
-    # 生成新闻（默认使用传统新闻，可以通过其他端点获取AI新闻）
-    news = generate_news()
+    session = get_session(session_id)
+    with session.lock:
+        state = session.state
+        
+        if state.game_over:
+            return {"message": "Game over! Please restart the game."}
+        
+        for branch in request.branches:
+            _validate_policy(branch.policy, state.cities)
+            for year_policy in branch.script:
+                _validate_policy(year_policy, state.cities)
+        
+        branches = [preview(session, branch.years, branch.policy, branch.script) for branch in request.branches]
+        return FastJSONResponse({"year": state.year, "branches": branches})
+
+# 策略顾问池：置换表不是线程安全的，每个请求独占一个顾问，用完放回池中供之后的请求复用置换表；
+# 池中没有空闲顾问时新建一个，并发请求互不等待。新闻目录热加载后丢弃旧的顾问
+_advisor_pool: List[StrategyAdvisor] = []
+_advisor_catalog = None
+_advisor_lock = threading.Lock()
+
+def acquire_strategy_advisor():
+    """取出一个空闲的策略顾问（根据当前规则与新闻目录构造），返回 (顾问, 新闻目录)"""
+    global _advisor_catalog
+    news_catalog = current_news_catalog()
+    with _advisor_lock:
+        if _advisor_catalog is not news_catalog:
+            _advisor_pool.clear()
+            _advisor_catalog = news_catalog
+        if _advisor_pool:
+            return _advisor_pool.pop(), news_catalog
+    advisor = StrategyAdvisor.from_catalog(TRANSPORTATION_EFFECTS, ENERGY_EFFECTS, news_catalog, NATIONAL_NEWS_PROBABILITY)
+    return advisor, news_catalog
+
+def release_strategy_advisor(advisor: StrategyAdvisor, news_catalog):
+    """把顾问放回池中（新闻目录已经变化或池已满时丢弃）"""
+    with _advisor_lock:
+        if news_catalog is _advisor_catalog and len(_advisor_pool) < Config.ADVISOR_POOL_SIZE:
+            _advisor_pool.append(advisor)
+
+@app.get("/advisor")
+def get_advice(session_id: str = DEFAULT_SESSION_ID, depth: Optional[int] = None, budget_ms: Optional[float] = None):
+    """根据当前状态搜索未来几回合，推荐每个城市的运输方式与能源组合"""
+    depth = Config.ADVISOR_MAX_DEPTH if depth is None else min(depth, Config.ADVISOR_MAX_DEPTH)
+    budget_ms = Config.ADVISOR_BUDGET_MS if budget_ms is None else min(budget_ms, Config.ADVISOR_BUDGET_MS)
+    if depth < 1 or budget_ms <= 0:
+        raise HTTPException(status_code=400, detail="depth and budget_ms must be positive")
+    
+    session = get_session(session_id)
+    with session.lock:
+        state = session.state
+        if state.game_over:
+            return {"message": "Game over! Please restart the game."}
+        year, money = state.year, state.money
+        cities = {city_id: city.model_copy() for city_id, city in state.cities.items()}
+        spillover = session.spillover
     
-    return {"news": news, "year": game_state.year, "state": game_state}
+    # 搜索在会话锁之外进行，顾问在请求期间独占
+    advisor, news_catalog = acquire_strategy_advisor()
+    try:
+        advice = advisor.advise(year, money, cities, max_depth=depth, budget_ms=budget_ms, spillover=spillover)
+    finally:
+        release_strategy_advisor(advisor, news_catalog)
+    return FastJSONResponse(advice)
 
 @app.get("/news")
-def get_news():
+def get_news(session_id: str = DEFAULT_SESSION_ID):
     """获取新闻事件并更新状态 (保留以兼容旧版)"""
-    if game_state.game_over:
-        return {"message": "Game over! Please restart the game."}
+    session = get_session(session_id)
+    with session.lock:
+        if session.state.game_over:
+            return {"message": "Game over! Please restart the game."}
+        
+        news = generate_news(session)
+        return FastJSONResponse(news)
+
+@app.get("/history")
+def get_history(session_id: str = DEFAULT_SESSION_ID, points: Optional[int] = None):
+    """获取逐年的金钱和各城市幸福度/CO2历史，points 指定最多返回的点数（超出时服务端降采样）"""
+    max_points = max(1, Config.HISTORY_CAPACITY)
+    if points is not None and (points < 1 or points > max_points):
+        raise HTTPException(status_code=400, detail=f"points must be between 1 and {max_points}")
     
-    news = generate_news()
-    return news
+    session = get_session(session_id)
+    with session.lock:
+        return FastJSONResponse(session.history.query(points))
+
+def _check_profile_access(token: Optional[str]):
+    """剖析结果只在开启剖析时可见；配置了调试令牌时需要携带令牌"""
+    if not profiling_enabled():
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    if Config.PROFILE_DEBUG_TOKEN and not debug_token_matches(token):
+        raise HTTPException(status_code=403, detail="Invalid debug token")
+
+@app.get("/debug/profiles")
+def list_profiles(x_debug_profile: Optional[str] = Header(None)):
+    """最近的请求剖析结果（耗时、采样数和热点函数计时）"""
+    _check_profile_access(x_debug_profile)
+    return FastJSONResponse({"profiles": profile_store.list()})
+
+@app.get("/debug/profiles/{profile_id}")
+def get_profile(profile_id: str, x_debug_profile: Optional[str] = Header(None)):
+    """单个请求的折叠调用栈（可直接交给 flamegraph.pl 或 speedscope）"""
+    _check_profile_access(x_debug_profile)
+    profile = profile_store.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(profile.folded())
+
+@app.get("/analytics/status")
+def get_analytics_status():
+    """回合数据导出的状态与统计"""
+    return round_exporter.statistics()
+
+# ===== 排行榜端点 =====
+
+@app.get("/leaderboard")
+def get_leaderboard(limit: int = 10):
+    """排行榜前N名（按坚持年数、最终金钱、平均幸福度、平均CO2排名）"""
+    if limit < 1 or limit > Config.LEADERBOARD_MAX_LIMIT:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {Config.LEADERBOARD_MAX_LIMIT}")
+    return FastJSONResponse({"entries": leaderboard.top(limit), "total": len(leaderboard)})
+
+@app.get("/leaderboard/rank")
+def get_leaderboard_rank(session_id: str = DEFAULT_SESSION_ID):
+    """会话最好成绩和最近一局在排行榜中的名次"""
+    rank = leaderboard.session_rank(session_id)
+    if rank is None:
+        raise HTTPException(status_code=404, detail="No finished games for this session")
+    return FastJSONResponse(rank)
 
 # ===== AI新闻相关端点 =====
 
 @app.get("/news/ai")
-def get_ai_news():
+def get_ai_news(session_id: str = DEFAULT_SESSION_ID):
     """获取AI生成的新闻事件并更新状态"""
-    if game_state.game_over:
+    session = get_session(session_id)
+    if session.state.game_over:
         return {"message": "Game over! Please restart the game."}
     
-    if not news_service_available or not news_service:
+    if not get_news_service():
         raise HTTPException(status_code=503, detail="AI news service not available")
     
-    news = generate_news(use_ai=True)
-    return news
+    with session.lock:
+        news = generate_news(session, use_ai=True)
+        return FastJSONResponse(news)
 
 @app.get("/news/type/{news_type}")
-def get_specific_news(news_type: str):
+def get_specific_news(news_type: str, session_id: str = DEFAULT_SESSION_ID):
     """获取特定类型的新闻"""
-    if game_state.game_over:
+    session = get_session(session_id)
+    if session.state.game_over:
         return {"message": "Game over! Please restart the game."}
     
-    if not news_service_available or not news_service:
+    if not get_news_service():
         raise HTTPException(status_code=503, detail="AI news service not available")
     
     try:
-        news = generate_news(use_ai=True, news_type=news_type)
-        return news
+        with session.lock:
+            news = generate_news(session, use_ai=True, news_type=news_type)
+            return FastJSONResponse(news)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/news/severity/{severity}")
-def get_news_by_severity(severity: str):
+def get_news_by_severity(severity: str, session_id: str = DEFAULT_SESSION_ID):
     """根据严重程度获取新闻"""
-    if game_state.game_over:
+    session = get_session(session_id)
+    if session.state.game_over:
         return {"message": "Game over! Please restart the game."}
     
     if severity not in ["low", "medium", "high"]:
         raise HTTPException(status_code=400, detail="Severity must be 'low', 'medium', or 'high'")
     
-    if not news_service_available or not news_service:
+    if not get_news_service():
         raise HTTPException(status_code=503, detail="AI news service not available")
     
-    news = generate_news(use_ai=True, severity=severity)
-    return news
+    with session.lock:
+        news = generate_news(session, use_ai=True, severity=severity)
+        return FastJSONResponse(news)
 
 @app.get("/news/force-ai")
-def get_force_ai_news():
+def get_force_ai_news(session_id: str = DEFAULT_SESSION_ID):
     """强制使用AI生成新闻（用于测试）"""
-    if game_state.game_over:
+    session = get_session(session_id)
+    if session.state.game_over:
         return {"message": "Game over! Please restart the game."}
     
-    if not news_service_available or not news_service:
+    if not get_news_service():
         raise HTTPException(status_code=503, detail="AI news service not available")
     
-    news = generate_news(force_ai=True)
-    return news
+    with session.lock:
+        news = generate_news(session, force_ai=True)
+        return FastJSONResponse(news)
 
 @app.get("/news/statistics")
 def get_news_statistics():
     """获取新闻系统统计信息"""
-    if not news_service_available or not news_service:
+    if not get_news_service():
         raise HTTPException(status_code=503, detail="AI news service not available")
     
     return news_service.get_news_statistics()
@@ -553,35 +1013,47 @@ def set_api_key(api_key: str):
     
     Config.set_api_key(api_key)
     global news_service
-    news_service = NewsService()  # 重新初始化新闻服务
+    with _news_service_lock:
+        news_service = None  # 丢弃旧实例，下次访问时按新密钥重新初始化
+    if not get_news_service():
+        raise HTTPException(status_code=503, detail="AI news service not available")
     return {"message": "API key updated", "ai_enabled": news_service.ai_generator is not None}
 
 @app.get("/test/ai")
 def test_ai():
     """测试AI新闻生成功能"""
-    if not news_service_available or not news_service:
+    if not get_news_service():
         return {"ai_test_passed": False, "message": "AI news service not available"}
     
     success = news_service.test_ai_generation()
     return {"ai_test_passed": success}
 
+# ===== 静态资源端点 =====
+
+@app.api_route("/", methods=["GET", "HEAD"], include_in_schema=False)
+@app.api_route("/game_interface.html", methods=["GET", "HEAD"], include_in_schema=False)
+def get_game_interface(request: Request):
+    """提供游戏界面（预压缩HTML）"""
+    return static_assets.html.response(request.headers, request.method)
+
+@app.api_route("/videos/{filename}", methods=["GET", "HEAD"], include_in_schema=False)
+def get_video(filename: str, request: Request):
+    """提供背景视频，支持Range请求"""
+    asset = static_assets.get_video(filename)
+    if asset is None:
+        raise HTTPException(status_code=404, detail="Video not found")
+    return asset.response(request.headers, request.method)
+
 # ===== 传统游戏端点保持不变 =====
 
 @app.post("/restart")
-def restart_game():
-    """重启游戏"""
-    global game_state
-    
-    # 创建一个新的GameState实例，使用原始城市数据
-    new_cities = {}
-    for city_id, data in initial_cities_data.items():
-        # 创建全新的城市对象，确保完全重置所有属性
-        new_cities[city_id] = City(**data)
-    
-    # 创建新的游戏状态
-    game_state = GameState(cities=new_cities, year=1)
-    
-    return {"message": "Game restarted", "state": game_state}
+def restart_game(session_id: str = DEFAULT_SESSION_ID, seed: Optional[int] = None):
+    """重启游戏（可指定随机种子以重放一局游戏）"""
+    session = get_session(session_id)
+    with session.lock:
+        # 创建新的游戏状态和随机数流，使用原始城市数据
+        session.reset(seed)
+        return FastJSONResponse({"message": "Game restarted", "seed": session.seed, "state": session.state})
 
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
@@ -1,13 +1,18 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-import random
-from datetime import datetime
 import uvicorn
 
 # 导入新的AI新闻系统
 from news_service import NewsService
 from config import Config
+from game_engine import (
+    TRANSPORTATION_EFFECTS,
+    ENERGY_EFFECTS,
+    create_single_city_state,
+    set_single_city_transportation,
+    set_single_city_energy,
+    apply_single_city_news,
+)
 
 app = FastAPI()
 
@@ -19,60 +24,23 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# 游戏状态模型
-class GameState(BaseModel):
-    money: int = 1000
-    happiness: int = 50
-    co2: int = 50
-    transportation: str = "bicycle"
-    energy_source: str = "solar"
-    last_news: dict = None
-    game_over: bool = False
-
-# 初始游戏状态
-game_state = GameState()
+# 单城市游戏状态（规则见 game_engine 中的单城市版本函数，这里只负责HTTP接口）
+game_state = create_single_city_state()
 
 # 初始化AI新闻服务
 news_service = NewsService()
 
-# 运输方式影响
-TRANSPORTATION_EFFECTS = {
-    "bicycle": {"money": -5, "happiness": 3, "co2": -8},
-    "scooter": {"money": -10, "happiness": 2, "co2": -5},
-    "car": {"money": -50, "happiness": -5, "co2": 15},
-    "electronic_car": {"money": -70, "happiness": 2, "co2": 5},
-    "bus": {"money": -20, "happiness": -2, "co2": 8},
-    "electronic_bus": {"money": -30, "happiness": 1, "co2": 3},
-    "train": {"money": -25, "happiness": 4, "co2": 4},
-    "airplane": {"money": -150, "happiness": 6, "co2": 40},
-    "potogan": {"money": -200, "happiness": 10, "co2": -10}
-}
-
-# 能源来源影响
-ENERGY_EFFECTS = {
-    "mining": {"money": -30, "happiness": -10, "co2": 20},
-    "water": {"money": -50, "happiness": 5, "co2": -8},
-    "nuclear": {"money": -100, "happiness": -5, "co2": -15},
-    "solar": {"money": -80, "happiness": 8, "co2": -12},
-    "wind": {"money": -70, "happiness": 7, "co2": -10},
-    "automic": {"money": -150, "happiness": 3, "co2": -20},
-    "anti_material": {"money": -300, "happiness": 15, "co2": -30}
-}
-
-def apply_effects(effects):
-    """应用效果到游戏状态"""
-    global game_state
-    
-    if effects.get("money"):
-        game_state.money += effects["money"]
-    if effects.get("happiness"):
-        game_state.happiness = max(0, min(100, game_state.happiness + effects["happiness"]))
-    if effects.get("co2"):
-        game_state.co2 = max(0, min(100, game_state.co2 + effects["co2"]))
-    
-    # 检查游戏结束条件
-    if game_state.money <= 0 or game_state.happiness <= 0 or game_state.co2 >= 100:
-        game_state.game_over = True
+def apply_news_event(news_event) -> dict:
+    """把生成的新闻转换为字典格式，应用到游戏状态并返回"""
+    news_dict = {
+        "type": news_event.type,
+        "title": news_event.title,
+        "description": news_event.description,
+        "effects": news_event.effects,
+        "timestamp": news_event.timestamp
+    }
+    apply_single_city_news(game_state, news_dict)
+    return news_dict
 
 @app.get("/state")
 def get_state():
@@ -85,8 +53,7 @@ def set_transportation(transport_type: str):
     if transport_type not in TRANSPORTATION_EFFECTS:
         raise HTTPException(status_code=400, detail="Invalid transportation type")
     
-    game_state.transportation = transport_type
-    apply_effects(TRANSPORTATION_EFFECTS[transport_type])
+    set_single_city_transportation(game_state, transport_type)
     return {"message": f"Transportation set to {transport_type}", "state": game_state}
 
 @app.post("/action/energy/{energy_type}")
@@ -95,8 +62,7 @@ def set_energy(energy_type: str):
     if energy_type not in ENERGY_EFFECTS:
         raise HTTPException(status_code=400, detail="Invalid energy type")
     
-    game_state.energy_source = energy_type
-    apply_effects(ENERGY_EFFECTS[energy_type])
+    set_single_city_energy(game_state, energy_type)
     return {"message": f"Energy source set to {energy_type}", "state": game_state}
 
 @app.get("/news")
@@ -105,25 +71,8 @@ def get_news():
     if game_state.game_over:
         return {"message": "Game over! Please restart the game."}
     
-    # 使用新的AI新闻服务生成新闻
-    news_event = news_service.generate_news()
-    
-    # 将新闻转换为字典格式
-    news_dict = {
-        "type": news_event.type,
-        "title": news_event.title,
-        "description": news_event.description,
-        "effects": news_event.effects,
-        "timestamp": news_event.timestamp
-    }
-    
-    # 应用新闻效果
-    apply_effects(news_event.effects)
-    
-    # 保存最新新闻到游戏状态
-    game_state.last_news = news_dict
-    
-    return news_dict
+    # 使用新的AI新闻服务生成新闻，应用效果并保存为最新新闻
+    return apply_news_event(news_service.generate_news())
 
 @app.get("/news/type/{news_type}")
 def get_specific_news(news_type: str):
@@ -133,21 +82,9 @@ def get_specific_news(news_type: str):
     
     try:
         news_event = news_service.generate_news(news_type=news_type)
-        
-        news_dict = {
-            "type": news_event.type,
-            "title": news_event.title,
-            "description": news_event.description,
-            "effects": news_event.effects,
-            "timestamp": news_event.timestamp
-        }
-        
-        apply_effects(news_event.effects)
-        game_state.last_news = news_dict
-        
-        return news_dict
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    return apply_news_event(news_event)
 
 @app.get("/news/severity/{severity}")
 def get_news_by_severity(severity: str):
@@ -158,20 +95,7 @@ def get_news_by_severity(severity: str):
     if severity not in ["low", "medium", "high"]:
         raise HTTPException(status_code=400, detail="Severity must be 'low', 'medium', or 'high'")
     
-    news_event = news_service.generate_news_by_severity(severity)
-    
-    news_dict = {
-        "type": news_event.type,
-        "title": news_event.title,
-        "description": news_event.description,
-        "effects": news_event.effects,
-        "timestamp": news_event.timestamp
-    }
-    
-    apply_effects(news_event.effects)
-    game_state.last_news = news_dict
-    
-    return news_dict
+    return apply_news_event(news_service.generate_news_by_severity(severity))
 
 @app.get("/news/force-ai")
 def get_ai_news():
@@ -179,20 +103,7 @@ def get_ai_news():
     if game_state.game_over:
         return {"message": "Game over! Please restart the game."}
     
-    news_event = news_service.generate_news(force_ai=True)
-    
-    news_dict = {
-        "type": news_event.type,
-        "title": news_event.title,
-        "description": news_event.description,
-        "effects": news_event.effects,
-        "timestamp": news_event.timestamp
-    }
-    
-    apply_effects(news_event.effects)
-    game_state.last_news = news_dict
-    
-    return news_dict
+    return apply_news_event(news_service.generate_news(force_ai=True))
 
 @app.get("/news/statistics")
 def get_news_statistics():
@@ -217,7 +128,7 @@ def test_ai():
 def restart_game():
     """重启游戏"""
     global game_state
-    game_state = GameState()
+    game_state = create_single_city_state()
     return {"message": "Game restarted", "state": game_state}
 
 if __name__ == "__main__":
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+启动耗时测量脚本
+在全新的Python进程中反复导入应用模块，统计冷启动耗时，
+并检查AI依赖栈（openai/httpx）是否在启动阶段被导入。
+
+用法:
+    python measure_startup.py            # 测量 main 的冷启动
+    python measure_startup.py --eager    # 对比：启动时同时导入AI新闻栈
+    python measure_startup.py --runs 20 --module main_with_ai_news
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+
+# 子进程中执行的测量代码：输出 导入耗时(ms) 与 是否加载了openai/httpx
+PROBE = """
+import sys, time
+start = time.perf_counter()
+import {module}
+{eager}
+elapsed = (time.perf_counter() - start) * 1000
+print(f"{{elapsed:.3f}} {{int('openai' in sys.modules)}} {{int('httpx' in sys.modules)}} {{len(sys.modules)}}")
+"""
+
+EAGER_IMPORTS = "import news_service, openai"
+
+def measure(module: str, runs: int, eager: bool = False) -> dict:
+    """在独立子进程中多次测量模块导入耗时"""
+    code = PROBE.format(module=module, eager=EAGER_IMPORTS if eager else "")
+    timings = []
+    openai_loaded = httpx_loaded = False
+    module_count = 0
+
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        # 取最后一行，忽略模块导入时的警告输出
+        elapsed, has_openai, has_httpx, count = result.stdout.strip().splitlines()[-1].split()
+        timings.append(float(elapsed))
+        openai_loaded = openai_loaded or has_openai == "1"
+        httpx_loaded = httpx_loaded or has_httpx == "1"
+        module_count = int(count)
+
+    return {
+        "module": module,
+        "eager": eager,
+        "runs": runs,
+        "median_ms": statistics.median(timings),
+        "min_ms": min(timings),
+        "max_ms": max(timings),
+        "openai_loaded": openai_loaded,
+        "httpx_loaded": httpx_loaded,
+        "modules_loaded": module_count,
+    }
+
+def print_report(report: dict):
+    """打印测量结果"""
+    mode = "eager AI stack" if report["eager"] else "lazy AI stack"
+    print(f"=== import {report['module']} ({mode}, {report['runs']} runs) ===")
+    print(f"  median: {report['median_ms']:.1f} ms  (min {report['min_ms']:.1f}, max {report['max_ms']:.1f})")
+    print(f"  modules loaded: {report['modules_loaded']}")
+    print(f"  openai loaded: {report['openai_loaded']}, httpx loaded: {report['httpx_loaded']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="测量游戏服务的冷启动耗时")
+    parser.add_argument("--module", default="main", help="要测量的应用模块")
+    parser.add_argument("--runs", type=int, default=10, help="测量次数")
+    parser.add_argument("--eager", action="store_true", help="只测量启动时同时导入AI栈的情况")
+    args = parser.parse_args()
+
+    if args.eager:
+        print_report(measure(args.module, args.runs, eager=True))
+        return
+
+    lazy = measure(args.module, args.runs)
+    print_report(lazy)
+    try:
+        eager = measure(args.module, args.runs, eager=True)
+    except subprocess.CalledProcessError:
+        print("\n(AI stack not installed, skipping eager comparison)")
+        return
+    print_report(eager)
+    saved = eager["median_ms"] - lazy["median_ms"]
+    print(f"\nLazy loading saves {saved:.1f} ms per cold start")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+游戏数据模型
+多城市游戏的状态模型，规则引擎、HTTP接口和模拟工具共用。
+
+来自客户端的数据（请求体、存档、地图文件）用普通构造函数完整校验；
+规则表、快照等内部可信数据用 trusted() 构造，跳过校验。
+"""
+
+import copy
+from typing import Callable, Dict, Optional, Tuple
+
+from pydantic import BaseModel
+
+_object_setattr = object.__setattr__
+_IMMUTABLE = (int, float, str, bool, bytes, tuple, frozenset, type(None))
+
+def _default_factory(default):
+    """字段默认值的生成方式：不可变值直接共享（返回None），空容器新建，其余深复制"""
+    if isinstance(default, _IMMUTABLE):
+        return None
+    if isinstance(default, (dict, list, set)) and not default:
+        return type(default)
+    return lambda: copy.deepcopy(default)
+
+# 模型类 -> ((字段名, 默认值, 默认值的生成函数或None), ...)，按字段定义顺序
+_trusted_fields: Dict[type, Tuple[Tuple[str, object, Optional[Callable]], ...]] = {}
+
+class TrustedModel(BaseModel):
+    """支持跳过校验构造的模型基类"""
+
+    @classmethod
+    def trusted(cls, **values):
+        """
+        用内部可信的数据创建实例，不做任何校验或转换
+
+        调用方保证字段类型正确，并且传入的可变值（字典等）不与其他对象共享。
+        字段按模型定义的顺序写入，与校验构造的实例完全一致；
+        可变默认值按类型新建，不像校验构造那样逐个深复制（RoundChanges() 的主要开销）。
+        """
+        fields = _trusted_fields.get(cls)
+        if fields is None:
+            fields = _trusted_fields[cls] = tuple(
+                (name, field.default, _default_factory(field.default)) for name, field in cls.model_fields.items()
+            )
+        data = {}
+        for name, default, factory in fields:
+            if name in values:
+                data[name] = values[name]
+            elif factory is None:
+                data[name] = default
+            else:
+                data[name] = factory()
+        return cls._install(data, set(values))
+
+    @classmethod
+    def trusted_from_dict(cls, data: Dict):
+        """
+        批量重建时使用：data 按字段定义顺序包含全部字段，直接作为实例字典（不复制）
+
+        逐字段的关键字参数和默认值处理都省掉了；单个扁平模型的校验本身已经很快，
+        只有大量重建（撤销/预览恢复上千个城市）时这条路径才有明显差别。
+        """
+        return cls._install(data, set(data))
+
+    @classmethod
+    def _install(cls, data: Dict, fields_set: set):
+        instance = cls.__new__(cls)
+        _object_setattr(instance, "__dict__", data)
+        _object_setattr(instance, "__pydantic_fields_set__", fields_set)
+        _object_setattr(instance, "__pydantic_extra__", None)
+        _object_setattr(instance, "__pydantic_private__", None)
+        return instance
+
+# 城市模型
+class City(TrustedModel):
+    name: str
+    happiness: int = 50
+    co2: int = 50
+    transportation: str = "bicycle"
+    energy_source: str = "solar"
+    eliminated: bool = False
+    position: Dict[str, int] = {}  # 城市在地图上的位置
+
+# 回合中的变更
+class RoundChanges(TrustedModel):
+    transportation: Dict[str, str] = {}
+    energy_source: Dict[str, str] = {}
+    projected_effects: Dict[str, Dict[str, int]] = {}
+
+# 游戏状态模型
+class GameState(TrustedModel):
+    money: int = 1000
+    cities: Dict[str, City] = {}
+    last_news: dict = None
+    game_over: bool = False
+    year: int = 1  # 添加年份
+    current_round_changes: RoundChanges = RoundChanges()
+    seed: int = 0  # 本局游戏的随机种子
+
+# 单城市版本（main_with_ai_news.py）的游戏状态：整个游戏只有一个城市，城市的数值直接放在状态上
+class SingleCityState(TrustedModel):
+    money: int = 1000
+    happiness: int = 50
+    co2: int = 50
+    transportation: str = "bicycle"
+    energy_source: str = "solar"
+    last_news: dict = None
+    game_over: bool = False
@@ -0,0 +1,406 @@
+"""
+新闻目录
+- 新闻表（全国新闻、城市新闻、预设新闻、AI新闻类型）从数据文件加载，校验一次后编译为不可变的目录对象
+- 目录按 类型 / 城市 / 严重程度 建立索引，并为每个索引预先构建别名表（Vose alias method），
+  按权重抽样的开销为 O(1)，与目录大小无关；新闻频率可以按类型、按城市调整权重而无需改代码
+- 数据文件变化时在后台重新加载并原子替换当前目录，正在处理的请求继续使用它们已经拿到的旧目录
+"""
+
+import json
+import os
+import random
+import threading
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from config import Config
+
+# 严重程度 -> 新闻类型（与 NewsService / NewsGenerator 的约定一致）
+DEFAULT_SEVERITY_TYPES = {
+    "low": ("entertainment_news", "sustainability_event"),
+    "medium": ("city_construction", "economy_growth"),
+    "high": ("natural_disaster", "economy_decline"),
+}
+
+# 城市抽样时拒绝已淘汰城市的最大重试次数，超过后退回线性扫描
+MAX_REJECTIONS = 8
+
+class AliasTable:
+    """Vose 别名表：按权重抽样下标，构建 O(n)，抽样 O(1)"""
+
+    __slots__ = ("prob", "alias", "size")
+
+    def __init__(self, weights: Sequence[float]):
+        size = len(weights)
+        if size == 0:
+            raise ValueError("AliasTable requires at least one weight")
+        total = float(sum(weights))
+        if total <= 0 or any(w < 0 for w in weights):
+            raise ValueError("AliasTable weights must be non-negative with a positive sum")
+
+        scaled = [w * size / total for w in weights]
+        prob = [0.0] * size
+        alias = [0] * size
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+
+        while small and large:
+            s, l = small.pop(), large.pop()
+            prob[s] = scaled[s]
+            alias[s] = l
+            scaled[l] = scaled[l] + scaled[s] - 1.0
+            (small if scaled[l] < 1.0 else large).append(l)
+
+        # 浮点误差剩下的项概率为1
+        for i in large + small:
+            prob[i] = 1.0
+            alias[i] = i
+
+        self.prob = prob
+        self.alias = alias
+        self.size = size
+
+    def sample(self, rng=random) -> int:
+        """抽取一个下标"""
+        i = int(rng.random() * self.size)
+        return i if rng.random() < self.prob[i] else self.alias[i]
+
+class WeightedPool:
+    """带别名表的加权条目集合"""
+
+    __slots__ = ("items", "table")
+
+    def __init__(self, items: Sequence, weights: Sequence[float]):
+        self.items = tuple(items)
+        self.table = AliasTable(weights)
+
+    def sample(self, rng=random):
+        return self.items[self.table.sample(rng)]
+
+class CitySampler:
+    """在某张地图的城市中按权重抽取一个未淘汰城市"""
+
+    __slots__ = ("city_ids", "pool")
+
+    def __init__(self, city_ids: Sequence[str], weights: Sequence[float]):
+        self.city_ids = tuple(city_ids)
+        self.pool = WeightedPool(self.city_ids, weights) if self.city_ids else None
+
+    def sample(self, cities: Mapping, rng=random) -> Optional[str]:
+        """抽取一个未淘汰城市；所有城市都被淘汰时返回None"""
+        if self.pool is None:
+            return None
+
+        for _ in range(MAX_REJECTIONS):
+            city_id = self.pool.sample(rng)
+            city = cities.get(city_id)
+            if city is not None and not city.eliminated:
+                return city_id
+
+        # 大部分城市已淘汰：退回到存活城市中均匀选择
+        available = [city_id for city_id in self.city_ids if city_id in cities and not cities[city_id].eliminated]
+        return rng.choice(available) if available else None
+
+class NewsCatalog:
+    """按类型、城市、严重程度索引的新闻目录（构建后只读，条目不应被修改）"""
+
+    def __init__(
+        self,
+        national_events: Sequence[Dict] = (),
+        city_events: Optional[Mapping[str, Sequence[Dict]]] = None,
+        preset_news: Sequence[Dict] = (),
+        type_weights: Optional[Mapping[str, float]] = None,
+        city_weights: Optional[Mapping[str, float]] = None,
+        severity_types: Optional[Mapping[str, Sequence[str]]] = None,
+        ai_news_types: Optional[Mapping[str, Dict]] = None,
+        version: int = 0,
+    ):
+        self.version = version
+        self.type_weights = MappingProxyType(dict(type_weights or {}))
+        self.city_weights = MappingProxyType(dict(city_weights or {}))
+        self.severity_types = MappingProxyType({k: tuple(v) for k, v in (severity_types or DEFAULT_SEVERITY_TYPES).items()})
+
+        self.national_events = tuple(national_events)
+        self.city_events = MappingProxyType({city_id: tuple(events) for city_id, events in (city_events or {}).items()})
+        self.preset_news = tuple(preset_news)
+        self.ai_news_types = MappingProxyType(dict(ai_news_types or {}))
+
+        # 全国性新闻
+        self._national = self._pool(self.national_events)
+
+        # 城市新闻: 城市ID -> 加权池
+        self._by_city = {city_id: self._pool(events) for city_id, events in self.city_events.items() if events}
+
+        # 预设新闻: 全部 / 按类型
+        self._presets = self._pool(self.preset_news)
+        presets_by_type: Dict[str, List[Dict]] = {}
+        for item in self.preset_news:
+            presets_by_type.setdefault(item["type"], []).append(item)
+        self._presets_by_type = {news_type: self._pool(items) for news_type, items in presets_by_type.items()}
+
+        # 严重程度 -> 新闻类型（按类型权重抽样）
+        self._severity_types = {}
+        for severity, types in self.severity_types.items():
+            weights = [self.type_weights.get(news_type, 1.0) for news_type in types]
+            if types and sum(weights) > 0:
+                self._severity_types[severity] = WeightedPool(types, weights)
+
+        # 所有新闻按类型的索引（用于查询与统计）
+        by_type: Dict[str, List[Dict]] = {}
+        for events in (self.national_events, *self.city_events.values(), self.preset_news):
+            for item in events:
+                by_type.setdefault(item["type"], []).append(item)
+        self.by_type: Dict[str, Tuple[Dict, ...]] = {news_type: tuple(items) for news_type, items in by_type.items()}
+
+    def _pool(self, items: Sequence[Dict]) -> Optional[WeightedPool]:
+        """按类型权重构建加权池；权重全为0时返回None"""
+        weights = [self.type_weights.get(item["type"], 1.0) for item in items]
+        if not items or sum(weights) <= 0:
+            return None
+        return WeightedPool(items, weights)
+
+    def city_sampler(self, city_ids: Sequence[str]) -> CitySampler:
+        """为一张地图构建城市抽样器（每局游戏构建一次）"""
+        city_ids = [city_id for city_id in city_ids if self.city_weights.get(city_id, 1.0) > 0]
+        return CitySampler(city_ids, [self.city_weights.get(city_id, 1.0) for city_id in city_ids])
+
+    def sample_national(self, rng=random) -> Optional[Dict]:
+        """抽取一条全国性新闻"""
+        return self._national.sample(rng) if self._national else None
+
+    def sample_city_event(self, city_id: str, rng=random) -> Optional[Dict]:
+        """抽取一条指定城市的新闻；该城市没有新闻时返回None"""
+        pool = self._by_city.get(city_id)
+        return pool.sample(rng) if pool else None
+
+    def sample_preset(self, rng=random, news_type: Optional[str] = None) -> Optional[Dict]:
+        """抽取一条预设新闻；指定类型不存在时退回全部预设新闻"""
+        pool = self._presets_by_type.get(news_type) if news_type else None
+        pool = pool or self._presets
+        return pool.sample(rng) if pool else None
+
+    def sample_severity_type(self, severity: str, rng=random) -> Optional[str]:
+        """按严重程度抽取一个新闻类型"""
+        pool = self._severity_types.get(severity)
+        return pool.sample(rng) if pool else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """导出为与数据文件相同结构的字典"""
+        return {
+            "national_events": list(self.national_events),
+            "city_events": {city_id: list(events) for city_id, events in self.city_events.items()},
+            "preset_news": list(self.preset_news),
+            "ai_news_types": dict(self.ai_news_types),
+            "severity_types": {severity: list(types) for severity, types in self.severity_types.items()},
+            "type_weights": dict(self.type_weights),
+            "city_weights": dict(self.city_weights),
+        }
+
+    def statistics(self) -> Dict[str, int]:
+        """目录规模统计"""
+        return {
+            "version": self.version,
+            "national_events": len(self.national_events),
+            "city_events": sum(len(events) for events in self.city_events.values()),
+            "preset_news": len(self.preset_news),
+            "ai_news_types": len(self.ai_news_types),
+            "news_types": len(self.by_type),
+        }
+
+# ===== 数据文件加载与校验 =====
+
+EFFECT_KEYS = ("money", "happiness", "co2")
+
+class CatalogError(ValueError):
+    """新闻目录数据文件格式错误"""
+
+def _require(condition: bool, message: str):
+    if not condition:
+        raise CatalogError(message)
+
+def _validate_event(event: Any, where: str, allow_city: bool):
+    """校验单条新闻"""
+    _require(isinstance(event, dict), f"{where}: news item must be an object")
+    for field in ("type", "title"):
+        _require(isinstance(event.get(field), str) and event[field] != "", f"{where}: '{field}' must be a non-empty string")
+    _require(isinstance(event.get("description"), str), f"{where}: 'description' must be a string")
+    effects = event.get("effects")
+    _require(isinstance(effects, dict), f"{where}: 'effects' must be an object")
+    for key, value in effects.items():
+        if key == "city" and allow_city:
+            _require(value is None or isinstance(value, str), f"{where}: effects.city must be a string or null")
+            continue
+        _require(key in EFFECT_KEYS, f"{where}: unknown effect '{key}'")
+        _require(isinstance(value, int) and not isinstance(value, bool), f"{where}: effect '{key}' must be an integer")
+
+def _validate_weights(weights: Any, where: str):
+    _require(isinstance(weights, dict), f"{where} must be an object")
+    for key, value in weights.items():
+        _require(isinstance(value, (int, float)) and not isinstance(value, bool) and value >= 0,
+                 f"{where}.{key} must be a non-negative number")
+
+def validate_catalog_data(data: Any):
+    """校验数据文件内容，出错时抛出 CatalogError"""
+    _require(isinstance(data, dict), "catalog must be a JSON object")
+
+    national = data.get("national_events", [])
+    _require(isinstance(national, list) and national, "national_events must be a non-empty list")
+    for i, event in enumerate(national):
+        _validate_event(event, f"national_events[{i}]", allow_city=True)
+
+    city_events = data.get("city_events", {})
+    _require(isinstance(city_events, dict), "city_events must be an object")
+    for city_id, events in city_events.items():
+        _require(isinstance(events, list), f"city_events.{city_id} must be a list")
+        for i, event in enumerate(events):
+            _validate_event(event, f"city_events.{city_id}[{i}]", allow_city=False)
+
+    presets = data.get("preset_news", [])
+    _require(isinstance(presets, list) and presets, "preset_news must be a non-empty list")
+    for i, event in enumerate(presets):
+        _validate_event(event, f"preset_news[{i}]", allow_city=False)
+
+    ai_types = data.get("ai_news_types", {})
+    _require(isinstance(ai_types, dict), "ai_news_types must be an object")
+    for news_type, info in ai_types.items():
+        where = f"ai_news_types.{news_type}"
+        _require(isinstance(info, dict), f"{where} must be an object")
+        _require(isinstance(info.get("description"), str) and isinstance(info.get("context"), str),
+                 f"{where} needs string 'description' and 'context'")
+        ranges = info.get("typical_effects")
+        _require(isinstance(ranges, dict), f"{where}.typical_effects must be an object")
+        for key, bounds in ranges.items():
+            _require(key in EFFECT_KEYS, f"{where}: unknown effect '{key}'")
+            _require(isinstance(bounds, list) and len(bounds) == 2 and all(isinstance(b, int) for b in bounds) and bounds[0] <= bounds[1],
+                     f"{where}.typical_effects.{key} must be [min, max] integers")
+
+    severity_types = data.get("severity_types", DEFAULT_SEVERITY_TYPES)
+    _require(isinstance(severity_types, dict), "severity_types must be an object")
+    for severity, types in severity_types.items():
+        _require(isinstance(types, (list, tuple)) and all(isinstance(t, str) for t in types),
+                 f"severity_types.{severity} must be a list of news types")
+
+    _validate_weights(data.get("type_weights", {}), "type_weights")
+    _validate_weights(data.get("city_weights", {}), "city_weights")
+
+def _require_drawable(events: Sequence[Dict], type_weights: Mapping[str, float], where: str):
+    """每回合都要从中抽取的新闻池，合并后的类型权重不能全为0"""
+    _require(any(type_weights.get(event["type"], 1.0) > 0 for event in events),
+             f"type_weights give every event in {where} weight 0; at least one must stay positive")
+
+def compile_catalog(data: Dict, version: int = 0, type_weights: Optional[Mapping[str, float]] = None,
+                    city_weights: Optional[Mapping[str, float]] = None) -> NewsCatalog:
+    """校验并编译目录数据；额外传入的权重覆盖数据文件中的权重"""
+    validate_catalog_data(data)
+    merged_type_weights = {**data.get("type_weights", {}), **(type_weights or {})}
+    _require_drawable(data["national_events"], merged_type_weights, "national_events")
+    _require_drawable(data["preset_news"], merged_type_weights, "preset_news")
+    return NewsCatalog(
+        national_events=data["national_events"],
+        city_events=data.get("city_events", {}),
+        preset_news=data["preset_news"],
+        type_weights=merged_type_weights,
+        city_weights={**data.get("city_weights", {}), **(city_weights or {})},
+        severity_types=data.get("severity_types"),
+        ai_news_types=data.get("ai_news_types", {}),
+        version=version,
+    )
+
+class CatalogStore:
+    """
+    持有当前新闻目录，数据文件变化时重新加载并原子替换
+
+    读取方每次请求调用一次 current 拿到目录引用后一直使用它，
+    重新加载只替换引用，不会阻塞或影响正在进行的请求。
+    """
+
+    def __init__(self, path: str, type_weights: Optional[Mapping[str, float]] = None,
+                 city_weights: Optional[Mapping[str, float]] = None):
+        self.path = path
+        self.type_weights = dict(type_weights or {})
+        self.city_weights = dict(city_weights or {})
+        self._catalog: Optional[NewsCatalog] = None
+        self._signature = None
+        self._version = 0
+        self._load_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+        self.last_error: Optional[str] = None
+
+    @property
+    def current(self) -> NewsCatalog:
+        """当前目录（首次访问时加载）"""
+        catalog = self._catalog
+        if catalog is None:
+            self.reload()
+            catalog = self._catalog
+        return catalog
+
+    def _file_signature(self):
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def reload(self, force: bool = True) -> bool:
+        """重新加载数据文件；文件无效时保留旧目录。返回是否替换了目录"""
+        with self._load_lock:
+            try:
+                signature = self._file_signature()
+                if not force and signature == self._signature:
+                    return False
+                # 无论成功与否都记录签名：写了一半的文件会在下一次修改时重新加载
+                self._signature = signature
+                with open(self.path, encoding="utf-8") as f:
+                    data = json.load(f)
+                catalog = compile_catalog(data, self._version + 1, self.type_weights, self.city_weights)
+            except (OSError, ValueError) as e:
+                # ValueError 包括 JSON 解析错误和 CatalogError
+                self.last_error = f"{type(e).__name__}: {e}"
+                if self._catalog is None:
+                    raise
+                print(f"Warning: failed to reload news catalog {self.path}: {self.last_error}")
+                return False
+
+            self._version += 1
+            self._catalog = catalog  # 原子替换引用
+            self.last_error = None
+            return True
+
+    def start_watching(self, interval: float = 2.0):
+        """启动后台线程，定期检查数据文件是否变化"""
+        if self._watcher is not None:
+            return
+        self._stop.clear()
+
+        def watch():
+            while not self._stop.wait(interval):
+                try:
+                    if self.reload(force=False):
+                        print(f"News catalog reloaded (version {self._version})")
+                except Exception as e:
+                    print(f"Warning: news catalog watcher error: {e}")
+
+        self._watcher = threading.Thread(target=watch, name="news-catalog-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self):
+        """停止后台检查线程"""
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=5)
+            self._watcher = None
+
+_default_store: Optional[CatalogStore] = None
+_default_store_lock = threading.Lock()
+
+def get_catalog_store() -> CatalogStore:
+    """进程内共享的目录存储（路径与权重来自 Config）"""
+    global _default_store
+    if _default_store is None:
+        with _default_store_lock:
+            if _default_store is None:
+                _default_store = CatalogStore(Config.NEWS_CATALOG_PATH, Config.NEWS_TYPE_WEIGHTS, Config.NEWS_CITY_WEIGHTS)
+    return _default_store
+
+def get_catalog() -> NewsCatalog:
+    """当前新闻目录"""
+    return get_catalog_store().current
@@ -0,0 +1,206 @@
+"""
+AI新闻近似去重
+对标题+描述做字符 bigram 切片（中文按字切分最稳定），用单次哈希 MinHash（One Permutation Hashing）生成签名，
+再按 LSH 分带建立倒排索引：查询只比较与新文本至少有一个分带完全相同的候选，
+数万条新闻规模下单次查询仍在亚毫秒级。
+"""
+
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from operator import eq
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+Signature = Tuple[int, ...]
+
+_NON_WORD = re.compile(r"[\W_]+", re.UNICODE)
+_EMPTY = -1
+
+def normalize_text(text: str) -> str:
+    """统一大小写并去掉空白与标点（中文字符保留）"""
+    return _NON_WORD.sub("", text.lower())
+
+def shingles(text: str, size: int = 2) -> Set[str]:
+    """字符 n-gram 集合；文本短于 n 时整体作为一个切片"""
+    text = normalize_text(text)
+    if len(text) <= size:
+        return {text} if text else set()
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+class MinHashIndex:
+    """MinHash 签名 + LSH 分带的近似重复索引，超出容量时按插入顺序淘汰最旧的条目"""
+
+    def __init__(self, num_bins: int = 64, bands: int = 16, threshold: float = 0.6, capacity: int = 50000, shingle_size: int = 2, bucket_scan_limit: int = 16):
+        if num_bins % bands != 0:
+            raise ValueError("num_bins must be divisible by bands")
+        if num_bins & (num_bins - 1):
+            raise ValueError("num_bins must be a power of two")
+
+        self.num_bins = num_bins
+        self.bands = bands
+        self.rows = num_bins // bands
+        self.threshold = threshold
+        self.capacity = capacity
+        self.shingle_size = shingle_size
+        # 大量新闻共用套话时某些分带桶会很大，每个桶只检查最近加入的若干条，保证查询耗时有上限
+        self.bucket_scan_limit = bucket_scan_limit
+        self._bin_bits = num_bins.bit_length() - 1
+
+        # 条目ID -> (签名, 附带数据)，按插入顺序排列
+        self._entries: "OrderedDict[int, Tuple[Signature, object]]" = OrderedDict()
+        # 每个分带一个倒排表: 分带取值 -> 条目ID列表
+        self._buckets: List[Dict[Signature, List[int]]] = [{} for _ in range(bands)]
+        self._next_id = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def signature(self, text: str) -> Signature:
+        """
+        计算文本的 MinHash 签名
+        每个切片只哈希一次：低位决定分箱，高位参与该箱的最小值比较；
+        空箱从右侧最近的非空箱借值（加上距离偏移），避免短文本因为空箱相同而被误判为相似
+        """
+        bins = [_EMPTY] * self.num_bins
+        mask = self.num_bins - 1
+        for shingle in shingles(text, self.shingle_size):
+            h = zlib.crc32(shingle.encode("utf-8"))
+            b = h & mask
+            value = h >> self._bin_bits
+            if bins[b] == _EMPTY or value < bins[b]:
+                bins[b] = value
+
+        if _EMPTY in bins and any(value != _EMPTY for value in bins):
+            filled = list(bins)
+            for b in range(self.num_bins):
+                if bins[b] != _EMPTY:
+                    continue
+                distance = 1
+                while bins[(b + distance) & mask] == _EMPTY:
+                    distance += 1
+                filled[b] = bins[(b + distance) & mask] + (distance << 32)
+            bins = filled
+        return tuple(bins)
+
+    def similarity(self, a: Signature, b: Signature) -> float:
+        """用签名中相同分箱的比例估计 Jaccard 相似度"""
+        return sum(map(eq, a, b)) / self.num_bins
+
+    def _band_keys(self, signature: Signature) -> Iterable[Tuple[int, Signature]]:
+        rows = self.rows
+        for band in range(self.bands):
+            yield band, signature[band * rows:(band + 1) * rows]
+
+    def query(self, signature: Signature) -> Optional[Tuple[int, float]]:
+        """查找相似度达到阈值的已存条目（优先最近加入的），返回 (条目ID, 相似度)，没有时返回None"""
+        checked = set()
+        for band, key in self._band_keys(signature):
+            bucket = self._buckets[band].get(key)
+            if not bucket:
+                continue
+            for entry_id in reversed(bucket[-self.bucket_scan_limit:]):
+                if entry_id in checked:
+                    continue
+                checked.add(entry_id)
+                score = self.similarity(signature, self._entries[entry_id][0])
+                if score >= self.threshold:
+                    return entry_id, score
+        return None
+
+    def add(self, signature: Signature, payload: object = None) -> int:
+        """加入一个条目，返回条目ID"""
+        while len(self._entries) >= self.capacity:
+            self._evict_oldest()
+
+        entry_id = self._next_id
+        self._next_id += 1
+        self._entries[entry_id] = (signature, payload)
+        for band, key in self._band_keys(signature):
+            self._buckets[band].setdefault(key, []).append(entry_id)
+        return entry_id
+
+    def get(self, entry_id: int) -> Optional[object]:
+        """获取条目的附带数据，条目已被淘汰时返回None"""
+        entry = self._entries.get(entry_id)
+        return entry[1] if entry is not None else None
+
+    def _evict_oldest(self):
+        entry_id, (signature, _) = self._entries.popitem(last=False)
+        for band, key in self._band_keys(signature):
+            bucket = self._buckets[band].get(key)
+            if bucket is None:
+                continue
+            bucket.remove(entry_id)
+            if not bucket:
+                del self._buckets[band][key]
+
+class NewsDeduplicator:
+    """
+    AI新闻去重器（线程安全）
+    - register: 把新生成的新闻归并到已有的“故事”（近似重复）或登记为新故事
+    - pick_unseen: 为会话挑选一条该类型下没看过的已存故事，用于替换重复新闻或代替API调用
+    - 按类型统计近期重复率，重复率高说明该类型的提示词已经“饱和”
+    """
+
+    def __init__(self, threshold: float = 0.6, capacity: int = 50000, reuse_rate: float = 0.5, decay: float = 0.9):
+        self.index = MinHashIndex(threshold=threshold, capacity=capacity)
+        self.reuse_rate = reuse_rate
+        self.decay = decay
+        self._lock = threading.Lock()
+        # 类型 -> 故事ID列表（淘汰的ID在抽取时跳过，定期压缩）
+        self._by_type: Dict[str, List[int]] = {}
+        # 类型 -> 近期重复率（指数滑动平均）
+        self._duplicate_rate: Dict[str, float] = {}
+
+        self.generated = 0
+        self.duplicates = 0
+        self.reused = 0
+
+    def register(self, news_type: str, title: str, description: str) -> Tuple[int, bool]:
+        """登记一条AI新闻，返回 (故事ID, 是否为已有故事的近似重复)"""
+        signature = self.index.signature(f"{title} {description}")
+        with self._lock:
+            self.generated += 1
+            match = self.index.query(signature)
+            duplicate = match is not None
+            if duplicate:
+                self.duplicates += 1
+                story_id = match[0]
+            else:
+                story_id = self.index.add(signature, {"type": news_type, "title": title, "description": description})
+                ids = self._by_type.setdefault(news_type, [])
+                ids.append(story_id)
+                if len(ids) > 2 * self.index.capacity:
+                    self._by_type[news_type] = [i for i in ids if self.index.get(i) is not None]
+
+            rate = self._duplicate_rate.get(news_type, 0.0)
+            self._duplicate_rate[news_type] = self.decay * rate + (1 - self.decay) * (1.0 if duplicate else 0.0)
+            return story_id, duplicate
+
+    def saturated(self, news_type: str) -> bool:
+        """该类型近期的重复率是否超过复用阈值"""
+        return self._duplicate_rate.get(news_type, 0.0) > self.reuse_rate
+
+    def pick_unseen(self, news_type: str, seen: Set[int], rng, attempts: int = 8) -> Optional[Tuple[int, Dict[str, str]]]:
+        """随机挑选该类型下会话没看过的已存故事，返回 (故事ID, 故事)；找不到时返回None"""
+        with self._lock:
+            ids = self._by_type.get(news_type)
+            if not ids:
+                return None
+            for _ in range(attempts):
+                story_id = ids[rng.randrange(len(ids))]
+                story = self.index.get(story_id)
+                if story is not None and story_id not in seen:
+                    self.reused += 1
+                    return story_id, story
+            return None
+
+    def statistics(self) -> Dict[str, int]:
+        """去重统计"""
+        return {
+            "dedup_stored_stories": len(self.index),
+            "dedup_generated": self.generated,
+            "dedup_duplicates": self.duplicates,
+            "dedup_reused": self.reused,
+        }
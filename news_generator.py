@@ -1,17 +1,57 @@
-import openai
 import random
 import json
 import re
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime
 from pydantic import BaseModel
 
+from news_catalog import get_catalog
+from procedural_news import get_procedural_generator
+
+SYSTEM_PROMPT = "你是一个专业的新闻编辑，专门为瑞典斯德哥尔摩的可持续发展游戏生成真实、详细的新闻。你的回复必须是纯JSON格式，不包含任何markdown或代码块标记。"
+COMPLETION_MAX_TOKENS = 300
+
 class NewsEvent(BaseModel):
     type: str
     title: str
     description: str
     effects: Dict[str, int]
     timestamp: str
+    # 程序化生成的新闻带英文版本
+    title_en: Optional[str] = None
+    description_en: Optional[str] = None
+    # 新闻来源（"AI" / "Procedural"），None表示未指定
+    source: Optional[str] = None
+
+def calculate_effects(type_info: Dict, rng: Optional[random.Random] = None) -> Dict[str, int]:
+    """
+    根据新闻类型计算随机效果值
+    
+    Args:
+        type_info: 新闻类型配置（使用其中的 typical_effects）
+        rng: 随机数生成器，默认使用全局random模块
+        
+    Returns:
+        包含money、happiness、co2效果的字典
+    """
+    rng = rng or random
+    effects = {}
+    
+    for effect, (min_val, max_val) in type_info["typical_effects"].items():
+        # 添加一些随机性，让效果不那么固定
+        base_effect = rng.randint(min_val, max_val)
+        # 20%的概率产生意外效果（相反或加强）
+        if rng.random() < 0.2:
+            if rng.random() < 0.5:
+                # 相反效果
+                base_effect = -base_effect // 2
+            else:
+                # 加强效果
+                base_effect = int(base_effect * 1.5)
+        
+        effects[effect] = base_effect
+    
+    return effects
 
 class NewsGenerator:
     def __init__(self, api_key: str):
@@ -21,48 +61,23 @@ class NewsGenerator:
         Args:
             api_key: OpenAI API密钥
         """
+        # 延迟导入openai SDK（及其httpx/pydantic依赖栈），只有真正需要AI时才付出导入成本
+        import openai
+
         self.client = openai.OpenAI(api_key=api_key)
-        
-        # 新闻类型和对应的影响模板
-        self.news_types = {
-            "natural_disaster": {
-                "description": "自然灾害相关新闻",
-                "typical_effects": {"money": (-300, -100), "happiness": (-15, -5), "co2": (-5, 5)},
-                "context": "瑞典面临的自然灾害，如洪水、暴风雪、干旱等"
-            },
-            "city_construction": {
-                "description": "城市建设新闻",
-                "typical_effects": {"money": (-200, -50), "happiness": (3, 12), "co2": (2, 8)},
-                "context": "斯德哥尔摩及其他瑞典城市的基础设施建设项目"
-            },
-            "economy_growth": {
-                "description": "经济增长新闻",
-                "typical_effects": {"money": (150, 400), "happiness": (5, 12), "co2": (3, 10)},
-                "context": "瑞典经济发展、就业增长、科技创新等积极经济新闻"
-            },
-            "economy_decline": {
-                "description": "经济衰退新闻",
-                "typical_effects": {"money": (-350, -150), "happiness": (-12, -4), "co2": (-5, 0)},
-                "context": "经济困难、失业率上升、市场波动等负面经济新闻"
-            },
-            "sustainability_event": {
-                "description": "可持续发展活动",
-                "typical_effects": {"money": (-100, 50), "happiness": (0, 8), "co2": (-25, -5)},
-                "context": "环保活动、绿色技术推广、可持续发展倡议"
-            },
-            "entertainment_news": {
-                "description": "娱乐盛事新闻",
-                "typical_effects": {"money": (-50, 100), "happiness": (8, 20), "co2": (2, 8)},
-                "context": "文化活动、音乐节、体育赛事等娱乐新闻"
-            }
-        }
 
-    def _get_news_prompt(self, news_type: str) -> str:
+    @property
+    def news_types(self) -> Dict[str, Dict]:
+        """新闻类型和对应的影响模板（来自新闻目录数据文件，随文件热加载更新）"""
+        return get_catalog().ai_news_types
+
+    def _get_news_prompt(self, news_type: str, context: Optional[str] = None) -> str:
         """
         根据新闻类型生成对应的提示词
         
         Args:
             news_type: 新闻类型
+            context: 当前游戏局势（年份、城市状况），提供时要求新闻结合局势
             
         Returns:
             GPT提示词字符串
@@ -84,6 +99,12 @@ class NewsGenerator:
         {{"title": "新闻标题", "description": "详细的新闻描述"}}
         """
         
+        if context:
+            prompt += f"""
+        当前游戏局势：{context}
+        新闻内容请结合以上局势（例如提到状况最差或最好的城市）。
+        """
+        
         return prompt.strip()
 
     def _clean_json_response(self, content: str) -> str:
@@ -112,103 +133,128 @@ class NewsGenerator:
         
         return content
 
-    def _calculate_effects(self, news_type: str) -> Dict[str, int]:
+    def _calculate_effects(self, news_type: str, rng: Optional[random.Random] = None) -> Dict[str, int]:
+        """根据新闻类型计算随机效果值"""
+        return calculate_effects(self.news_types[news_type], rng=rng)
+
+    def estimate_tokens(self, news_type: str, context: Optional[str] = None) -> int:
+        """
+        估算一次补全调用最多消耗的token数（用于限流预扣）
+        中文大约每个字一个token，按字符数估算提示词偏保守
+        """
+        return len(SYSTEM_PROMPT) + len(self._get_news_prompt(news_type, context)) + COMPLETION_MAX_TOKENS
+
+    def complete(self, news_type: str, context: Optional[str] = None) -> Tuple[str, str, int]:
         """
-        根据新闻类型计算随机效果值
+        调用补全API生成新闻标题和描述
         
         Args:
             news_type: 新闻类型
+            context: 当前游戏局势，写入提示词
             
         Returns:
-            包含money、happiness、co2效果的字典
+            (标题, 描述, 实际消耗的token数)；API调用失败时抛出异常
         """
-        type_info = self.news_types[news_type]
-        effects = {}
+        prompt = self._get_news_prompt(news_type, context)
+        
+        response = self.client.chat.completions.create(
+            model="gpt-3.5-turbo",
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=COMPLETION_MAX_TOKENS,
+            temperature=0.8
+        )
+        
+        # 解析GPT响应
+        content = response.choices[0].message.content.strip()
         
-        for effect, (min_val, max_val) in type_info["typical_effects"].items():
-            # 添加一些随机性，让效果不那么固定
-            base_effect = random.randint(min_val, max_val)
-            # 20%的概率产生意外效果（相反或加强）
-            if random.random() < 0.2:
-                if random.random() < 0.5:
-                    # 相反效果
-                    base_effect = -base_effect // 2
-                else:
-                    # 加强效果
-                    base_effect = int(base_effect * 1.5)
+        # 清理格式标记
+        clean_content = self._clean_json_response(content)
+        
+        # 尝试解析JSON
+        try:
+            news_data = json.loads(clean_content)
+            title = news_data.get("title", "").strip()
+            description = news_data.get("description", "").strip()
             
-            effects[effect] = base_effect
+            # 确保标题和描述不为空
+            if not title:
+                title = f"{self.news_types[news_type]['description']}事件"
+            if not description:
+                description = "详情待更新"
+                
+        except json.JSONDecodeError as e:
+            print(f"JSON解析失败: {e}")
+            print(f"原始内容: {content}")
+            print(f"清理后内容: {clean_content}")
+            
+            # 如果JSON解析失败，尝试从文本中提取信息
+            title_match = re.search(r'"title":\s*"([^"]+)"', clean_content)
+            desc_match = re.search(r'"description":\s*"([^"]+)"', clean_content)
+            
+            title = title_match.group(1) if title_match else f"{self.news_types[news_type]['description']}事件"
+            description = desc_match.group(1) if desc_match else clean_content[:100] if clean_content else "AI生成的新闻事件"
         
-        return effects
+        usage = getattr(response, "usage", None)
+        tokens_used = usage.total_tokens if usage is not None else 0
+        return title, description, tokens_used
 
-    def generate_news(self, news_type: Optional[str] = None) -> NewsEvent:
+    def generate_news(self, news_type: Optional[str] = None, rng: Optional[random.Random] = None) -> NewsEvent:
         """
         生成新闻事件
         
         Args:
             news_type: 指定新闻类型，如果为None则随机选择
+            rng: 随机数生成器，默认使用全局random模块
             
         Returns:
             生成的新闻事件对象
         """
+        rng = rng or random
+        
         if news_type is None:
-            news_type = random.choice(list(self.news_types.keys()))
+            news_type = rng.choice(list(self.news_types.keys()))
         
         if news_type not in self.news_types:
             raise ValueError(f"不支持的新闻类型: {news_type}")
 
-        # 生成新闻内容
-        prompt = self._get_news_prompt(news_type)
-        
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "你是一个专业的新闻编辑，专门为瑞典斯德哥尔摩的可持续发展游戏生成真实、详细的新闻。你的回复必须是纯JSON格式，不包含任何markdown或代码块标记。"},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=300,
-                temperature=0.8
-            )
-            
-            # 解析GPT响应
-            content = response.choices[0].message.content.strip()
-            
-            # 清理格式标记
-            clean_content = self._clean_json_response(content)
-            
-            # 尝试解析JSON
-            try:
-                news_data = json.loads(clean_content)
-                title = news_data.get("title", "").strip()
-                description = news_data.get("description", "").strip()
-                
-                # 确保标题和描述不为空
-                if not title:
-                    title = f"{self.news_types[news_type]['description']}事件"
-                if not description:
-                    description = "详情待更新"
-                    
-            except json.JSONDecodeError as e:
-                print(f"JSON解析失败: {e}")
-                print(f"原始内容: {content}")
-                print(f"清理后内容: {clean_content}")
-                
-                # 如果JSON解析失败，尝试从文本中提取信息
-                title_match = re.search(r'"title":\s*"([^"]+)"', clean_content)
-                desc_match = re.search(r'"description":\s*"([^"]+)"', clean_content)
-                
-                title = title_match.group(1) if title_match else f"{self.news_types[news_type]['description']}事件"
-                description = desc_match.group(1) if desc_match else clean_content[:100] if clean_content else "AI生成的新闻事件"
-        
+            title, description, _ = self.complete(news_type)
         except Exception as e:
             print(f"调用GPT API失败: {e}")
-            # 使用备用新闻
+            # 使用程序化生成的备用新闻
+            generator = get_procedural_generator()
+            if generator is not None and generator.supports(news_type):
+                text = generator.compose(news_type, rng)
+                return self.compose_news(news_type, text["title"], text["description"], rng=rng,
+                                         title_en=text["title_en"], description_en=text["description_en"],
+                                         source="Procedural")
             title = f"{self.news_types[news_type]['description']}事件"
             description = f"系统生成的{news_type}相关新闻事件"
 
+        return self.compose_news(news_type, title, description, rng=rng, source="AI")
+
+    def compose_news(self, news_type: str, title: str, description: str, rng: Optional[random.Random] = None,
+                     title_en: Optional[str] = None, description_en: Optional[str] = None,
+                     source: Optional[str] = None) -> NewsEvent:
+        """
+        用给定的标题和描述创建新闻事件，效果值按新闻类型重新随机计算
+        
+        Args:
+            news_type: 新闻类型
+            title: 新闻标题
+            description: 新闻描述
+            rng: 随机数生成器，默认使用全局random模块
+            title_en / description_en: 英文标题和描述（可选）
+            source: 新闻来源（可选）
+            
+        Returns:
+            新闻事件对象
+        """
         # 计算效果
-        effects = self._calculate_effects(news_type)
+        effects = self._calculate_effects(news_type, rng=rng)
         
         # 创建新闻事件
         news_event = NewsEvent(
@@ -216,7 +262,10 @@ class NewsGenerator:
             title=title,
             description=description,
             effects=effects,
-            timestamp=datetime.now().isoformat()
+            timestamp=datetime.now().isoformat(),
+            title_en=title_en,
+            description_en=description_en,
+            source=source
         )
         
         return news_event
@@ -242,24 +291,39 @@ class NewsGenerator:
         
         return news_list
 
-    def get_news_by_severity(self, severity: str = "medium") -> NewsEvent:
+    def severity_type(self, severity: str = "medium", rng: Optional[random.Random] = None) -> str:
         """
-        根据严重程度生成新闻
+        按严重程度选择新闻类型
         
         Args:
             severity: 严重程度 ("low", "medium", "high")
+            rng: 随机数生成器，默认使用全局random模块
             
         Returns:
-            新闻事件对象
+            新闻类型
         """
+        rng = rng or random
+        
         if severity == "low":
             # 低影响新闻：娱乐、小型可持续发展活动
-            news_type = random.choice(["entertainment_news", "sustainability_event"])
+            return rng.choice(["entertainment_news", "sustainability_event"])
         elif severity == "high":
             # 高影响新闻：自然灾害、重大经济变化
-            news_type = random.choice(["natural_disaster", "economy_growth", "economy_decline"])
+            return rng.choice(["natural_disaster", "economy_growth", "economy_decline"])
         else:
             # 中等影响新闻：城市建设
-            news_type = "city_construction"
+            return "city_construction"
+
+    def get_news_by_severity(self, severity: str = "medium", rng: Optional[random.Random] = None) -> NewsEvent:
+        """
+        根据严重程度生成新闻
         
-        return self.generate_news(news_type) 
\ No newline at end of file
+        Args:
+            severity: 严重程度 ("low", "medium", "high")
+            rng: 随机数生成器，默认使用全局random模块
+            
+        Returns:
+            新闻事件对象
+        """
+        rng = rng or random
+        return self.generate_news(self.severity_type(severity, rng=rng), rng=rng)
\ No newline at end of file
@@ -1,9 +1,32 @@
 import random
-from typing import Dict, Optional
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Set, Tuple
 from datetime import datetime
 
+from adaptive_ai import create_adaptive_usage
 from config import Config
-from news_generator import NewsGenerator, NewsEvent
+from game_engine import EFFECTS
+from news_generator import NewsGenerator, NewsEvent, calculate_effects
+from news_catalog import NewsCatalog, get_catalog
+from news_dedup import NewsDeduplicator
+from procedural_news import get_procedural_generator
+from rate_limiter import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, SingleFlight, get_rate_limiter
+
+class PreparedStory:
+    """后台预先生成的AI故事（玩家思考期间生成，下一回合直接使用）"""
+    
+    def __init__(self, news_type: str, future):
+        self.news_type = news_type
+        self.future = future
+    
+    def result(self, timeout: float) -> Optional[Tuple[int, str, str]]:
+        """等待生成结果，超时或失败时返回None"""
+        try:
+            return self.future.result(timeout=timeout)
+        except Exception as e:
+            print(f"预生成的AI新闻不可用: {e!r}")
+            return None
 
 class NewsService:
     """新闻服务类，管理AI生成和预设新闻"""
@@ -11,6 +34,24 @@ class NewsService:
     def __init__(self):
         """初始化新闻服务"""
         self.ai_generator = None
+        self.deduplicator = NewsDeduplicator(
+            threshold=Config.NEWS_DEDUP_THRESHOLD,
+            capacity=Config.NEWS_DEDUP_CAPACITY,
+            reuse_rate=Config.NEWS_DEDUP_REUSE_RATE
+        )
+        # 所有会话共享的补全API限流器；同一类型的并发补全请求合并为一次调用
+        self.rate_limiter = get_rate_limiter()
+        self.completions = SingleFlight()
+        # 按API延迟、调用频率和每日token预算调节AI新闻的实际概率
+        self.ai_usage = create_adaptive_usage()
+        
+        # 预生成下一回合新闻的后台线程池（第一次预生成时创建）
+        self._prepare_pool = None
+        self.prepared_stories = 0
+        self.prepared_used = 0
+        self.prepared_missed = 0
+        # 本地程序化生成的新闻数
+        self.procedural_generated = 0
         
         # 初始化AI新闻生成器
         if Config.validate_config():
@@ -20,46 +61,16 @@ class NewsService:
             except Exception as e:
                 print(f"AI新闻生成器初始化失败: {e}")
                 self.ai_generator = None
-        
-        # 预设新闻事件（作为备用）
-        self.preset_news = [
-            {
-                "type": "natural_disaster",
-                "title": "北方洪水肆虐",
-                "description": "瑞典北部遭遇罕见洪水，基础设施受损",
-                "effects": {"money": -200, "happiness": -10, "co2": 0}
-            },
-            {
-                "type": "city_construction", 
-                "title": "环保住宅建设",
-                "description": "斯德哥尔摩新建环保住宅区",
-                "effects": {"money": -150, "happiness": 8, "co2": 5}
-            },
-            {
-                "type": "economy_growth",
-                "title": "科技产业繁荣",
-                "description": "瑞典科技产业蓬勃发展，创造大量就业机会",
-                "effects": {"money": 300, "happiness": 7, "co2": 3}
-            },
-            {
-                "type": "economy_decline",
-                "title": "出口市场波动",
-                "description": "全球市场波动影响瑞典出口",
-                "effects": {"money": -250, "happiness": -8, "co2": -2}
-            },
-            {
-                "type": "sustainability_event",
-                "title": "国际环保会议",
-                "description": "哥德堡举办国际环保会议，推广绿色技术",
-                "effects": {"money": -50, "happiness": 5, "co2": -15}
-            },
-            {
-                "type": "entertainment_news",
-                "title": "马尔默音乐节",
-                "description": "马尔默音乐节吸引全球游客，城市充满活力",
-                "effects": {"money": 100, "happiness": 12, "co2": 5}
-            }
-        ]
+
+    @property
+    def catalog(self) -> NewsCatalog:
+        """当前新闻目录（预设新闻按类型/严重程度建立了抽样索引，数据文件变化时自动更新）"""
+        return get_catalog()
+
+    @property
+    def preset_news(self):
+        """预设新闻事件（作为备用）"""
+        return self.catalog.preset_news
 
     def _create_news_event_from_preset(self, preset: Dict) -> NewsEvent:
         """从预设数据创建新闻事件对象"""
@@ -71,96 +82,260 @@ class NewsService:
             timestamp=datetime.now().isoformat()
         )
 
-    def generate_news(self, news_type: Optional[str] = None, force_ai: bool = False) -> NewsEvent:
+    def _reuse_story(self, news_type: str, seen: Set[int], rng) -> Optional[NewsEvent]:
+        """复用一条会话没看过的已存AI故事（效果值重新计算），没有可用故事时返回None"""
+        picked = self.deduplicator.pick_unseen(news_type, seen, rng)
+        if picked is None:
+            return None
+        story_id, story = picked
+        seen.add(story_id)
+        return self.ai_generator.compose_news(news_type, story["title"], story["description"], rng=rng, source="AI")
+
+    def _roll_ai(self, rng) -> Tuple[bool, bool]:
+        """
+        抽取本条新闻是否使用AI
+        
+        Returns:
+            (使用AI, 按配置概率本该使用AI但因API变慢/预算不足被降下来)
+        """
+        if self.ai_generator is None:
+            return False, False
+        roll = rng.random()
+        if roll < self.ai_usage.probability():
+            return True, False
+        if roll < self.ai_usage.base_probability:
+            self.ai_usage.shed += 1
+            return False, True
+        return False, False
+
+    def _cached_ai_news(self, news_type: Optional[str], rng, seen: Optional[Set[int]]) -> Optional[NewsEvent]:
+        """不调用API，改用一条会话没看过的已存AI故事，没有时返回None"""
+        if seen is None:
+            return None
+        if news_type is None:
+            news_type = rng.choice(list(self.ai_generator.news_types.keys()))
+        elif news_type not in self.ai_generator.news_types:
+            return None
+        news_event = self._reuse_story(news_type, seen, rng)
+        if news_event is not None:
+            self.ai_usage.cached_served += 1
+        return news_event
+
+    def _complete_story(self, news_type: str, priority: int, context: Optional[str] = None) -> Optional[Tuple[int, str, str]]:
+        """
+        排队获取配额后调用一次补全API，并把结果登记到去重索引
+        
+        Returns:
+            (故事ID, 标题, 描述)；今日token预算已用完或排队超时返回None
+        """
+        if self.ai_usage.budget_exhausted():
+            return None
+        estimate = self.ai_generator.estimate_tokens(news_type, context)
+        timeout = Config.OPENAI_QUEUE_TIMEOUT if priority == PRIORITY_INTERACTIVE else Config.OPENAI_BACKGROUND_QUEUE_TIMEOUT
+        if not self.rate_limiter.acquire(estimate, priority=priority, timeout=timeout):
+            print(f"AI请求排队超时({timeout}秒)，使用预设新闻")
+            return None
+        
+        started = time.monotonic()
+        try:
+            title, description, tokens_used = self.ai_generator.complete(news_type, context)
+        except Exception as e:
+            self.ai_usage.record(time.monotonic() - started, failed=True)
+            self.rate_limiter.adjust(-estimate)
+            # 服务商返回限流错误时清空配额，所有调用方一起退避
+            if getattr(e, "status_code", None) == 429:
+                self.rate_limiter.backoff()
+            raise
+        
+        self.ai_usage.record(time.monotonic() - started, tokens_used)
+        self.rate_limiter.adjust(tokens_used - estimate)
+        story_id, _ = self.deduplicator.register(news_type, title, description)
+        return story_id, title, description
+
+    def prepare_story(self, context: Optional[str] = None) -> Optional[PreparedStory]:
+        """
+        在后台以低优先级预先生成一条AI故事（玩家思考下一步时调用）
+        
+        生成的故事同时登记到去重索引，即使下一回合没有用上也可以被之后的请求复用。
+        
+        Args:
+            context: 当前游戏局势，写入提示词
+            
+        Returns:
+            预生成任务；AI不可用或按当前AI份额跳过时返回None
+        """
+        if not self.ai_generator:
+            return None
+        # API变慢或预算不足时按同样的比例减少预生成
+        if random.random() >= self.ai_usage.scale():
+            return None
+        if self._prepare_pool is None:
+            self._prepare_pool = ThreadPoolExecutor(max_workers=Config.SPECULATIVE_NEWS_WORKERS, thread_name_prefix="prepare-news")
+        
+        # 新闻类型不占用会话的随机数流，会话的随机抽取顺序不受预生成影响
+        news_type = random.choice(list(self.ai_generator.news_types.keys()))
+        key = (news_type, context)
+        future = self._prepare_pool.submit(
+            lambda: self.completions.do(key, lambda: self._complete_story(news_type, PRIORITY_BACKGROUND, context))[0]
+        )
+        self.prepared_stories += 1
+        return PreparedStory(news_type, future)
+
+    def _generate_ai_news(self, news_type: Optional[str], rng, seen: Optional[Set[int]], priority: int = PRIORITY_INTERACTIVE,
+                          prepared: Optional[PreparedStory] = None) -> Optional[NewsEvent]:
+        """
+        调用AI生成新闻并去重
+        该类型近期生成的大多是重复内容时，优先复用会话没看过的已存故事，省去一次API调用；
+        会话已经看过生成的故事时换成未看过的已存故事。都不可用或排队超时时返回None
+        提供了同类型的预生成故事时直接使用它（还没生成完时最多等待排队超时时间）
+        """
+        if news_type is None:
+            news_type = prepared.news_type if prepared is not None else rng.choice(list(self.ai_generator.news_types.keys()))
+        if news_type not in self.ai_generator.news_types:
+            raise ValueError(f"不支持的新闻类型: {news_type}")
+        
+        if seen is not None and self.deduplicator.saturated(news_type):
+            reused = self._reuse_story(news_type, seen, rng)
+            if reused is not None:
+                return reused
+        
+        story = None
+        if prepared is not None and prepared.news_type == news_type:
+            story = prepared.result(Config.OPENAI_QUEUE_TIMEOUT)
+            if story is not None:
+                self.prepared_used += 1
+            else:
+                self.prepared_missed += 1
+        
+        if story is None:
+            # 同一类型同时只有一个补全请求在进行，并发的调用方共享同一条故事（效果值各自计算）
+            story, _ = self.completions.do(news_type, lambda: self._complete_story(news_type, priority))
+        if story is None:
+            return None
+        
+        story_id, title, description = story
+        if seen is not None:
+            if story_id in seen:
+                return self._reuse_story(news_type, seen, rng)
+            seen.add(story_id)
+        return self.ai_generator.compose_news(news_type, title, description, rng=rng, source="AI")
+
+    def _generate_procedural_news(self, news_type: Optional[str], rng) -> Optional[NewsEvent]:
+        """用模板和词表在本地生成新闻（效果值按新闻类型随机计算），未启用或按比例轮到预设新闻时返回None"""
+        generator = get_procedural_generator()
+        if generator is None or rng.random() >= Config.PROCEDURAL_NEWS_PROBABILITY:
+            return None
+        ai_news_types = self.catalog.ai_news_types
+        if news_type is None:
+            news_type = rng.choice([name for name in generator.news_types if name in ai_news_types] or [None])
+        if news_type is None or news_type not in ai_news_types or not generator.supports(news_type):
+            return None
+        
+        text = generator.compose(news_type, rng)
+        self.procedural_generated += 1
+        return NewsEvent(
+            type=news_type,
+            effects=calculate_effects(ai_news_types[news_type], rng=rng),
+            timestamp=datetime.now().isoformat(),
+            source="Procedural",
+            **text
+        )
+
+    def generate_news(self, news_type: Optional[str] = None, force_ai: bool = False, rng: Optional[random.Random] = None, seen: Optional[Set[int]] = None, priority: int = PRIORITY_INTERACTIVE,
+                      prepared: Optional[PreparedStory] = None) -> NewsEvent:
         """
         生成新闻事件
         
         Args:
             news_type: 指定新闻类型
             force_ai: 强制使用AI生成
+            rng: 随机数生成器（每个游戏会话一个），默认使用全局random模块
+            seen: 会话已看过的AI故事ID集合，提供时不会向该会话重复展示同一故事
+            priority: 排队等待API配额时的优先级（玩家请求 / 后台补充）
+            prepared: 后台预生成的故事（prepare_story 的返回值）
             
         Returns:
             新闻事件对象
         """
-        # 决定是否使用AI生成
-        use_ai = force_ai or (
-            self.ai_generator is not None and 
-            random.random() < Config.NEWS_GENERATION_PROBABILITY
-        )
+        rng = rng or random
+        
+        # 决定是否使用AI生成（实际概率随API延迟、调用频率和预算调节）
+        use_ai, shed = (True, False) if force_ai else self._roll_ai(rng)
         
-        if use_ai and self.ai_generator:
+        news_event = None
+        if shed:
+            # 降下来的AI新闻先改用会话没看过的已存AI故事
+            news_event = self._cached_ai_news(news_type, rng, seen)
+        elif use_ai and self.ai_generator:
             try:
-                # 使用AI生成新闻
-                ai_news = self.ai_generator.generate_news(news_type)
-                
-                # 应用难度倍数
-                if Config.EFFECT_MULTIPLIER != 1.0:
-                    for effect in ai_news.effects:
-                        ai_news.effects[effect] = int(ai_news.effects[effect] * Config.EFFECT_MULTIPLIER)
-                
-                return ai_news
+                # 使用AI生成新闻（会话看过且没有替代故事时改用预设新闻）
+                news_event = self._generate_ai_news(news_type, rng, seen, priority, prepared)
             except Exception as e:
                 print(f"AI新闻生成失败，使用预设新闻: {e}")
         
-        # 使用预设新闻
-        if news_type:
-            # 根据类型筛选预设新闻
-            filtered_news = [n for n in self.preset_news if n["type"] == news_type]
-            if filtered_news:
-                preset = random.choice(filtered_news)
-            else:
-                preset = random.choice(self.preset_news)
-        else:
-            preset = random.choice(self.preset_news)
-        
-        # 为预设新闻添加一些随机性
-        news_event = self._create_news_event_from_preset(preset)
+        if news_event is None:
+            news_event = self._generate_procedural_news(news_type, rng)
         
-        # 添加轻微的随机变化
-        for effect in news_event.effects:
-            variation = random.randint(-20, 20)  # ±20%的变化
-            original_value = news_event.effects[effect]
-            news_event.effects[effect] = int(original_value * (1 + variation / 100))
-        
-        # 应用难度倍数
-        if Config.EFFECT_MULTIPLIER != 1.0:
+        if news_event is None:
+            # 使用预设新闻（指定类型不存在时从全部预设新闻中抽取）
+            preset = self.catalog.sample_preset(rng, news_type)
+            
+            # 为预设新闻添加一些随机性
+            news_event = self._create_news_event_from_preset(preset)
+            
+            # 添加轻微的随机变化
             for effect in news_event.effects:
-                news_event.effects[effect] = int(news_event.effects[effect] * Config.EFFECT_MULTIPLIER)
+                variation = rng.randint(-20, 20)  # ±20%的变化
+                original_value = news_event.effects[effect]
+                news_event.effects[effect] = int(original_value * (1 + variation / 100))
         
+        # 应用难度倍数（AI新闻和预设新闻都只在这里缩放一次）
+        EFFECTS.scale(news_event.effects, Config.EFFECT_MULTIPLIER)
         return news_event
 
-    def generate_news_by_severity(self, severity: str = "medium") -> NewsEvent:
+    def generate_news_by_severity(self, severity: str = "medium", rng: Optional[random.Random] = None, seen: Optional[Set[int]] = None, priority: int = PRIORITY_INTERACTIVE) -> NewsEvent:
         """
         根据严重程度生成新闻
         
         Args:
             severity: 严重程度 ("low", "medium", "high")
+            rng: 随机数生成器，默认使用全局random模块
+            seen: 会话已看过的AI故事ID集合
+            priority: 排队等待API配额时的优先级
             
         Returns:
             新闻事件对象
         """
-        if self.ai_generator and random.random() < Config.NEWS_GENERATION_PROBABILITY:
-            try:
-                return self.ai_generator.get_news_by_severity(severity)
-            except Exception as e:
-                print(f"AI新闻生成失败: {e}")
+        rng = rng or random
         
-        # 根据严重程度选择预设新闻类型
-        if severity == "low":
-            news_types = ["entertainment_news", "sustainability_event"]
-        elif severity == "high":
-            news_types = ["natural_disaster", "economy_decline"]
-        else:
-            news_types = ["city_construction", "economy_growth"]
+        use_ai, shed = self._roll_ai(rng)
+        if shed and seen is not None:
+            news_event = self._cached_ai_news(self.ai_generator.severity_type(severity, rng=rng), rng, seen)
+            if news_event is not None:
+                EFFECTS.scale(news_event.effects, Config.EFFECT_MULTIPLIER)
+                return news_event
+        elif use_ai:
+            # AI新闻：按严重程度选择类型（生成失败时使用同类型的预设新闻），难度倍数在 generate_news 中统一应用
+            news_type = self.ai_generator.severity_type(severity, rng=rng)
+            return self.generate_news(news_type, force_ai=True, rng=rng, seen=seen, priority=priority)
         
-        return self.generate_news(random.choice(news_types))
+        # 根据严重程度选择预设新闻类型
+        news_type = self.catalog.sample_severity_type(severity, rng) or self.catalog.sample_severity_type("medium", rng)
+        return self.generate_news(news_type, rng=rng, seen=seen, priority=priority)
 
     def get_news_statistics(self) -> Dict[str, int]:
         """获取新闻统计信息"""
         return {
             "ai_enabled": 1 if self.ai_generator else 0,
             "preset_news_count": len(self.preset_news),
-            "ai_probability": int(Config.NEWS_GENERATION_PROBABILITY * 100)
+            **self.ai_usage.statistics(),
+            **self.deduplicator.statistics(),
+            **self.rate_limiter.statistics(),
+            "coalesced_completions": self.completions.shared,
+            "prepared_stories": self.prepared_stories,
+            "prepared_used": self.prepared_used,
+            "prepared_missed": self.prepared_missed,
+            "procedural_generated": self.procedural_generated,
         }
 
     def test_ai_generation(self) -> bool:
@@ -0,0 +1,122 @@
+"""
+程序化新闻生成
+按新闻类型的模板和词表（data/news_grammar.json）在本地组合出中英双语的新闻标题和描述：
+城市、机构、企业、项目等词语成对出现，同一条新闻的中英文使用同一组词语和数字。
+模板加载时预先解析出用到的槽位，生成一条新闻只需几次随机抽取和字符串格式化（微秒级），
+介于AI新闻和少量固定的预设新闻之间：API不可用、排队超时或不使用AI时内容仍然丰富多样。
+"""
+
+import json
+import random
+import string
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from config import Config
+
+_formatter = string.Formatter()
+
+def _capitalize(text: str) -> str:
+    """英文句首大写（词表中的英文词保持原样，可能以小写开头）"""
+    return text[:1].upper() + text[1:]
+
+class _Template:
+    """一条双语模板及其用到的槽位"""
+
+    __slots__ = ("title", "description", "words", "numbers")
+
+    def __init__(self, title: Sequence[str], description: Sequence[str], vocabulary: Dict, numbers: Dict):
+        self.title = tuple(title)
+        self.description = tuple(description)
+        slots = set()
+        for text in self.title + self.description:
+            slots.update(name for _, name, _, _ in _formatter.parse(text) if name)
+        # 英文槽位 xxx_en 与中文槽位 xxx 使用同一个词
+        names = {slot[:-3] if slot.endswith("_en") else slot for slot in slots}
+        unknown = names - set(vocabulary) - set(numbers)
+        if unknown:
+            raise ValueError(f"模板使用了未定义的槽位: {sorted(unknown)}")
+        self.words = tuple(sorted(names & set(vocabulary)))
+        self.numbers = tuple(sorted(names & set(numbers)))
+
+class ProceduralNewsGenerator:
+    """基于模板和词表的本地新闻生成器"""
+
+    def __init__(self, grammar: Dict):
+        """
+        Args:
+            grammar: 包含 vocabulary（槽位 -> [[中文, 英文], ...]）、numbers（槽位 -> [最小值, 最大值]）
+                     和 templates（新闻类型 -> [{"title": [中文, 英文], "description": [中文, 英文]}, ...]）
+        """
+        self.version = grammar.get("version", 0)
+        self.vocabulary = {name: tuple(tuple(pair) for pair in words) for name, words in grammar["vocabulary"].items()}
+        self.numbers = {name: tuple(bounds) for name, bounds in grammar["numbers"].items()}
+        self.templates = {
+            news_type: tuple(_Template(item["title"], item["description"], self.vocabulary, self.numbers) for item in items)
+            for news_type, items in grammar["templates"].items()
+            if items
+        }
+        self.generated = 0
+
+    @classmethod
+    def from_file(cls, path: str) -> "ProceduralNewsGenerator":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    @property
+    def news_types(self) -> Tuple[str, ...]:
+        return tuple(self.templates)
+
+    def supports(self, news_type: str) -> bool:
+        return news_type in self.templates
+
+    def compose(self, news_type: str, rng=None) -> Dict[str, str]:
+        """
+        生成一条新闻的文字部分
+
+        Returns:
+            {"title", "description", "title_en", "description_en"}
+        """
+        rng = rng or random
+        template = rng.choice(self.templates[news_type])
+        values = {}
+        for name in template.words:
+            chinese, english = rng.choice(self.vocabulary[name])
+            values[name] = chinese
+            values[name + "_en"] = english
+        for name in template.numbers:
+            low, high = self.numbers[name]
+            values[name] = values[name + "_en"] = rng.randint(low, high)
+        self.generated += 1
+        return {
+            "title": template.title[0].format_map(values),
+            "description": template.description[0].format_map(values),
+            "title_en": _capitalize(template.title[1].format_map(values)),
+            "description_en": _capitalize(template.description[1].format_map(values)),
+        }
+
+    def fill(self, count: int, news_type: Optional[str] = None, rng=None) -> List[Dict[str, str]]:
+        """批量生成（用于预先填充新闻池），news_type 为None时随机选择类型"""
+        rng = rng or random
+        types = self.news_types
+        return [self.compose(news_type or rng.choice(types), rng) for _ in range(count)]
+
+_default_generator: Optional[ProceduralNewsGenerator] = None
+_default_lock = threading.Lock()
+_load_failed = False
+
+def get_procedural_generator() -> Optional[ProceduralNewsGenerator]:
+    """按配置的词表文件创建的生成器（未开启或文件无效时返回None）"""
+    global _default_generator, _load_failed
+    if not Config.PROCEDURAL_NEWS or _load_failed:
+        return None
+    if _default_generator is None:
+        with _default_lock:
+            if _default_generator is None and not _load_failed:
+                try:
+                    _default_generator = ProceduralNewsGenerator.from_file(Config.NEWS_GRAMMAR_PATH)
+                except (OSError, ValueError, KeyError, TypeError) as e:
+                    print(f"Warning: procedural news disabled, failed to load {Config.NEWS_GRAMMAR_PATH}: {e}")
+                    _load_failed = True
+                    return None
+    return _default_generator
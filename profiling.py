@@ -0,0 +1,260 @@
+"""
+请求级性能剖析（默认关闭）
+开启后按比例抽样请求（或带调试请求头的请求），在请求处理期间由后台线程定时采集调用栈，
+保存为火焰图工具（flamegraph.pl、speedscope 等）可直接读取的折叠栈格式；
+同时记录热点函数（新闻生成、效果结算、游戏结束检查、响应序列化）在该请求中的耗时。
+
+关闭时不添加中间件，hot_path 装饰器直接返回原函数，没有任何额外开销。
+采样线程会采集所有正在执行本项目代码的线程，并发请求较多时剖析结果中可能混入其他请求的调用栈。
+"""
+
+import contextvars
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from config import Config
+
+PROFILE_HEADER = "x-debug-profile"
+PROFILE_ID_HEADER = b"x-profile-id"
+
+_APP_ROOT = os.path.dirname(os.path.abspath(__file__))
+_THIS_FILE = os.path.abspath(__file__)
+# 项目目录下不属于本项目代码的目录（虚拟环境、pixi 环境中的标准库和第三方包）
+_THIRD_PARTY_DIRS = {"site-packages", "dist-packages"}
+
+# 源文件路径 -> 是否为本项目代码（采样线程独占使用）
+_app_file_cache: Dict[str, bool] = {}
+
+def _is_app_file(filename: str) -> bool:
+    """是否为本项目的源文件：位于项目目录下，且不在隐藏目录（.pixi、.venv 等）或 site-packages 中"""
+    result = _app_file_cache.get(filename)
+    if result is None:
+        result = False
+        if filename.startswith(_APP_ROOT + os.sep) and filename != _THIS_FILE:
+            parts = os.path.relpath(filename, _APP_ROOT).split(os.sep)[:-1]
+            result = not any(part.startswith(".") or part in _THIRD_PARTY_DIRS for part in parts)
+        _app_file_cache[filename] = result
+    return result
+
+def profiling_enabled() -> bool:
+    """是否开启了剖析（按比例抽样或配置了调试令牌）"""
+    return Config.PROFILE_SAMPLE_RATE > 0 or bool(Config.PROFILE_DEBUG_TOKEN)
+
+class RequestProfile:
+    """一个请求的剖析结果"""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, method: str, path: str):
+        self.profile_id = f"{os.getpid()}-{next(self._ids)}"
+        self.method = method
+        self.path = path
+        self.started = time.time()
+        self.duration_ms = 0.0
+        self.samples = 0
+        self.stacks: Counter = Counter()
+        self.timers: Dict[str, List[float]] = {}  # 名称 -> [调用次数, 总耗时(毫秒)]
+        self._lock = threading.Lock()
+
+    def add_stack(self, stack: str):
+        with self._lock:
+            self.stacks[stack] += 1
+            self.samples += 1
+
+    def add_timing(self, name: str, elapsed_ms: float):
+        with self._lock:
+            timer = self.timers.setdefault(name, [0, 0.0])
+            timer[0] += 1
+            timer[1] += elapsed_ms
+
+    def folded(self) -> str:
+        """折叠栈格式：每行 “帧;帧;帧 次数”"""
+        with self._lock:
+            return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def summary(self) -> Dict:
+        with self._lock:
+            return {
+                "profile_id": self.profile_id,
+                "method": self.method,
+                "path": self.path,
+                "started": self.started,
+                "duration_ms": round(self.duration_ms, 3),
+                "samples": self.samples,
+                "timers": {
+                    name: {"calls": calls, "total_ms": round(total, 3)}
+                    for name, (calls, total) in self.timers.items()
+                },
+            }
+
+# 当前请求的剖析对象（同步端点在线程池中执行，上下文变量会随请求一起传过去）
+_current_profile: contextvars.ContextVar[Optional[RequestProfile]] = contextvars.ContextVar("current_profile", default=None)
+
+def hot_path(name: str):
+    """
+    热点函数计时装饰器：只在被剖析的请求中记录耗时
+
+    剖析关闭时直接返回原函数。
+    """
+    def decorator(func):
+        if not profiling_enabled():
+            return func
+
+        def wrapper(*args, **kwargs):
+            profile = _current_profile.get()
+            if profile is None:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profile.add_timing(name, (time.perf_counter() - start) * 1000)
+
+        wrapper.__name__ = func.__name__
+        wrapper.__doc__ = func.__doc__
+        wrapper.__wrapped__ = func
+        return wrapper
+    return decorator
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class StackSampler:
+    """后台采样线程：有请求在剖析时定时采集调用栈"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._active: Dict[str, RequestProfile] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, profile: RequestProfile):
+        with self._lock:
+            self._active[profile.profile_id] = profile
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def remove(self, profile: RequestProfile):
+        with self._lock:
+            self._active.pop(profile.profile_id, None)
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while True:
+            with self._lock:
+                profiles = list(self._active.values())
+            if not profiles:
+                self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                labels = []
+                in_app = False
+                while frame is not None:
+                    code = frame.f_code
+                    if not in_app and _is_app_file(code.co_filename):
+                        in_app = True
+                    labels.append(_frame_label(code))
+                    frame = frame.f_back
+                if in_app:
+                    stack = ";".join(reversed(labels))
+                    for profile in profiles:
+                        profile.add_stack(stack)
+            time.sleep(self.interval)
+
+class ProfileStore:
+    """最近的剖析结果（内存中保留固定数量，可选写出 .folded 文件）"""
+
+    def __init__(self, max_profiles: int, directory: Optional[str] = None):
+        self.max_profiles = max_profiles
+        self.directory = directory
+        self._profiles: "OrderedDict[str, RequestProfile]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, profile: RequestProfile):
+        with self._lock:
+            self._profiles[profile.profile_id] = profile
+            while len(self._profiles) > self.max_profiles:
+                self._profiles.popitem(last=False)
+
+    def write(self, profile: RequestProfile):
+        """把剖析结果写成 .folded 文件（文件操作，在线程池中调用）"""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, f"{profile.profile_id}.folded"), "w", encoding="utf-8") as f:
+                f.write(profile.folded())
+        except OSError as e:
+            print(f"Warning: failed to write profile {profile.profile_id}: {e}")
+
+    def get(self, profile_id: str) -> Optional[RequestProfile]:
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+    def list(self) -> List[Dict]:
+        with self._lock:
+            profiles = list(self._profiles.values())
+        return [profile.summary() for profile in reversed(profiles)]
+
+profile_store = ProfileStore(Config.PROFILE_MAX_PROFILES, Config.PROFILE_DIR)
+stack_sampler = StackSampler(Config.PROFILE_INTERVAL_MS / 1000)
+
+def debug_token_matches(value: Optional[str]) -> bool:
+    """调试请求头是否携带了正确的令牌"""
+    return bool(Config.PROFILE_DEBUG_TOKEN) and value == Config.PROFILE_DEBUG_TOKEN
+
+class ProfilingMiddleware:
+    """ASGI中间件：对抽中的请求采集调用栈，并在响应头中返回剖析ID"""
+
+    def __init__(self, app, sample_rate: float = 0.0):
+        self.app = app
+        self.sample_rate = sample_rate
+        self._rng = random.Random()
+
+    def _should_profile(self, scope) -> bool:
+        if self.sample_rate > 0 and self._rng.random() < self.sample_rate:
+            return True
+        for name, value in scope["headers"]:
+            if name == PROFILE_HEADER.encode():
+                return debug_token_matches(value.decode("latin-1"))
+        return False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith("/debug/") or not self._should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope["method"], scope["path"])
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(PROFILE_ID_HEADER, profile.profile_id.encode())]
+            await send(message)
+
+        context_token = _current_profile.set(profile)
+        stack_sampler.add(profile)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            profile.duration_ms = (time.perf_counter() - start) * 1000
+            stack_sampler.remove(profile)
+            _current_profile.reset(context_token)
+            profile_store.add(profile)
+            if profile_store.directory:
+                # 写文件不占用事件循环
+                await run_in_threadpool(profile_store.write, profile)
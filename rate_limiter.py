@@ -0,0 +1,241 @@
+"""
+补全API限流与请求合并
+- QuotaBuckets: 请求数 + token数两个令牌桶；指定状态文件时多个worker进程通过文件锁共享同一配额
+- RateLimiter: 按优先级排队获取配额，交互请求排在后台补充请求前面，超时后由调用方改用预设新闻
+- SingleFlight: 同一新闻类型的并发请求只发起一次补全调用，其余调用方共享结果
+让调用量平稳地维持在配额上限附近，而不是突发撞上服务商限流后全部回退到预设新闻。
+"""
+
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from config import Config
+
+try:
+    import fcntl
+    fcntl_available = True
+except ImportError:
+    fcntl_available = False
+
+PRIORITY_INTERACTIVE = 0  # 玩家主动请求的AI新闻
+PRIORITY_BACKGROUND = 1  # 后台预生成/补充
+
+class QuotaBuckets:
+    """请求数与token数两个令牌桶，每分钟补满一次配额"""
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float, path: Optional[str] = None):
+        self.capacity = (float(requests_per_minute), float(tokens_per_minute))
+        self.rate = (requests_per_minute / 60.0, tokens_per_minute / 60.0)
+        self.path = path if path and fcntl_available else None
+        if path and not fcntl_available:
+            print("Warning: fcntl not available, rate limit is not shared between worker processes")
+        # [请求余量, token余量, 更新时间]
+        self._state = [self.capacity[0], self.capacity[1], time.time()]
+
+    def _load(self, f) -> List[float]:
+        f.seek(0)
+        try:
+            state = json.loads(f.read() or "null")
+        except ValueError:
+            state = None
+        if not isinstance(state, list) or len(state) != 3:
+            state = [self.capacity[0], self.capacity[1], time.time()]
+        return state
+
+    def _save(self, f, state: List[float]):
+        f.seek(0)
+        f.truncate()
+        f.write(json.dumps(state))
+        f.flush()
+
+    def _update(self, func: Callable[[List[float]], Any]) -> Any:
+        """在（跨进程）锁内补充令牌后执行 func(state)，并保存修改后的状态"""
+        if self.path is None:
+            self._refill(self._state)
+            return func(self._state)
+
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        with os.fdopen(fd, "r+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                state = self._load(f)
+                self._refill(state)
+                result = func(state)
+                self._save(f, state)
+                return result
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _refill(self, state: List[float]):
+        now = time.time()
+        elapsed = max(0.0, now - state[2])
+        state[0] = min(self.capacity[0], state[0] + elapsed * self.rate[0])
+        state[1] = min(self.capacity[1], state[1] + elapsed * self.rate[1])
+        state[2] = now
+
+    def try_acquire(self, requests: float, tokens: float) -> float:
+        """配额足够时扣除并返回0，否则返回还需等待的秒数"""
+        requests = min(requests, self.capacity[0])
+        tokens = min(tokens, self.capacity[1])
+
+        def acquire(state):
+            wait = max(
+                (requests - state[0]) / self.rate[0] if self.rate[0] > 0 else 0.0,
+                (tokens - state[1]) / self.rate[1] if self.rate[1] > 0 else 0.0,
+            )
+            if wait <= 0:
+                state[0] -= requests
+                state[1] -= tokens
+                return 0.0
+            return wait
+
+        return self._update(acquire)
+
+    def adjust_tokens(self, delta: float):
+        """按实际用量修正token余量（delta为正表示多用，为负表示退还）"""
+        def adjust(state):
+            state[1] = min(self.capacity[1], state[1] - delta)
+        self._update(adjust)
+
+    def drain(self):
+        """清空余量（服务商返回限流错误时使用，让所有调用方一起退避）"""
+        def drain(state):
+            state[0] = min(state[0], 0.0)
+            state[1] = min(state[1], 0.0)
+        self._update(drain)
+
+class RateLimiter:
+    """按优先级排队的限流器：只有队首的等待者可以获取配额，同优先级先到先得"""
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float, shared_path: Optional[str] = None):
+        self.buckets = QuotaBuckets(requests_per_minute, tokens_per_minute, shared_path)
+        self._cond = threading.Condition()
+        self._waiters: List[Tuple[int, int]] = []
+        self._sequence = itertools.count()
+
+        self.granted = 0
+        self.timed_out = 0
+        self.total_wait = 0.0
+
+    def acquire(self, tokens: float, priority: int = PRIORITY_INTERACTIVE, timeout: Optional[float] = None) -> bool:
+        """
+        等待一次请求和 tokens 个token的配额
+
+        Args:
+            tokens: 预计消耗的token数
+            priority: 优先级，数值越小越优先
+            timeout: 最长等待秒数，None表示一直等待
+
+        Returns:
+            是否获得配额（False表示排队超时）
+        """
+        start = time.monotonic()
+        deadline = None if timeout is None else start + timeout
+        entry = (priority, next(self._sequence))
+
+        with self._cond:
+            heapq.heappush(self._waiters, entry)
+            try:
+                while True:
+                    wait = None
+                    if self._waiters[0] == entry:
+                        wait = self.buckets.try_acquire(1, tokens)
+                        if wait == 0:
+                            self.granted += 1
+                            self.total_wait += time.monotonic() - start
+                            return True
+
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.timed_out += 1
+                            return False
+                        wait = remaining if wait is None else min(wait, remaining)
+                    self._cond.wait(wait)
+            finally:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+
+    def adjust(self, delta_tokens: float):
+        """按实际消耗修正token配额"""
+        self.buckets.adjust_tokens(delta_tokens)
+
+    def backoff(self):
+        """服务商返回限流错误后清空配额，等待令牌重新积累"""
+        self.buckets.drain()
+
+    def statistics(self) -> Dict[str, int]:
+        """限流统计"""
+        return {
+            "rate_limit_granted": self.granted,
+            "rate_limit_timed_out": self.timed_out,
+            "rate_limit_queued": len(self._waiters),
+            "rate_limit_avg_wait_ms": int(self.total_wait / self.granted * 1000) if self.granted else 0,
+        }
+
+class _Call:
+    """一次正在进行的调用"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+class SingleFlight:
+    """合并相同键的并发调用：同一时刻每个键只执行一次，等待中的调用方共享结果（或异常）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.executed = 0
+        self.shared = 0
+
+    def do(self, key: Hashable, func: Callable[[], Any]) -> Tuple[Any, bool]:
+        """执行或加入调用，返回 (结果, 是否共享了其他调用方的结果)"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+_rate_limiter: Optional[RateLimiter] = None
+_rate_limiter_lock = threading.Lock()
+
+def get_rate_limiter() -> RateLimiter:
+    """进程内共享的补全API限流器（按配置创建）"""
+    global _rate_limiter
+    if _rate_limiter is None:
+        with _rate_limiter_lock:
+            if _rate_limiter is None:
+                _rate_limiter = RateLimiter(
+                    Config.OPENAI_REQUESTS_PER_MINUTE,
+                    Config.OPENAI_TOKENS_PER_MINUTE,
+                    Config.OPENAI_RATE_LIMIT_FILE,
+                )
+    return _rate_limiter
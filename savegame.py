@@ -0,0 +1,425 @@
+"""
+游戏存档
+把一局游戏（状态、逐年历史、随机数流、成绩统计）编码成紧凑的二进制存档，读取后可以逐位继续这局游戏。
+
+存档 = 4字节魔数 + msgpack 编码的数组，数组第一项是存档版本：
+  - 所有重复出现的字符串（城市ID、运输方式、能源来源、新闻类型、字段名）只在字符串表中出现一次，其余位置存序号
+  - 城市按列存储，幸福度/CO2等小整数在 msgpack 中只占一个字节
+  - 历史数据和随机数状态直接存成定长整数的字节串
+有 msgpack 时使用 msgpack，否则使用内置的 msgpack 子集实现（两者的输出相同，存档可以互通）。
+
+旧版本存档读取时依次经过 MIGRATIONS 升级到当前版本；
+版本1是直接导出的 GameState JSON（GameState.model_dump()），读取时同样自动转换。
+"""
+
+import json
+import random
+import struct
+from typing import Dict, List, Optional
+
+from history import GameHistory
+from models import City, GameState, RoundChanges
+
+try:
+    import msgpack
+    msgpack_available = True
+except ImportError:
+    msgpack_available = False
+
+MAGIC = b"SGSV"
+SAVE_VERSION = 2
+MEDIA_TYPE = "application/x-msgpack"
+
+# 金钱和年份写入历史缓冲区的 64 位整数数组，幸福度/CO2写入单字节数组
+_INT64_MIN, _INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+class SaveFormatError(ValueError):
+    """存档内容无效或版本不受支持"""
+
+# ===== msgpack 子集（没有安装 msgpack 时使用） =====
+
+def _pack(obj, out: bytearray):
+    """按 msgpack 规范编码 None/bool/int/float/str/bytes/list/tuple/dict"""
+    if obj is None:
+        out.append(0xc0)
+    elif obj is True:
+        out.append(0xc3)
+    elif obj is False:
+        out.append(0xc2)
+    elif isinstance(obj, int):
+        if 0 <= obj < 0x80:
+            out.append(obj)
+        elif -32 <= obj < 0:
+            out.append(obj & 0xff)
+        elif 0 <= obj <= 0xff:
+            out += struct.pack(">BB", 0xcc, obj)
+        elif 0 <= obj <= 0xffff:
+            out += struct.pack(">BH", 0xcd, obj)
+        elif 0 <= obj <= 0xffffffff:
+            out += struct.pack(">BI", 0xce, obj)
+        elif obj > 0:
+            out += struct.pack(">BQ", 0xcf, obj)
+        elif obj >= -0x80:
+            out += struct.pack(">Bb", 0xd0, obj)
+        elif obj >= -0x8000:
+            out += struct.pack(">Bh", 0xd1, obj)
+        elif obj >= -0x80000000:
+            out += struct.pack(">Bi", 0xd2, obj)
+        else:
+            out += struct.pack(">Bq", 0xd3, obj)
+    elif isinstance(obj, float):
+        out += struct.pack(">Bd", 0xcb, obj)
+    elif isinstance(obj, str):
+        data = obj.encode("utf-8")
+        size = len(data)
+        if size < 32:
+            out.append(0xa0 | size)
+        elif size <= 0xff:
+            out += struct.pack(">BB", 0xd9, size)
+        elif size <= 0xffff:
+            out += struct.pack(">BH", 0xda, size)
+        else:
+            out += struct.pack(">BI", 0xdb, size)
+        out += data
+    elif isinstance(obj, (bytes, bytearray)):
+        size = len(obj)
+        if size <= 0xff:
+            out += struct.pack(">BB", 0xc4, size)
+        elif size <= 0xffff:
+            out += struct.pack(">BH", 0xc5, size)
+        else:
+            out += struct.pack(">BI", 0xc6, size)
+        out += obj
+    elif isinstance(obj, (list, tuple)):
+        size = len(obj)
+        if size < 16:
+            out.append(0x90 | size)
+        elif size <= 0xffff:
+            out += struct.pack(">BH", 0xdc, size)
+        else:
+            out += struct.pack(">BI", 0xdd, size)
+        for item in obj:
+            _pack(item, out)
+    elif isinstance(obj, dict):
+        size = len(obj)
+        if size < 16:
+            out.append(0x80 | size)
+        elif size <= 0xffff:
+            out += struct.pack(">BH", 0xde, size)
+        else:
+            out += struct.pack(">BI", 0xdf, size)
+        for key, value in obj.items():
+            _pack(key, out)
+            _pack(value, out)
+    else:
+        raise TypeError(f"Object of type {type(obj).__name__} is not msgpack serializable")
+
+# 定长类型: 类型字节 -> struct 格式
+_FIXED = {
+    0xcc: ">B", 0xcd: ">H", 0xce: ">I", 0xcf: ">Q",
+    0xd0: ">b", 0xd1: ">h", 0xd2: ">i", 0xd3: ">q",
+    0xca: ">f", 0xcb: ">d",
+}
+# 变长类型: 类型字节 -> (长度的 struct 格式, 种类)
+_SIZED = {
+    0xd9: (">B", "str"), 0xda: (">H", "str"), 0xdb: (">I", "str"),
+    0xc4: (">B", "bin"), 0xc5: (">H", "bin"), 0xc6: (">I", "bin"),
+    0xdc: (">H", "array"), 0xdd: (">I", "array"),
+    0xde: (">H", "map"), 0xdf: (">I", "map"),
+}
+
+def _unpack(data: bytes, offset: int):
+    """解码 offset 处的一个值，返回 (值, 新的offset)"""
+    code = data[offset]
+    offset += 1
+    if code < 0x80:
+        return code, offset
+    if code >= 0xe0:
+        return code - 0x100, offset
+    if code == 0xc0:
+        return None, offset
+    if code == 0xc2:
+        return False, offset
+    if code == 0xc3:
+        return True, offset
+    if code in _FIXED:
+        fmt = _FIXED[code]
+        return struct.unpack_from(fmt, data, offset)[0], offset + struct.calcsize(fmt)
+    if 0xa0 <= code <= 0xbf:
+        kind, size = "str", code & 0x1f
+    elif 0x90 <= code <= 0x9f:
+        kind, size = "array", code & 0x0f
+    elif 0x80 <= code <= 0x8f:
+        kind, size = "map", code & 0x0f
+    elif code in _SIZED:
+        fmt, kind = _SIZED[code]
+        size = struct.unpack_from(fmt, data, offset)[0]
+        offset += struct.calcsize(fmt)
+    else:
+        raise SaveFormatError(f"不支持的 msgpack 类型: 0x{code:02x}")
+
+    if kind in ("str", "bin"):
+        end = offset + size
+        if end > len(data):
+            raise SaveFormatError("存档数据不完整")
+        chunk = data[offset:end]
+        return (chunk.decode("utf-8") if kind == "str" else bytes(chunk)), end
+    if kind == "array":
+        items = []
+        for _ in range(size):
+            item, offset = _unpack(data, offset)
+            items.append(item)
+        return items, offset
+    result = {}
+    for _ in range(size):
+        key, offset = _unpack(data, offset)
+        result[key], offset = _unpack(data, offset)
+    return result, offset
+
+def packb(obj) -> bytes:
+    if msgpack_available:
+        return msgpack.packb(obj, use_bin_type=True)
+    out = bytearray()
+    _pack(obj, out)
+    return bytes(out)
+
+def unpackb(data: bytes):
+    if msgpack_available:
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
+    value, offset = _unpack(data, 0)
+    if offset != len(data):
+        raise SaveFormatError("存档末尾有多余数据")
+    return value
+
+# ===== 编码 =====
+
+class _StringTable:
+    """字符串表：每个字符串只保存一次，其余位置存序号"""
+
+    def __init__(self):
+        self.strings: List[str] = []
+        self._index: Dict[str, int] = {}
+
+    def __call__(self, value: str) -> int:
+        index = self._index.get(value)
+        if index is None:
+            index = self._index[value] = len(self.strings)
+            self.strings.append(value)
+        return index
+
+def _pack_ints(fmt: str, values: List[int]) -> bytes:
+    return struct.pack(f"<{len(values)}{fmt}", *values)
+
+def _unpack_ints(fmt: str, data: bytes) -> List[int]:
+    return list(struct.unpack(f"<{len(data) // struct.calcsize(fmt)}{fmt}", data))
+
+class SavedGame:
+    """读取出的存档"""
+
+    __slots__ = ("state", "history", "rng_state", "stats")
+
+    def __init__(self, state: GameState, history: Optional[Dict] = None, rng_state: Optional[tuple] = None,
+                 stats: Optional[Dict] = None):
+        self.state = state
+        # 逐年历史：{"years", "money", "happiness": {城市ID: bytes}, "co2": {城市ID: bytes}}，None表示存档中没有
+        self.history = history
+        # random.Random.getstate() 的返回值，None表示存档中没有
+        self.rng_state = rng_state
+        # 会话的成绩统计等附带数据
+        self.stats = stats or {}
+
+    def build_history(self, capacity: int) -> GameHistory:
+        """按存档中的数据重建历史缓冲区（容量小于存档记录数时只保留最近的记录）"""
+        history = GameHistory(self.state.cities, capacity)
+        if self.history is not None:
+            history.years.fill(self.history["years"])
+            history.money.fill(self.history["money"])
+            for column in ("happiness", "co2"):
+                buffers = getattr(history, column)
+                for city_id, values in self.history[column].items():
+                    buffers[city_id].fill(values)
+        return history
+
+def dump_game(state: GameState, history: Optional[GameHistory] = None, rng: Optional[random.Random] = None,
+              stats: Optional[Dict] = None) -> bytes:
+    """
+    把一局游戏编码为二进制存档
+
+    Args:
+        history: 逐年历史数据
+        rng: 本局的随机数生成器（保存其状态，读取后随机数流从同一位置继续）
+        stats: 附带数据（只能包含 None/bool/int/float/str/bytes/list/dict）
+    """
+    return MAGIC + packb(_encode(state, history, rng, stats))
+
+def _encode(state: GameState, history: Optional[GameHistory], rng: Optional[random.Random], stats: Optional[Dict]) -> List:
+    """游戏 -> 当前版本的存档数组"""
+    intern = _StringTable()
+    cities = state.cities
+    city_ids = list(cities)
+    city_list = list(cities.values())
+
+    city_columns = [
+        [intern(city_id) for city_id in city_ids],
+        [intern(city.name) for city in city_list],
+        [city.happiness for city in city_list],
+        [city.co2 for city in city_list],
+        [intern(city.transportation) for city in city_list],
+        [intern(city.energy_source) for city in city_list],
+        [city.eliminated for city in city_list],
+        [[item for key, value in city.position.items() for item in (intern(key), value)] for city in city_list],
+    ]
+
+    changes = state.current_round_changes
+    change_columns = [
+        [item for city_id, value in changes.transportation.items() for item in (intern(city_id), intern(value))],
+        [item for city_id, value in changes.energy_source.items() for item in (intern(city_id), intern(value))],
+        [
+            item
+            for city_id, effects in changes.projected_effects.items()
+            for item in (intern(city_id), [part for key, value in effects.items() for part in (intern(key), value)])
+        ],
+    ]
+
+    last_news = None
+    if state.last_news is not None:
+        news = dict(state.last_news)
+        news_type = news.pop("type", None)
+        last_news = [None if news_type is None else intern(news_type), news]
+
+    history_columns = None
+    if history is not None:
+        history_columns = [
+            _pack_ints("q", history.years.values()),
+            _pack_ints("q", history.money.values()),
+            [[intern(city_id), bytes(buffer.values())] for city_id, buffer in history.happiness.items()],
+            [[intern(city_id), bytes(buffer.values())] for city_id, buffer in history.co2.items()],
+        ]
+
+    rng_columns = None
+    if rng is not None:
+        version, internal, gauss_next = rng.getstate()
+        rng_columns = [version, _pack_ints("I", list(internal)), gauss_next]
+
+    return [
+        SAVE_VERSION,
+        intern.strings,
+        [state.money, state.year, state.game_over, state.seed],
+        city_columns,
+        change_columns,
+        last_news,
+        history_columns,
+        rng_columns,
+        stats or {},
+    ]
+
+def _check_range(name: str, value, low: int, high: int):
+    """检查存档中的整数是否在有效范围内"""
+    if not isinstance(value, int) or isinstance(value, bool) or not low <= value <= high:
+        raise SaveFormatError(f"{name} 超出范围: {value!r}")
+
+def _check_state(state: GameState):
+    """检查状态中的数值范围（超出范围的值无法写入历史缓冲区，也不可能出现在正常游戏中）"""
+    _check_range("money", state.money, _INT64_MIN, _INT64_MAX)
+    _check_range("year", state.year, 1, _INT64_MAX)
+    for city_id, city in state.cities.items():
+        _check_range(f"{city_id}.happiness", city.happiness, 0, 100)
+        _check_range(f"{city_id}.co2", city.co2, 0, 100)
+
+def _pairs(flat: List, strings: List[str]):
+    """[键序号, 值, 键序号, 值, ...] -> (键, 值) 序列"""
+    return zip((strings[index] for index in flat[0::2]), flat[1::2])
+
+def _decode_v2(payload: List) -> SavedGame:
+    """当前版本的存档数组 -> SavedGame"""
+    _, strings, game, city_columns, change_columns, last_news, history_columns, rng_columns, stats = payload
+    money, year, game_over, seed = game
+
+    ids, names, happiness, co2, transportation, energy_source, eliminated, positions = city_columns
+    # 存档数据来自客户端，城市和状态都经过模型校验
+    cities = {
+        strings[ids[i]]: City(
+            name=strings[names[i]],
+            happiness=happiness[i],
+            co2=co2[i],
+            transportation=strings[transportation[i]],
+            energy_source=strings[energy_source[i]],
+            eliminated=eliminated[i],
+            position=dict(_pairs(positions[i], strings)),
+        )
+        for i in range(len(ids))
+    }
+
+    transport_changes, energy_changes, projected = change_columns
+    changes = RoundChanges(
+        transportation={city_id: strings[value] for city_id, value in _pairs(transport_changes, strings)},
+        energy_source={city_id: strings[value] for city_id, value in _pairs(energy_changes, strings)},
+        projected_effects={city_id: dict(_pairs(effects, strings)) for city_id, effects in _pairs(projected, strings)},
+    )
+
+    state = GameState(money=money, cities=cities, game_over=game_over, year=year, current_round_changes=changes, seed=seed)
+    _check_state(state)
+    if last_news is not None:
+        news_type, news = last_news
+        state.last_news = news if news_type is None else {"type": strings[news_type], **news}
+
+    history = None
+    if history_columns is not None:
+        years, money_values, happiness_columns, co2_columns = history_columns
+        history = {
+            "years": _unpack_ints("q", years),
+            "money": _unpack_ints("q", money_values),
+            "happiness": {strings[city_id]: bytes(values) for city_id, values in happiness_columns},
+            "co2": {strings[city_id]: bytes(values) for city_id, values in co2_columns},
+        }
+        if set(history["happiness"]) != set(cities) or set(history["co2"]) != set(cities):
+            raise SaveFormatError("历史数据与城市不一致")
+        for column in ("happiness", "co2"):
+            for city_id, values in history[column].items():
+                if values and max(values) > 100:
+                    raise SaveFormatError(f"{city_id}.{column} 历史数据超出范围")
+
+    rng_state = None
+    if rng_columns is not None:
+        version, internal, gauss_next = rng_columns
+        rng_state = (version, tuple(_unpack_ints("I", internal)), gauss_next)
+        # 检查状态是否有效（长度、版本）
+        random.Random().setstate(rng_state)
+
+    return SavedGame(state, history, rng_state, stats)
+
+def _migrate_v1(document: Dict) -> List:
+    """版本1（GameState JSON）-> 版本2：没有历史和随机数状态"""
+    return _encode(GameState.model_validate(document), None, None, None)
+
+# 存档升级: 旧版本号 -> 把该版本的内容转换为下一版本
+MIGRATIONS = {
+    1: _migrate_v1,
+}
+
+def load_game(data: bytes) -> SavedGame:
+    """读取二进制存档（或版本1的JSON存档），旧版本自动升级"""
+    try:
+        if data.startswith(MAGIC):
+            payload = unpackb(data[len(MAGIC):])
+            version = payload[0]
+        elif data.lstrip()[:1] == b"{":
+            payload = json.loads(data)
+            version = payload.pop("save_version", 1)
+        else:
+            raise SaveFormatError("不是游戏存档")
+
+        if not isinstance(version, int) or version > SAVE_VERSION:
+            raise SaveFormatError(f"不支持的存档版本: {version!r}")
+        while version < SAVE_VERSION:
+            migrate = MIGRATIONS.get(version)
+            if migrate is None:
+                raise SaveFormatError(f"不支持的存档版本: {version!r}")
+            payload = migrate(payload)
+            version += 1
+        return _decode_v2(payload)
+    except SaveFormatError:
+        raise
+    except Exception as e:
+        # 截断、字段缺失、类型错误和模型校验失败都视为存档无效
+        raise SaveFormatError(f"存档无效: {e}") from e
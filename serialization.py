@@ -0,0 +1,119 @@
+"""
+快速JSON序列化工具
+游戏接口直接返回 FastJSONResponse，跳过 FastAPI 默认的 jsonable_encoder 遍历；
+有 orjson 时使用 orjson 编码，否则回退到标准库 json。
+"""
+
+import gzip
+import hashlib
+import json
+from typing import Any, Optional
+
+from pydantic import BaseModel
+from starlette.responses import Response
+
+from profiling import hot_path
+
+try:
+    import orjson
+    orjson_available = True
+except ImportError:
+    orjson_available = False
+
+def _default(obj: Any) -> Any:
+    """处理 orjson/json 无法直接编码的对象"""
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+@hot_path("serialize")
+def dumps(content: Any) -> bytes:
+    """将内容（可包含Pydantic模型）编码为JSON字节串"""
+    if orjson_available:
+        return orjson.dumps(content, default=_default)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def make_etag(body: bytes) -> str:
+    """根据内容生成强ETag"""
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """判断请求头 If-None-Match 是否命中给定ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    # 弱比较：忽略 W/ 前缀
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+def accepts_encoding(accept_encoding: Optional[str], coding: str = "gzip") -> bool:
+    """
+    判断请求头 Accept-Encoding 是否接受给定的内容编码
+    按 q 值协商：q=0 表示拒绝；没有单独列出时按 * 的 q 值；请求头不存在或没有列出都视为不接受
+    """
+    if not accept_encoding:
+        return False
+    wildcard = None
+    for item in accept_encoding.split(","):
+        name, _, params = item.partition(";")
+        name = name.strip().lower()
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name == coding:
+            return quality > 0
+        if name == "*":
+            wildcard = quality
+    return wildcard is not None and wildcard > 0
+
+class FastJSONResponse(Response):
+    """直接编码内容的JSON响应，不经过 jsonable_encoder"""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+class EncodedPayload:
+    """预先编码好的静态内容，连同ETag一起缓存"""
+
+    def __init__(self, content: Any, etag: Optional[str] = None, compress_min_size: Optional[int] = None):
+        """
+        Args:
+            etag: 指定ETag（如版本号），默认根据内容计算
+            compress_min_size: 内容达到该字节数时同时缓存一份gzip压缩结果，None表示不压缩
+        """
+        self.body = dumps(content)
+        self.etag = etag or make_etag(self.body)
+        self.gzip_body: Optional[bytes] = None
+        self.gzip_etag = ""
+        if compress_min_size is not None and len(self.body) >= compress_min_size:
+            self.gzip_body = gzip.compress(self.body, compresslevel=5, mtime=0)
+            self.gzip_etag = self.etag[:-1] + '-gz"'
+
+    def not_modified(self, if_none_match: Optional[str]) -> bool:
+        """客户端缓存的（原始或压缩）版本是否仍然有效"""
+        return etag_matches(if_none_match, self.etag) or (
+            self.gzip_body is not None and etag_matches(if_none_match, self.gzip_etag)
+        )
+
+    def response(self, if_none_match: Optional[str] = None, cache_control: str = "no-cache",
+                 accept_encoding: Optional[str] = None) -> Response:
+        """生成响应；客户端ETag命中时返回304，客户端接受gzip时返回压缩内容"""
+        headers = {"ETag": self.etag, "Cache-Control": cache_control}
+        if self.gzip_body is not None:
+            headers["Vary"] = "Accept-Encoding"
+        if self.not_modified(if_none_match):
+            return Response(status_code=304, headers=headers)
+        if self.gzip_body is not None and accepts_encoding(accept_encoding):
+            headers["ETag"] = self.gzip_etag
+            headers["Content-Encoding"] = "gzip"
+            return Response(content=self.gzip_body, media_type="application/json", headers=headers)
+        return Response(content=self.body, media_type="application/json", headers=headers)
@@ -0,0 +1,156 @@
+"""
+游戏状态快照
+快照是不可变的：每个城市保存为一个元组记录，城市记录按固定顺序分块存放。
+生成新快照时与上一个快照逐城市比较，没有变化的城市记录、以及整块都没有变化的分块直接复用，
+相邻快照之间共享大部分数据，新增内存只与发生变化的城市数量成正比。
+用于撤销/重做以及“如果这样选会怎样”的分支预览。
+"""
+
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from models import City, GameState, RoundChanges
+
+CHUNK_SIZE = 32
+
+# 城市记录: (名称, 幸福度, CO2, 运输方式, 能源来源, 是否淘汰, 位置)
+CityRecord = Tuple[str, int, int, str, str, bool, Dict[str, int]]
+_CITY_FIELDS = tuple(City.model_fields)
+
+def _city_record(city: City, previous: Optional[CityRecord]) -> CityRecord:
+    """城市的不可变记录；与上一个记录相同时直接复用"""
+    # 字段按模型定义的顺序直接从实例字典读取，比逐个访问属性快
+    record = tuple(city.__dict__.values())
+    if previous is None:
+        return record[:6] + (dict(record[6]),)
+    if record == previous:
+        return previous
+    # 位置在游戏中不会改变，与上一个记录共享同一个字典
+    return record[:6] + (previous[6] if previous[6] == record[6] else dict(record[6]),)
+
+class Snapshot:
+    """某一时刻的不可变游戏状态（以及会话的附加数据）"""
+
+    __slots__ = ("city_ids", "chunks", "money", "year", "game_over", "seed", "last_news", "changes", "extra")
+
+    def __init__(self, city_ids, chunks, money, year, game_over, seed, last_news, changes, extra):
+        self.city_ids = city_ids
+        self.chunks = chunks
+        self.money = money
+        self.year = year
+        self.game_over = game_over
+        self.seed = seed
+        self.last_news = last_news
+        self.changes = changes
+        self.extra = extra
+
+    def records(self):
+        """按顺序遍历所有城市记录"""
+        for chunk in self.chunks:
+            yield from chunk
+
+def take_snapshot(state: GameState, previous: Optional[Snapshot] = None, extra: Optional[Dict] = None) -> Snapshot:
+    """
+    为游戏状态生成快照
+
+    Args:
+        state: 当前游戏状态
+        previous: 上一个快照，城市集合相同时与它共享没有变化的城市记录和分块
+        extra: 需要一起保存的附加数据（调用方保证不会再修改）
+    """
+    city_ids = tuple(state.cities)
+    if previous is not None and previous.city_ids == city_ids:
+        city_ids = previous.city_ids
+        previous_chunks = previous.chunks
+    else:
+        previous_chunks = None
+
+    cities = state.cities
+    chunks = []
+    for index, start in enumerate(range(0, len(city_ids), CHUNK_SIZE)):
+        old_chunk = previous_chunks[index] if previous_chunks is not None else None
+        new_chunk = tuple(
+            _city_record(cities[city_id], old_chunk[offset] if old_chunk is not None else None)
+            for offset, city_id in enumerate(city_ids[start:start + CHUNK_SIZE])
+        )
+        # 整块都没有变化时复用旧分块
+        if old_chunk is not None and all(new is old for new, old in zip(new_chunk, old_chunk)):
+            new_chunk = old_chunk
+        chunks.append(new_chunk)
+
+    changes = state.current_round_changes
+    frozen_changes = (
+        dict(changes.transportation),
+        dict(changes.energy_source),
+        {city_id: dict(effects) for city_id, effects in changes.projected_effects.items()},
+    )
+    return Snapshot(
+        city_ids, tuple(chunks), state.money, state.year, state.game_over, state.seed,
+        state.last_news, frozen_changes, extra or {},
+    )
+
+def restore_snapshot(snapshot: Snapshot) -> GameState:
+    """从快照重建一个独立的（可修改的）游戏状态（快照中的数据来自已校验的状态，重建时跳过校验）"""
+    cities = {}
+    for city_id, record in zip(snapshot.city_ids, snapshot.records()):
+        # 记录的字段顺序就是模型的字段顺序
+        data = dict(zip(_CITY_FIELDS, record))
+        data["position"] = dict(record[6])
+        cities[city_id] = City.trusted_from_dict(data)
+    transportation, energy_source, projected_effects = snapshot.changes
+    return GameState.trusted(
+        money=snapshot.money,
+        cities=cities,
+        game_over=snapshot.game_over,
+        year=snapshot.year,
+        current_round_changes=RoundChanges.trusted(
+            transportation=dict(transportation),
+            energy_source=dict(energy_source),
+            projected_effects={city_id: dict(effects) for city_id, effects in projected_effects.items()},
+        ),
+        seed=snapshot.seed,
+        # 新闻字典创建后不会再被修改，直接共享
+        last_news=snapshot.last_news,
+    )
+
+class SnapshotHistory:
+    """撤销/重做栈：最多保留最近 limit 个快照"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._undo: "deque[Snapshot]" = deque(maxlen=limit)
+        self._redo: List[Snapshot] = []
+
+    @property
+    def latest(self) -> Optional[Snapshot]:
+        """最近保存的快照（用于和下一个快照共享数据）"""
+        return self._undo[-1] if self._undo else None
+
+    @property
+    def can_undo(self) -> bool:
+        return bool(self._undo)
+
+    @property
+    def can_redo(self) -> bool:
+        return bool(self._redo)
+
+    def push(self, snapshot: Snapshot):
+        """保存一个新版本；产生新的分支后不能再重做旧分支"""
+        if self.limit <= 0:
+            return
+        self._undo.append(snapshot)
+        self._redo.clear()
+
+    def undo(self, current: Snapshot) -> Optional[Snapshot]:
+        """返回上一个版本，当前版本移入重做栈"""
+        if not self._undo:
+            return None
+        self._redo.append(current)
+        return self._undo.pop()
+
+    def redo(self, current: Snapshot) -> Optional[Snapshot]:
+        """返回撤销前的版本，当前版本移回撤销栈"""
+        if not self._redo:
+            return None
+        self._undo.append(current)
+        return self._redo.pop()
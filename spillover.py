@@ -0,0 +1,163 @@
+"""
+城市间的区域外溢
+位置相近的城市之间，幸福度和CO2每回合按差值部分扩散（类似热传导）：
+相邻关系按城市位置用网格分桶一次性建好，存成CSR格式的稀疏矩阵，
+每回合的计算是一次稀疏矩阵乘向量，耗时与相邻城市对的数量成正比，而不是城市数的平方。
+
+权重随距离线性衰减，并按两端城市权重和中较大的一方归一化：
+矩阵对称（外溢只在城市之间转移，不凭空产生），每个城市流出的比例不超过 rate，扩散不会振荡。
+变化量取整时保持总和为0，存活城市的幸福度/CO2总量在外溢前后不变。
+"""
+
+import math
+from array import array
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+def _clamp(value: int) -> int:
+    return max(0, min(100, value))
+
+def _round_conserving(flows: List[float]) -> List[int]:
+    """
+    把总和为0的实数变化量取整，保证取整后的总和仍为0（最大余数法）：
+    先全部向下取整，差额逐个补给小数部分最大的城市。
+    各城市分别四舍五入时流出和流入的量对不上，总量每回合都会漂移。
+    """
+    floors = [math.floor(flow) for flow in flows]
+    shortfall = -sum(floors)
+    if shortfall > 0:
+        order = sorted(range(len(flows)), key=lambda index: flows[index] - floors[index], reverse=True)
+        for index in order[:shortfall]:
+            floors[index] += 1
+    return floors
+
+class SpilloverNetwork:
+    """一局游戏的城市相邻关系（城市位置在游戏中不变，开局时构建一次）"""
+
+    def __init__(self, cities: Dict, radius: float, rate: float):
+        """
+        Args:
+            cities: 城市ID -> 城市（使用 position 的 x / y）
+            radius: 相邻距离，超过该距离的城市之间没有外溢
+            rate: 每回合扩散的比例 (0-1)
+        """
+        self.radius = radius
+        self.rate = rate
+        self.city_ids: List[str] = list(cities)
+        positions = [(city.position.get("x", 0), city.position.get("y", 0)) for city in cities.values()]
+        edges = self._find_edges(positions, radius)
+        self.indptr, self.indices, self.weights = self._build_csr(len(positions), edges)
+
+    @staticmethod
+    def _find_edges(positions: List[Tuple[int, int]], radius: float) -> List[Tuple[int, int, float]]:
+        """网格分桶查找距离不超过 radius 的城市对，返回 (i, j, 原始权重)，每对只出现一次"""
+        if radius <= 0:
+            return []
+        grid: Dict[Tuple[int, int], List[int]] = {}
+        for index, (x, y) in enumerate(positions):
+            grid.setdefault((int(x // radius), int(y // radius)), []).append(index)
+
+        edges = []
+        for (cell_x, cell_y), members in grid.items():
+            # 只检查自身和“右/下方向”的相邻格子，每对城市只比较一次
+            for dx, dy in ((0, 0), (1, -1), (1, 0), (1, 1), (0, 1)):
+                others = grid.get((cell_x + dx, cell_y + dy))
+                if not others:
+                    continue
+                same_cell = dx == 0 and dy == 0
+                for a_pos, i in enumerate(members):
+                    xi, yi = positions[i]
+                    for j in (members[a_pos + 1:] if same_cell else others):
+                        distance = math.hypot(positions[j][0] - xi, positions[j][1] - yi)
+                        if distance <= radius:
+                            edges.append((i, j, 1.0 - distance / radius))
+        return edges
+
+    @staticmethod
+    def _build_csr(count: int, edges: List[Tuple[int, int, float]]):
+        """把无向边转成对称归一化的CSR矩阵 (indptr, indices, weights)"""
+        row_sums = [0.0] * count
+        for i, j, weight in edges:
+            row_sums[i] += weight
+            row_sums[j] += weight
+
+        rows: List[List[Tuple[int, float]]] = [[] for _ in range(count)]
+        for i, j, weight in edges:
+            if weight <= 0:
+                continue
+            normalized = weight / max(row_sums[i], row_sums[j])
+            rows[i].append((j, normalized))
+            rows[j].append((i, normalized))
+
+        indptr = array("l", [0])
+        indices = array("l")
+        weights = array("d")
+        for row in rows:
+            for j, weight in row:
+                indices.append(j)
+                weights.append(weight)
+            indptr.append(len(indices))
+        return indptr, indices, weights
+
+    @property
+    def edge_count(self) -> int:
+        """相邻城市对的数量"""
+        return len(self.indices) // 2
+
+    def apply(self, state):
+        """按当前数值计算一回合的外溢并写回城市；已淘汰的城市不参与"""
+        if self.rate <= 0 or not len(self.indices):
+            return
+        cities = [state.cities[city_id] for city_id in self.city_ids]
+        happiness_deltas, co2_deltas = self.deltas(
+            [city.happiness for city in cities],
+            [city.co2 for city in cities],
+            [not city.eliminated for city in cities],
+        )
+        for city, happiness_delta, co2_delta in zip(cities, happiness_deltas, co2_deltas):
+            if happiness_delta or co2_delta:
+                city.happiness = _clamp(city.happiness + happiness_delta)
+                city.co2 = _clamp(city.co2 + co2_delta)
+
+    def deltas(self, happiness: Sequence[int], co2: Sequence[int], alive: Sequence[bool]) -> Tuple[List[int], List[int]]:
+        """
+        按 city_ids 顺序的数值计算一回合外溢的变化量（不修改任何对象，策略顾问的搜索也使用）
+
+        Returns:
+            (幸福度变化, CO2变化)，按 city_ids 顺序；已淘汰城市的变化为0
+        """
+        count = len(self.city_ids)
+        happiness_deltas = [0] * count
+        co2_deltas = [0] * count
+        if self.rate <= 0 or not len(self.indices):
+            return happiness_deltas, co2_deltas
+        indptr, indices, weights, rate = self.indptr, self.indices, self.weights, self.rate
+
+        # 所有变化量都按本回合开始时的数值计算，结果与城市顺序无关
+        alive_indices = []
+        happiness_flows = []
+        co2_flows = []
+        for i in range(count):
+            if not alive[i]:
+                continue
+            happiness_i, co2_i = happiness[i], co2[i]
+            happiness_flow = co2_flow = 0.0
+            for k in range(indptr[i], indptr[i + 1]):
+                j = indices[k]
+                if alive[j]:
+                    weight = weights[k]
+                    happiness_flow += weight * (happiness[j] - happiness_i)
+                    co2_flow += weight * (co2[j] - co2_i)
+            alive_indices.append(i)
+            happiness_flows.append(rate * happiness_flow)
+            co2_flows.append(rate * co2_flow)
+
+        for i, happiness_delta, co2_delta in zip(alive_indices, _round_conserving(happiness_flows), _round_conserving(co2_flows)):
+            happiness_deltas[i] = happiness_delta
+            co2_deltas[i] = co2_delta
+        return happiness_deltas, co2_deltas
+
+    def neighbours(self, city_id: str) -> Iterable[Tuple[str, float]]:
+        """某个城市的相邻城市及权重"""
+        i = self.city_ids.index(city_id)
+        for k in range(self.indptr[i], self.indptr[i + 1]):
+            yield self.city_ids[self.indices[k]], self.weights[k]
@@ -0,0 +1,225 @@
+"""
+静态资源服务
+由应用自身提供 game_interface.html 和背景视频：
+- 支持 HTTP Range（单区间），切换视频时浏览器只需按字节区间读取
+- 服务器支持 ASGI zerocopysend 扩展时使用零拷贝 sendfile，否则分块读取
+- 基于内容的强ETag + Last-Modified，支持 304 与 If-Range
+- HTML 启动后预先 gzip 压缩，按 Accept-Encoding（含 q 值）协商返回
+- 缓存策略：HTML 路径不带版本号，使用 no-cache + ETag，每次重新验证，部署后刷新页面即可看到新版本；
+  只有背景视频使用长期缓存
+"""
+
+import gzip
+import hashlib
+import os
+import re
+import threading
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+
+import anyio
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from serialization import accepts_encoding, etag_matches
+
+CHUNK_SIZE = 64 * 1024
+_RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+class StaticAsset:
+    """单个静态文件的元数据（大小、修改时间、ETag），文件变化时自动刷新"""
+
+    def __init__(self, path: str, media_type: str, cache_control: str, precompress: bool = False):
+        self.path = path
+        self.media_type = media_type
+        self.cache_control = cache_control
+        self.precompress = precompress
+        self._lock = threading.Lock()
+        self._signature = None
+        self.size = 0
+        self.etag = ""
+        self.last_modified = ""
+        self.mtime = 0.0
+        self.gzip_body: Optional[bytes] = None
+        self.gzip_etag = ""
+
+    def refresh(self):
+        """文件的 (大小, 修改时间) 变化时重新计算ETag和压缩内容"""
+        stat = os.stat(self.path)
+        signature = (stat.st_size, stat.st_mtime_ns)
+        if signature == self._signature:
+            return
+
+        with self._lock:
+            if signature == self._signature:
+                return
+
+            digest = hashlib.sha256()
+            with open(self.path, "rb") as f:
+                content = f.read() if self.precompress else None
+                if content is not None:
+                    digest.update(content)
+                else:
+                    for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                        digest.update(chunk)
+
+            self.size = stat.st_size
+            self.mtime = stat.st_mtime
+            self.etag = '"' + digest.hexdigest()[:32] + '"'
+            self.last_modified = formatdate(stat.st_mtime, usegmt=True)
+            if content is not None:
+                self.gzip_body = gzip.compress(content, compresslevel=9, mtime=0)
+                self.gzip_etag = self.etag[:-1] + '-gz"'
+            self._signature = signature
+
+    def not_modified(self, headers) -> bool:
+        """根据条件请求头判断客户端缓存是否仍然有效"""
+        if_none_match = headers.get("if-none-match")
+        if if_none_match is not None:
+            return etag_matches(if_none_match, self.etag) or (
+                self.gzip_body is not None and etag_matches(if_none_match, self.gzip_etag)
+            )
+
+        if_modified_since = headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                return int(self.mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def response(self, headers, method: str = "GET") -> Response:
+        """生成该资源的响应（304 / 206 / 200 / 416）"""
+        self.refresh()
+
+        base_headers = {
+            "ETag": self.etag,
+            "Last-Modified": self.last_modified,
+            "Cache-Control": self.cache_control,
+            "Accept-Ranges": "bytes",
+        }
+        if self.gzip_body is not None:
+            base_headers["Vary"] = "Accept-Encoding"
+
+        if self.not_modified(headers):
+            return Response(status_code=304, headers=base_headers)
+
+        # 预压缩的HTML：客户端接受gzip时直接返回压缩后的字节
+        if self.gzip_body is not None and accepts_encoding(headers.get("accept-encoding")):
+            base_headers["ETag"] = self.gzip_etag
+            base_headers["Content-Encoding"] = "gzip"
+            base_headers.pop("Accept-Ranges")
+            body = b"" if method == "HEAD" else self.gzip_body
+            response = Response(content=body, media_type=self.media_type, headers=base_headers)
+            response.headers["Content-Length"] = str(len(self.gzip_body))
+            return response
+
+        byte_range = self._requested_range(headers)
+        if byte_range == "invalid":
+            return Response(status_code=416, headers={**base_headers, "Content-Range": f"bytes */{self.size}"})
+
+        return RangeFileResponse(self, byte_range, base_headers, head_only=method == "HEAD")
+
+    def _requested_range(self, headers):
+        """解析 Range 请求头，返回 (start, end) / None（整个文件）/ "invalid" """
+        range_header = headers.get("range")
+        if not range_header:
+            return None
+
+        # If-Range 与当前版本不一致时返回完整文件
+        if_range = headers.get("if-range")
+        if if_range and if_range != self.etag and if_range != self.last_modified:
+            return None
+
+        match = _RANGE_PATTERN.match(range_header.strip())
+        if not match:
+            # 多区间等不支持的格式，按规范可以直接返回完整内容
+            return None
+
+        start_text, end_text = match.groups()
+        if not start_text and not end_text:
+            return "invalid"
+
+        if not start_text:
+            # bytes=-N 表示最后N个字节
+            length = int(end_text)
+            if length == 0:
+                return "invalid"
+            start, end = max(0, self.size - length), self.size - 1
+        else:
+            start = int(start_text)
+            end = int(end_text) if end_text else self.size - 1
+            end = min(end, self.size - 1)
+
+        if start >= self.size or start > end:
+            return "invalid"
+        return start, end
+
+class RangeFileResponse(Response):
+    """按字节区间发送文件内容，服务器支持时使用零拷贝"""
+
+    def __init__(self, asset: StaticAsset, byte_range: Optional[Tuple[int, int]], headers: Dict[str, str], head_only: bool = False):
+        self.asset = asset
+        self.head_only = head_only
+        if byte_range is None:
+            self.offset, self.count = 0, asset.size
+            status_code = 200
+        else:
+            start, end = byte_range
+            self.offset, self.count = start, end - start + 1
+            headers = {**headers, "Content-Range": f"bytes {start}-{end}/{asset.size}"}
+            status_code = 206
+
+        super().__init__(status_code=status_code, headers=headers, media_type=asset.media_type)
+        self.headers["Content-Length"] = str(self.count)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+
+        if self.head_only or self.count == 0:
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        if "http.response.zerocopysend" in scope.get("extensions", {}):
+            with open(self.asset.path, "rb") as f:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": f.fileno(),
+                    "offset": self.offset,
+                    "count": self.count,
+                })
+            return
+
+        async with await anyio.open_file(self.asset.path, "rb") as f:
+            await f.seek(self.offset)
+            remaining = self.count
+            while remaining > 0:
+                chunk = await f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                # 文件在发送过程中被截断，结束响应
+                await send({"type": "http.response.body", "body": b""})
+
+class StaticAssets:
+    """游戏界面与视频目录的资源索引（只暴露启动时扫描到的文件，避免路径穿越）"""
+
+    def __init__(self, root: str, html_file: str, video_dir: str, max_age: int):
+        self.html = StaticAsset(os.path.join(root, html_file), "text/html; charset=utf-8", "no-cache", precompress=True)
+        self.videos: Dict[str, StaticAsset] = {}
+
+        video_path = os.path.join(root, video_dir)
+        if os.path.isdir(video_path):
+            for name in sorted(os.listdir(video_path)):
+                if name.lower().endswith(".mp4"):
+                    self.videos[name] = StaticAsset(
+                        os.path.join(video_path, name),
+                        "video/mp4",
+                        f"public, max-age={max_age}",
+                    )
+
+    def get_video(self, name: str) -> Optional[StaticAsset]:
+        """按文件名查找视频资源"""
+        return self.videos.get(name)
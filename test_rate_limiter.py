@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+补全API限流与请求合并测试
+"""
+
+import threading
+import time
+
+from rate_limiter import PRIORITY_BACKGROUND, RateLimiter, SingleFlight
+
+def test_quota_is_enforced():
+    """配额用完后排队超时，不会超出每分钟的请求数"""
+    limiter = RateLimiter(requests_per_minute=2, tokens_per_minute=10000)
+    assert limiter.acquire(100, timeout=0.01)
+    assert limiter.acquire(100, timeout=0.01)
+    assert not limiter.acquire(100, timeout=0.05)
+    assert not limiter.acquire(100, priority=PRIORITY_BACKGROUND, timeout=0.01)
+    stats = limiter.statistics()
+    assert stats["rate_limit_granted"] == 2
+    assert stats["rate_limit_timed_out"] == 2
+
+def test_shared_quota_file(tmp_path):
+    """指定状态文件时，多个限流器共享同一配额"""
+    path = str(tmp_path / "quota.json")
+    first = RateLimiter(requests_per_minute=1, tokens_per_minute=10000, shared_path=path)
+    second = RateLimiter(requests_per_minute=1, tokens_per_minute=10000, shared_path=path)
+    assert first.acquire(10, timeout=0.01)
+    assert not second.acquire(10, timeout=0.05)
+
+def test_single_flight_coalesces_concurrent_calls():
+    """同一键的并发调用只执行一次，其余调用方共享结果"""
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "story"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do("economy", slow)))
+    leader.start()
+    assert started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(flight.do("economy", slow))) for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while flight.shared < 3 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert sorted(results) == [("story", False)] + [("story", True)] * 3
+    assert flight.executed == 1
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+游戏存档测试
+- 存档读取后与原来的游戏逐位一致，旧版本（GameState JSON）存档自动升级
+- 篡改过的存档应当被拒绝（400），并且不影响会话当前的游戏
+"""
+
+import json
+import random
+
+from fastapi.testclient import TestClient
+
+from game_engine import create_game_state, play_round
+from history import GameHistory
+from main import app
+from news_catalog import get_catalog
+from savegame import MAGIC, SAVE_VERSION, dump_game, load_game, unpackb
+
+client = TestClient(app)
+
+def _played_game(years: int = 30):
+    """按固定种子玩若干年，返回 (状态, 历史, 随机数生成器)"""
+    catalog = get_catalog()
+    state = create_game_state(11)
+    rng = random.Random(11)
+    history = GameHistory(state.cities, 16)
+    history.record(state)
+    for _ in range(years):
+        if state.game_over:
+            break
+        play_round(state, catalog, rng, timestamp="2026-01-01T00:00:00")
+        history.record(state)
+    return state, history, rng
+
+def test_round_trip():
+    """读取存档得到相同的状态、历史、随机数流和附带数据，再次导出的字节完全相同"""
+    state, history, rng = _played_game()
+    stats = {"rounds_played": 30, "seen_news": ["a", "b"]}
+    data = dump_game(state, history, rng, stats)
+    assert data.startswith(MAGIC) and unpackb(data[len(MAGIC):])[0] == SAVE_VERSION
+
+    saved = load_game(data)
+    assert saved.state.model_dump() == state.model_dump()
+    assert saved.stats == stats
+    restored = saved.build_history(16)
+    assert restored.query() == history.query()
+    restored_rng = random.Random()
+    restored_rng.setstate(saved.rng_state)
+    assert restored_rng.random() == rng.random()
+    assert dump_game(saved.state, restored, restored_rng, saved.stats) == dump_game(state, history, rng, stats)
+
+def test_migrate_v1_json_save():
+    """版本1的 GameState JSON 存档升级为当前版本：状态不变，没有历史和随机数状态"""
+    state, _, _ = _played_game()
+    saved = load_game(json.dumps(state.model_dump()).encode())
+    assert saved.state.model_dump() == state.model_dump()
+    assert saved.history is None
+    assert saved.rng_state is None
+    assert saved.stats == {}
+
+def _new_session():
+    response = client.post("/sessions")
+    assert response.status_code == 200
+    return response.json()["session_id"]
+
+def _snapshot(session_id):
+    return (
+        client.get("/state", params={"session_id": session_id}).json(),
+        client.get("/history", params={"session_id": session_id}).json(),
+    )
+
+def _tampered_saves():
+    """数值超出范围的二进制存档和旧版JSON存档"""
+    saves = []
+    for field, value in (("happiness", 300), ("co2", -5)):
+        state = create_game_state(7)
+        setattr(next(iter(state.cities.values())), field, value)
+        saves.append(dump_game(state))
+    state = create_game_state(7)
+    state.year = 0
+    saves.append(dump_game(state))
+    document = create_game_state(7).model_dump()
+    next(iter(document["cities"].values()))["happiness"] = 1000
+    saves.append(json.dumps(document).encode())
+    return saves
+
+def test_tampered_save_is_rejected():
+    """篡改的存档返回400，会话的状态和历史保持不变，之后仍然可以继续游戏"""
+    session_id = _new_session()
+    assert client.post("/next-round", params={"session_id": session_id}).status_code == 200
+    before = _snapshot(session_id)
+
+    for data in _tampered_saves():
+        response = client.post("/import", params={"session_id": session_id}, content=data)
+        assert response.status_code == 400, response.text
+        assert _snapshot(session_id) == before
+
+    assert client.post("/next-round", params={"session_id": session_id}).status_code == 200
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+城市间外溢测试
+取整后的变化量总和为0：存活城市的幸福度/CO2总量在外溢前后不变
+"""
+
+import random
+
+from game_engine import create_game_state
+from spillover import SpilloverNetwork, _round_conserving
+
+def test_round_conserving():
+    """最大余数法取整：总和保持为0，差额补给小数部分最大的项"""
+    assert _round_conserving([0.7, -0.2, -0.5]) == [1, 0, -1]
+    assert _round_conserving([2.0, -2.0]) == [2, -2]
+    rng = random.Random(0)
+    for _ in range(200):
+        flows = [rng.uniform(-5, 5) for _ in range(rng.randint(1, 20))]
+        flows.append(-sum(flows))
+        deltas = _round_conserving(flows)
+        assert sum(deltas) == 0
+        assert all(abs(delta - flow) < 1 for delta, flow in zip(deltas, flows))
+
+def test_spillover_keeps_totals():
+    """多回合外溢后，存活城市的幸福度和CO2总量不变，数值保持在 0-100 之内"""
+    rng = random.Random(1)
+    state = create_game_state(1)
+    template = next(iter(state.cities.values()))
+    state.cities = {
+        f"city{i}": template.model_copy(update={
+            "happiness": rng.randint(0, 100),
+            "co2": rng.randint(0, 100),
+            "eliminated": rng.random() < 0.1,
+            "position": {"x": rng.randint(0, 1000), "y": rng.randint(0, 1000)},
+        })
+        for i in range(300)
+    }
+    network = SpilloverNetwork(state.cities, radius=150, rate=0.2)
+    assert network.edge_count > 0
+
+    def totals():
+        alive = [city for city in state.cities.values() if not city.eliminated]
+        return sum(city.happiness for city in alive), sum(city.co2 for city in alive)
+
+    before = totals()
+    for _ in range(30):
+        network.apply(state)
+        assert totals() == before
+        assert all(0 <= city.happiness <= 100 and 0 <= city.co2 <= 100 for city in state.cities.values())
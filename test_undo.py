@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+撤销/重做测试
+撤销回到回合结算前的状态和历史（保留当时已做的选择），重做回到结算后的状态
+"""
+
+from fastapi.testclient import TestClient
+
+from main import app
+
+client = TestClient(app)
+
+def _snapshot(session_id):
+    return (
+        client.get("/state", params={"session_id": session_id}).json(),
+        client.get("/history", params={"session_id": session_id}).json(),
+    )
+
+def test_undo_redo_restores_state_and_history():
+    session_id = client.post("/sessions").json()["session_id"]
+    params = {"session_id": session_id}
+
+    snapshots = []
+    for transport in ("train", "bus", "bicycle"):
+        assert client.post(f"/action/transportation/stockholm/{transport}", params=params).status_code == 200
+        snapshots.append(_snapshot(session_id))
+        assert client.post("/next-round", params=params).status_code == 200
+    final = _snapshot(session_id)
+
+    # 逐回合撤销：每次回到该回合结算前（包括当时的选择）
+    for expected in reversed(snapshots):
+        response = client.post("/undo", params=params)
+        assert response.status_code == 200
+        assert _snapshot(session_id) == expected
+    assert client.post("/undo", params=params).status_code == 400
+
+    # 逐回合重做，最后回到撤销前的状态
+    for _ in snapshots:
+        assert client.post("/redo", params=params).status_code == 200
+    assert _snapshot(session_id) == final
+    assert client.post("/redo", params=params).status_code == 400
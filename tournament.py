@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+锦标赛模式
+多个脚本策略在同一张地图、同一组种子上对局：每个 (策略, 种子) 是一局独立的游戏，
+直接用规则引擎 (game_engine) 结算，不经过HTTP接口和会话；对局分块交给进程池并行运行，
+结束后按排行榜相同的规则（年数 > 金钱 > 平均幸福度 > 平均CO2）汇总排名。
+
+同一种子下所有策略面对同一个新闻随机数流（策略自己的随机数另外播种），
+结果只取决于策略的选择，可以重复运行复现。
+
+策略是一个函数 strategy(state, rng) -> {城市ID: CityChoice}，每回合结算前调用一次；
+内置策略见 STRATEGIES，也可以用 "模块:函数" 指定自定义策略（工作进程中按名字导入）。
+
+用法:
+    python tournament.py                                   # 全部内置策略，每个策略20局
+    python tournament.py --strategies steady,cautious --games 200 --workers 8
+    python tournament.py --strategies cautious,my_bots:hoarder --map data/big_map.json --seed 42
+    python tournament.py --check-advisor                   # 回归检查：策略顾问的排名必须在 steady 之前
+"""
+
+import argparse
+import importlib
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence
+
+from config import Config
+from game_engine import (
+    ENERGY_EFFECTS,
+    NATIONAL_NEWS_PROBABILITY,
+    TRANSPORTATION_EFFECTS,
+    CityChoice,
+    city_averages,
+    create_game_state,
+    play_round,
+    queue_policy,
+)
+from leaderboard import Leaderboard
+from news_catalog import get_catalog
+
+Strategy = Callable[..., Dict[str, CityChoice]]
+
+class GameResult(NamedTuple):
+    """一局对局的结果"""
+    strategy: str
+    seed: int
+    years: int
+    money: int
+    avg_happiness: float
+    avg_co2: float
+    eliminated: int
+    game_over: bool
+
+# ===== 内置策略 =====
+
+def steady_strategy(state, rng) -> Dict[str, CityChoice]:
+    """始终保持初始设置"""
+    return {}
+
+def random_strategy(state, rng) -> Dict[str, CityChoice]:
+    """每个城市每年有20%的概率随机更换运输方式或能源来源"""
+    policy = {}
+    for city_id in state.cities:
+        transportation = rng.choice(list(TRANSPORTATION_EFFECTS)) if rng.random() < 0.2 else None
+        energy_source = rng.choice(list(ENERGY_EFFECTS)) if rng.random() < 0.2 else None
+        if transportation or energy_source:
+            policy[city_id] = CityChoice(transportation, energy_source)
+    return policy
+
+def _cheapest(effects: Dict[str, Dict[str, int]], key: str, better: Callable[[int], bool]) -> List[str]:
+    """按花费从低到高排列的、指定数值朝有利方向变化的选项"""
+    options = [name for name, effect in effects.items() if better(effect[key])]
+    return sorted(options, key=lambda name: -effects[name]["money"])
+
+_CHEAP_CLEAN_ENERGY = _cheapest(ENERGY_EFFECTS, "co2", lambda value: value < 0)
+_CHEAP_HAPPY_TRANSPORT = _cheapest(TRANSPORTATION_EFFECTS, "happiness", lambda value: value > 0)
+
+def cautious_strategy(state, rng) -> Dict[str, CityChoice]:
+    """城市接近出局时换成最便宜的能改善该数值的设置（资金不足以承担时保持不变）"""
+    policy = {}
+    budget = state.money // 2
+    for city_id, city in state.cities.items():
+        if city.eliminated:
+            continue
+        energy_source = transportation = None
+        if city.co2 >= 70:
+            energy_source = next((name for name in _CHEAP_CLEAN_ENERGY if name != city.energy_source), None)
+        if city.happiness <= 30:
+            transportation = next((name for name in _CHEAP_HAPPY_TRANSPORT if name != city.transportation), None)
+        cost = -(ENERGY_EFFECTS[energy_source]["money"] if energy_source else 0) \
+            - (TRANSPORTATION_EFFECTS[transportation]["money"] if transportation else 0)
+        if (energy_source or transportation) and cost <= budget:
+            policy[city_id] = CityChoice(transportation, energy_source)
+            budget -= cost
+    return policy
+
+# 每个工作进程一个策略顾问（置换表在该进程的对局之间共享）
+_advisor = None
+
+def advisor_strategy(state, rng) -> Dict[str, CityChoice]:
+    """采用策略顾问两回合前瞻的推荐（时间预算足够宽，结果只取决于局面）"""
+    global _advisor
+    if _advisor is None:
+        from advisor import StrategyAdvisor
+        catalog = get_catalog()
+        _advisor = StrategyAdvisor.from_catalog(TRANSPORTATION_EFFECTS, ENERGY_EFFECTS, catalog, NATIONAL_NEWS_PROBABILITY)
+    advice = _advisor.advise(state.year, state.money, state.cities, max_depth=2, budget_ms=10_000)
+    return {
+        city_id: CityChoice(choice["transportation"], choice["energy_source"])
+        for city_id, choice in advice["recommendations"].items()
+    }
+
+STRATEGIES: Dict[str, Strategy] = {
+    "steady": steady_strategy,
+    "random": random_strategy,
+    "cautious": cautious_strategy,
+    "advisor": advisor_strategy,
+}
+
+def resolve_strategy(name: str) -> Strategy:
+    """按名字查找策略：内置策略名，或 "模块:函数" """
+    if name in STRATEGIES:
+        return STRATEGIES[name]
+    module_name, _, function_name = name.partition(":")
+    if not function_name:
+        raise ValueError(f"未知的策略: {name}（内置策略: {', '.join(STRATEGIES)}，自定义策略格式为 模块:函数）")
+    return getattr(importlib.import_module(module_name), function_name)
+
+# ===== 对局 =====
+
+def play_game(strategy_name: str, seed: int, cities_data: Optional[Dict[str, Dict]] = None, max_years: int = 200,
+              spillover_rate: float = 0.0, spillover_radius: float = 200.0) -> GameResult:
+    """用一个策略从头到尾结算一局游戏（最多 max_years 回合）"""
+    strategy = resolve_strategy(strategy_name)
+    catalog = get_catalog()
+    state = create_game_state(seed, cities_data)
+    sampler = catalog.city_sampler(state.cities)
+    spillover = None
+    if spillover_rate > 0:
+        from spillover import SpilloverNetwork
+        spillover = SpilloverNetwork(state.cities, spillover_radius, spillover_rate)
+
+    # 新闻随机数流只由种子决定，所有策略面对同样的新闻；策略的随机选择使用独立的随机数流
+    rng = random.Random(seed)
+    strategy_rng = random.Random(f"{strategy_name}:{seed}")
+
+    rounds = 0
+    happiness_total = co2_total = 0.0
+    while not state.game_over and rounds < max_years:
+        queue_policy(state, strategy(state, strategy_rng))
+        # 与会话一致：平均幸福度/CO2按每回合结算前的城市平均值累计
+        happiness, co2 = city_averages(state)
+        happiness_total += happiness
+        co2_total += co2
+        rounds += 1
+        play_round(state, catalog, rng, sampler, spillover=spillover)
+
+    if rounds:
+        avg_happiness, avg_co2 = happiness_total / rounds, co2_total / rounds
+    else:
+        avg_happiness, avg_co2 = city_averages(state)
+    eliminated = sum(1 for city in state.cities.values() if city.eliminated)
+    return GameResult(strategy_name, seed, rounds, state.money, avg_happiness, avg_co2, eliminated, state.game_over)
+
+def _play_chunk(strategy_name: str, seeds: Sequence[int], scenario: Dict) -> List[GameResult]:
+    """工作进程的任务：同一策略的一组种子"""
+    return [play_game(strategy_name, seed, **scenario) for seed in seeds]
+
+def _score(years: float, money: float, avg_happiness: float, avg_co2: float) -> tuple:
+    """排序键（越小越好），与排行榜的名次规则一致"""
+    return (-years, -money, -avg_happiness, avg_co2)
+
+def rank_results(results: Sequence[GameResult]) -> List[Dict]:
+    """
+    按策略汇总：平均成绩按排行榜规则排名，wins 为该策略在同一种子下取得最好成绩的局数（并列都计）
+    """
+    by_strategy: Dict[str, List[GameResult]] = {}
+    best_by_seed: Dict[int, tuple] = {}
+    for result in results:
+        by_strategy.setdefault(result.strategy, []).append(result)
+        score = _score(result.years, result.money, result.avg_happiness, result.avg_co2)
+        if result.seed not in best_by_seed or score < best_by_seed[result.seed]:
+            best_by_seed[result.seed] = score
+
+    rankings = []
+    for strategy_name, games in by_strategy.items():
+        count = len(games)
+        rankings.append({
+            "strategy": strategy_name,
+            "games": count,
+            "avg_years": round(sum(game.years for game in games) / count, 2),
+            "avg_money": round(sum(game.money for game in games) / count, 2),
+            "avg_happiness": round(sum(game.avg_happiness for game in games) / count, 2),
+            "avg_co2": round(sum(game.avg_co2 for game in games) / count, 2),
+            "avg_eliminated": round(sum(game.eliminated for game in games) / count, 2),
+            "wins": sum(
+                1 for game in games
+                if _score(game.years, game.money, game.avg_happiness, game.avg_co2) == best_by_seed[game.seed]
+            ),
+        })
+    rankings.sort(key=lambda row: _score(row["avg_years"], row["avg_money"], row["avg_happiness"], row["avg_co2"]))
+    for rank, row in enumerate(rankings, 1):
+        row["rank"] = rank
+    return rankings
+
+def run_tournament(strategies: Sequence[str], games: int = 20, seed: int = 0, workers: Optional[int] = None,
+                   cities_data: Optional[Dict[str, Dict]] = None, max_years: int = 200,
+                   spillover_rate: float = 0.0, spillover_radius: float = 200.0, chunk_size: Optional[int] = None) -> Dict:
+    """
+    运行一次锦标赛
+
+    Args:
+        strategies: 参赛策略名（内置策略名或 "模块:函数"）
+        games: 每个策略的对局数，使用种子 seed .. seed + games - 1
+        workers: 工作进程数，默认CPU核数；1表示在当前进程中运行
+        cities_data: 地图（城市ID -> 城市字段），默认使用原始城市
+        max_years: 每局最多结算的回合数
+        chunk_size: 每个进程任务包含的对局数，默认按进程数自动划分
+
+    Returns:
+        排名、排行榜前10局和吞吐量统计
+    """
+    for name in strategies:
+        resolve_strategy(name)  # 先在主进程中检查策略名，避免工作进程中才报错
+    workers = workers or os.cpu_count() or 1
+    seeds = list(range(seed, seed + games))
+    scenario = {
+        "cities_data": cities_data,
+        "max_years": max_years,
+        "spillover_rate": spillover_rate,
+        "spillover_radius": spillover_radius,
+    }
+    # 每个进程分到几个任务即可摊薄进程间通信，又能在策略快慢不均时均衡负载
+    chunk_size = chunk_size or max(1, len(seeds) * len(strategies) // (workers * 4))
+    tasks = [(name, seeds[start:start + chunk_size]) for name in strategies for start in range(0, len(seeds), chunk_size)]
+
+    start_time = time.perf_counter()
+    results: List[GameResult] = []
+    if workers == 1:
+        for name, chunk in tasks:
+            results.extend(_play_chunk(name, chunk, scenario))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_play_chunk, name, chunk, scenario) for name, chunk in tasks]
+            for future in futures:
+                results.extend(future.result())
+    elapsed = time.perf_counter() - start_time
+
+    # 单局成绩用排行榜排名（会话ID记为 策略#种子）
+    board = Leaderboard(max_entries=len(results) or 1)
+    for result in results:
+        board.record(f"{result.strategy}#{result.seed}", result.seed, result.years, result.money,
+                     result.avg_happiness, result.avg_co2)
+
+    rounds = sum(result.years for result in results)
+    return {
+        "rankings": rank_results(results),
+        "top_games": board.top(10),
+        "games": len(results),
+        "rounds": rounds,
+        "workers": workers,
+        "elapsed_seconds": round(elapsed, 3),
+        "games_per_second": round(len(results) / elapsed, 1) if elapsed > 0 else None,
+        "rounds_per_second": round(rounds / elapsed, 1) if elapsed > 0 else None,
+    }
+
+def check_advisor(games: int = 200, seed: int = 0, workers: Optional[int] = None) -> Dict:
+    """
+    回归检查：在同一组种子上比较 advisor 与什么都不做的 steady，
+    顾问的排名（年数 > 金钱 > ...）必须在 steady 之前，否则说明评估函数在花钱换取不值得的改善
+
+    Returns:
+        {"passed": 是否通过, "rankings": 两个策略的排名}
+    """
+    report = run_tournament(["advisor", "steady"], games=games, seed=seed, workers=workers)
+    ranks = {row["strategy"]: row["rank"] for row in report["rankings"]}
+    return {"passed": ranks["advisor"] < ranks["steady"], "rankings": report["rankings"]}
+
+def main():
+    parser = argparse.ArgumentParser(description="脚本策略锦标赛")
+    parser.add_argument("--strategies", default=",".join(STRATEGIES), help="参赛策略，逗号分隔（内置策略名或 模块:函数）")
+    parser.add_argument("--games", type=int, default=None, help="每个策略的对局数（默认20，回归检查默认200）")
+    parser.add_argument("--seed", type=int, default=0, help="第一局的种子")
+    parser.add_argument("--workers", type=int, default=None, help="工作进程数（默认CPU核数，1为单进程）")
+    parser.add_argument("--max-years", type=int, default=200, help="每局最多回合数")
+    parser.add_argument("--map", default=None, help="地图JSON文件（城市ID -> 城市字段），默认使用原始城市")
+    parser.add_argument("--spillover-rate", type=float, default=Config.SPILLOVER_RATE)
+    parser.add_argument("--spillover-radius", type=float, default=Config.SPILLOVER_RADIUS)
+    parser.add_argument("--json", action="store_true", help="以JSON输出完整结果")
+    parser.add_argument("--check-advisor", action="store_true", help="回归检查：advisor 与 steady 对局（默认200局），顾问排名不在前时以状态1退出")
+    args = parser.parse_args()
+
+    if args.check_advisor:
+        check = check_advisor(games=args.games or 200, seed=args.seed, workers=args.workers)
+        for row in check["rankings"]:
+            print(f"{row['rank']:>4}  {row['strategy']:20s} {row['avg_years']:7.2f} {row['avg_money']:9.1f} {row['wins']:5d}")
+        print("advisor check passed" if check["passed"] else "advisor check FAILED: advisor does not rank ahead of steady")
+        sys.exit(0 if check["passed"] else 1)
+
+    cities_data = None
+    if args.map:
+        with open(args.map, encoding="utf-8") as f:
+            cities_data = json.load(f)
+
+    report = run_tournament(
+        [name.strip() for name in args.strategies.split(",") if name.strip()],
+        games=args.games or 20,
+        seed=args.seed,
+        workers=args.workers,
+        cities_data=cities_data,
+        max_years=args.max_years,
+        spillover_rate=args.spillover_rate,
+        spillover_radius=args.spillover_radius,
+    )
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return
+
+    print(f"=== tournament ({report['games']} games, {report['workers']} workers) ===")
+    print(f"{'rank':>4}  {'strategy':20s} {'years':>7} {'money':>9} {'happiness':>9} {'co2':>6} {'elim':>5} {'wins':>5}")
+    for row in report["rankings"]:
+        print(f"{row['rank']:>4}  {row['strategy']:20s} {row['avg_years']:7.1f} {row['avg_money']:9.1f} "
+              f"{row['avg_happiness']:9.1f} {row['avg_co2']:6.1f} {row['avg_eliminated']:5.1f} {row['wins']:5d}")
+    print(f"{report['rounds']} rounds in {report['elapsed_seconds']:.2f} s   "
+          f"{report['games_per_second']:,.0f} games/s   {report['rounds_per_second']:,.0f} rounds/s")
+
+if __name__ == "__main__":
+    main()